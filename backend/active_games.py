@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Active Games
+
+A Redis index of scheduled games, so the current and next game are served
+without querying PostgreSQL:
+
+    games:active      sorted set of game IDs scored by date_active (Unix time)
+    game_meta:{id}    hash of the game's columns as the API returns them
+
+schedule_game.commit_games writes both in the same MULTI/EXEC as the games'
+similarity data, and `schedule_game.py gc` removes them with the rows.
+`reconcile` rebuilds the index from the games table, e.g. after deploying it
+for the first time or losing Redis data.
+
+Usage:
+    python active_games.py current
+    python active_games.py next
+    python active_games.py reconcile [--dry-run]
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import sys
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    import redis
+
+# Load environment variables
+load_dotenv()
+
+ACTIVE_GAMES_KEY = "games:active"
+
+# Games sharing the latest date_active are served at random; at most this
+# many are considered, as the PostgreSQL query did
+CURRENT_GAME_CANDIDATES = 10
+
+# Columns kept in game_meta:{id}. The JSON columns are stored as JSON text,
+# date_active as ISO 8601 and the rest as plain strings.
+META_COLUMNS = (
+    "id", "prompt_id", "prompt_text", "keywords", "speech_types",
+    "image_url", "pixelation_map", "media_type", "date_active",
+)
+JSON_COLUMNS = ("keywords", "speech_types", "pixelation_map")
+
+SELECT_GAMES_SQL = f"SELECT {', '.join(META_COLUMNS)} FROM games"
+
+# Index entries written per pipeline round trip while reconciling
+RECONCILE_BATCH_SIZE = 500
+
+def game_meta_key(game_id: int | str) -> str:
+    """Redis key of a game's metadata hash."""
+    return f"game_meta:{game_id}"
+
+def _score(date_active: datetime | str) -> float:
+    if isinstance(date_active, str):
+        date_active = datetime.fromisoformat(date_active)
+    return date_active.timestamp()
+
+def encode_game(game: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Encode a game's columns for its metadata hash.
+
+    JSON columns may be given decoded (as psycopg2 returns JSONB) or as
+    JSON text (as build_game_row produces them).
+    """
+    meta = {}
+    for column in META_COLUMNS:
+        value = game.get(column)
+        if column in JSON_COLUMNS:
+            meta[column] = value if isinstance(value, str) else json.dumps(value)
+        elif isinstance(value, datetime):
+            meta[column] = value.astimezone(timezone.utc).isoformat()
+        else:
+            meta[column] = "" if value is None else str(value)
+    return meta
+
+def decode_game(meta: Dict[bytes | str, bytes | str]) -> Dict[str, Any]:
+    """Decode a metadata hash as returned by HGETALL."""
+    game = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in meta.items()
+    }
+    for column in JSON_COLUMNS:
+        game[column] = json.loads(game.get(column) or "null")
+    game["id"] = int(game["id"])
+    game["speech_types"] = game["speech_types"] or []
+    game["media_type"] = game.get("media_type") or "image"
+    return game
+
+def queue_active_games(pipeline: redis.client.Pipeline, games: List[Dict[str, Any]]) -> None:
+    """Queue adding games (dicts of META_COLUMNS) to the index."""
+    for game in games:
+        pipeline.hset(game_meta_key(game["id"]), mapping=encode_game(game))
+        pipeline.zadd(ACTIVE_GAMES_KEY, {str(game["id"]): _score(game["date_active"])})
+
+def queue_removed_games(pipeline: redis.client.Pipeline, game_ids: List[int]) -> None:
+    """Queue removing games from the index."""
+    if game_ids:
+        pipeline.zrem(ACTIVE_GAMES_KEY, *[str(game_id) for game_id in game_ids])
+        pipeline.unlink(*[game_meta_key(game_id) for game_id in game_ids])
+
+def _now(now: Optional[datetime]) -> float:
+    return (now or datetime.now(timezone.utc)).timestamp()
+
+def current_game(redis_client: redis.Redis, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    The game being played: the latest one whose date_active has passed.
+
+    If several games share that date_active, one is picked at random.
+
+    Returns:
+        The game's decoded metadata, or None if no game is active
+    """
+    candidates = redis_client.zrevrangebyscore(
+        ACTIVE_GAMES_KEY, _now(now), "-inf", start=0, num=CURRENT_GAME_CANDIDATES, withscores=True
+    )
+    if not candidates:
+        return None
+    latest = [game_id for game_id, score in candidates if score == candidates[0][1]]
+    random.shuffle(latest)
+    for game_id in latest:
+        meta = redis_client.hgetall(game_meta_key(game_id.decode() if isinstance(game_id, bytes) else game_id))
+        if meta:
+            return decode_game(meta)
+    return None
+
+def next_game_time(redis_client: redis.Redis, now: Optional[datetime] = None) -> Optional[datetime]:
+    """When the next scheduled game becomes active, or None if none is scheduled."""
+    upcoming = redis_client.zrangebyscore(
+        ACTIVE_GAMES_KEY, f"({_now(now)}", "+inf", start=0, num=1, withscores=True
+    )
+    if not upcoming:
+        return None
+    return datetime.fromtimestamp(upcoming[0][1], timezone.utc)
+
+def reconcile(
+    conn: psycopg2.extensions.connection,
+    redis_client: redis.Redis,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """
+    Make the index match the games table.
+
+    Games missing from the index are added, entries whose score or metadata
+    differ are rewritten and entries without a row are removed.
+
+    Args:
+        conn: PostgreSQL connection
+        redis_client: Redis client
+        dry_run: Only count what would change
+
+    Returns:
+        Number of games added, updated and removed
+    """
+    with conn.cursor() as cur:
+        cur.execute(SELECT_GAMES_SQL)
+        games = {row[0]: dict(zip(META_COLUMNS, row)) for row in cur.fetchall()}
+    conn.rollback()
+
+    indexed = {int(game_id): score for game_id, score in redis_client.zrange(ACTIVE_GAMES_KEY, 0, -1, withscores=True)}
+    shared = [game_id for game_id in games if game_id in indexed]
+    pipeline = redis_client.pipeline(transaction=False)
+    for game_id in shared:
+        pipeline.hgetall(game_meta_key(game_id))
+    stored = dict(zip(shared, pipeline.execute())) if shared else {}
+
+    added = [game for game_id, game in games.items() if game_id not in indexed]
+    # Metadata is compared decoded, as JSONB doesn't keep the key order the
+    # scheduler wrote
+    updated = [
+        games[game_id] for game_id in shared
+        if indexed[game_id] != _score(games[game_id]["date_active"]) or not stored[game_id]
+        or decode_game(stored[game_id]) != decode_game(encode_game(games[game_id]))
+    ]
+    removed = [game_id for game_id in indexed if game_id not in games]
+
+    if not dry_run:
+        changed = added + updated
+        for start in range(0, len(changed), RECONCILE_BATCH_SIZE):
+            batch = changed[start:start + RECONCILE_BATCH_SIZE]
+            pipeline = redis_client.pipeline(transaction=False)
+            # Rewritten from scratch so columns no longer stored don't linger
+            pipeline.unlink(*[game_meta_key(game["id"]) for game in batch])
+            queue_active_games(pipeline, batch)
+            pipeline.execute()
+        for start in range(0, len(removed), RECONCILE_BATCH_SIZE):
+            pipeline = redis_client.pipeline(transaction=False)
+            queue_removed_games(pipeline, removed[start:start + RECONCILE_BATCH_SIZE])
+            pipeline.execute()
+    return {"added": len(added), "updated": len(updated), "removed": len(removed)}
+
+def main():
+    """Entry point for command line usage."""
+    import argparse
+
+    from schedule_game import close_connections, get_connections
+
+    parser = argparse.ArgumentParser(description="Read or rebuild the Redis index of scheduled games")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("current", help="Print the current game")
+    commands.add_parser("next", help="Print when the next game becomes active")
+    reconcile_parser = commands.add_parser("reconcile", help="Make the index match the games table")
+    reconcile_parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    connections = get_connections()
+    try:
+        redis_client = connections.redis()
+        if args.command == "current":
+            game = current_game(redis_client)
+            print(json.dumps(game, indent=2) if game else "No active game")
+        elif args.command == "next":
+            next_time = next_game_time(redis_client)
+            print(next_time.isoformat() if next_time else "No game scheduled")
+        else:
+            with connections.postgres() as conn:
+                report = reconcile(conn, redis_client, args.dry_run)
+            counts = f"{report['added']} added, {report['updated']} updated, {report['removed']} removed"
+            print(f"Index entries {'to change' if args.dry_run else 'changed'}: {counts}")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        close_connections()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Scheduler benchmarks
+
+Times every stage of schedule_game end to end against local stand-ins:
+a throwaway redis-server, a temporary PostgreSQL cluster (or any servers
+passed by URL) and an in-process HTTP Vercel Blob stand-in.
+
+Similarity data comes from utils.generate_nearest_words_optimized run over a
+synthetic spaCy vocabulary of configurable size, and media processing runs
+the real compositing/encoding path on synthetic images with masks injected
+past the interactive step.
+
+For each game count (default 1, 10 and 100) two modes run:
+- sequential: schedule_game once per game; per-stage latency percentiles
+- batch: schedule_games once for all games; per-stage totals
+
+Usage:
+    python bench/bench_scheduler.py
+    python bench/bench_scheduler.py --games 1 10 --vocab-size 50000
+    python bench/bench_scheduler.py --database-url postgresql://... --redis-url redis://...
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import common
+from common import percentiles
+from services import LocalBlobStore, LocalPostgres, LocalRedis
+
+METRICS = ("count", "total_s", "p50_ms", "p95_ms", "p99_ms", "throughput_per_s")
+
+# Module attributes of schedule_game that are timed, and their stage names.
+# Stages nest and overlap: media includes segmentation and uploads and runs
+# concurrently with similarity_generation; commit includes the PostgreSQL
+# insert and the Redis write.
+TIMED_FUNCTIONS = {
+    "process_game_media": "media",
+    "process_image_segmentation": "segmentation",
+    "upload_to_blob": "upload",
+    "generate_embeddings": "similarity_generation",
+    "commit_games": "commit",
+}
+
+def synthetic_vocabulary(size: int, dim: int = 300, seed: int = 0):
+    """
+    Build a blank spaCy pipeline whose vector table holds ``size`` random
+    lowercase alphabetic words.
+
+    Returns:
+        Tuple of (nlp, words)
+    """
+    import spacy
+    from spacy.vectors import Vectors
+
+    rng = np.random.default_rng(seed)
+    # Base-26 spelling of each index keeps every word unique and alphabetic
+    words = []
+    for i in range(size):
+        letters = []
+        n = i
+        while True:
+            n, r = divmod(n, 26)
+            letters.append(chr(97 + r))
+            if n == 0:
+                break
+        words.append("w" + "".join(reversed(letters)))
+
+    nlp = spacy.blank("en")
+    vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    nlp.vocab.vectors = Vectors(data=vectors, keys=[nlp.vocab.strings.add(w) for w in words])
+    return nlp, words
+
+class StageTimer:
+    """Records call durations of selected schedule_game functions."""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self._originals = {}
+
+    def _wrap(self, stage: str, func: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.durations[stage].append(time.perf_counter() - start)
+        return timed
+
+    def install(self, module) -> None:
+        for name, stage in TIMED_FUNCTIONS.items():
+            if hasattr(module, name):
+                self._originals[name] = getattr(module, name)
+                setattr(module, name, self._wrap(stage, self._originals[name]))
+
+    def uninstall(self, module) -> None:
+        for name, func in self._originals.items():
+            setattr(module, name, func)
+        self._originals.clear()
+
+    def reset(self) -> None:
+        self.durations.clear()
+
+def write_games(base_dir: Path, label: str, count: int, words: List[str],
+                width: int, height: int, num_keywords: int, seed: int) -> List[str]:
+    """Write ``count`` synthetic game configs and their images."""
+    from PIL import Image
+    from bench_segmenter import synthetic_image
+
+    rng = np.random.default_rng(seed)
+    image = synthetic_image(width, height, seed)
+    game_files = []
+    for i in range(count):
+        prompt_id = f"{label}-{i}"
+        image_name = f"{prompt_id}.png"
+        Image.fromarray(np.roll(image, i * 7, axis=1)).save(base_dir / image_name)
+        keywords = [str(w) for w in rng.choice(words, size=num_keywords, replace=False)]
+        config = {
+            "image": image_name,
+            "prompt": "A synthetic prompt with " + " and ".join(f"[{kw}]" for kw in keywords),
+            "keywords": keywords,
+            "speech_type": ["noun"] * num_keywords,
+        }
+        (base_dir / f"{prompt_id}.json").write_text(json.dumps(config))
+        game_files.append(f"{prompt_id}.json")
+    return game_files
+
+def make_segmentation(work_dir: Path) -> Callable:
+    """
+    Build a stand-in for segmenter.process_image that skips SAM2 and the UI
+    but runs the real combination compositing and encoding.
+    """
+    from PIL import Image
+    from bench_segmenter import synthetic_masks
+    from segmenter import Segmenter
+
+    def process_image(image_path: str, keywords: List[str], *args, **kwargs) -> Dict[str, str]:
+        image = np.array(Image.open(image_path).convert("RGB"))
+        height, width = image.shape[:2]
+        masks = dict(zip(keywords, synthetic_masks(width, height, len(keywords)).values()))
+        combinations_dir = work_dir / Path(image_path).stem
+        segmenter = Segmenter.from_masks(image, masks, combinations_dir / "masks", combinations_dir)
+        segmenter._generate_combinations()
+        return {p.name: str(p.absolute()) for p in combinations_dir.glob("*.webp")}
+
+    return process_image
+
+def make_embeddings(nlp) -> Callable:
+    """Build a stand-in for generate_embeddings that uses the synthetic vocabulary."""
+    from utils import generate_nearest_words_optimized
+
+    def generate_embeddings(keywords: List[str], num: int) -> Dict[str, Dict[str, float]]:
+        results = generate_nearest_words_optimized(keywords, nlp, num)
+        return {kw: dict(pairs) for kw, pairs in results.items()}
+
+    return generate_embeddings
+
+def summarize(case: str, durations: Dict[str, List[float]], games: int) -> List[dict]:
+    """Turn raw durations into result records, one per stage plus end_to_end."""
+    records = []
+    for stage, values in sorted(durations.items()):
+        records.append({
+            "case": case,
+            "stage": stage,
+            "count": len(values),
+            "total_s": sum(values),
+            **percentiles(values),
+            "throughput_per_s": games / sum(values) if sum(values) else 0.0,
+        })
+    return records
+
+def main():
+    """Entry point for command line usage."""
+    parser = argparse.ArgumentParser(description="Benchmark schedule_game against local stand-ins")
+    parser.add_argument("--games", nargs="+", type=int, default=[1, 10, 100],
+                        help="Game counts to benchmark")
+    parser.add_argument("--modes", nargs="+", choices=["sequential", "batch"],
+                        default=["sequential", "batch"], help="Scheduling modes to run")
+    parser.add_argument("--vocab-size", type=int, default=20000, help="Synthetic vocabulary size")
+    parser.add_argument("--vector-dim", type=int, default=300, help="Synthetic vector width")
+    parser.add_argument("--keywords", type=int, default=3, help="Keywords per game")
+    parser.add_argument("--image-size", default="640x360", help="Synthetic image size WIDTHxHEIGHT")
+    parser.add_argument("--redis-url", help="Use this Redis instead of starting redis-server")
+    parser.add_argument("--database-url", help="Use this PostgreSQL instead of starting a temporary cluster")
+    parser.add_argument("--pg-bin", help="Directory containing initdb and pg_ctl")
+    parser.add_argument("--verbose", action="store_true", help="Show schedule_game's own output")
+    parser.add_argument("--output", default=str(Path(__file__).parent / "results" / "scheduler.json"),
+                        help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+
+    print(f"Building synthetic vocabulary of {args.vocab_size} words...")
+    nlp, words = synthetic_vocabulary(args.vocab_size, args.vector_dim)
+
+    results = []
+    with LocalRedis(args.redis_url) as local_redis, \
+         LocalPostgres(args.database_url, args.pg_bin) as local_pg, \
+         LocalBlobStore() as blob_store, \
+         tempfile.TemporaryDirectory() as tmp:
+        os.environ["REDIS_URL"] = local_redis.url
+        os.environ["DATABASE_URL"] = local_pg.url
+
+        import schedule_game
+
+        schedule_game.close_connections()
+        work_dir = Path(tmp)
+        schedule_game.process_image_segmentation = make_segmentation(work_dir / "combinations")
+        schedule_game.generate_embeddings = make_embeddings(nlp)
+
+        timer = StageTimer()
+        timer.install(schedule_game)
+        run_id = int(time.time())
+        try:
+            for count in args.games:
+                for mode in args.modes:
+                    label = f"bench{run_id}-{mode}-n{count}"
+                    game_files = write_games(work_dir, label, count, words, width, height,
+                                             args.keywords, seed=count)
+                    print(f"Scheduling {count} game(s) [{mode}]...")
+                    timer.reset()
+                    output = contextlib.nullcontext() if args.verbose else \
+                        contextlib.redirect_stdout(io.StringIO())
+                    start = time.perf_counter()
+                    with output:
+                        if mode == "sequential":
+                            ok = all(schedule_game.schedule_game(f, None, str(work_dir)) for f in game_files)
+                        else:
+                            ok = schedule_game.schedule_games(game_files, None, str(work_dir))
+                    wall = time.perf_counter() - start
+                    if not ok:
+                        raise RuntimeError(f"Scheduling failed for {label}; rerun with --verbose")
+
+                    case = f"{mode}/n{count}"
+                    results.extend(summarize(case, timer.durations, count))
+                    results.append({
+                        "case": case,
+                        "stage": "end_to_end",
+                        "count": count,
+                        "total_s": wall,
+                        "throughput_per_s": count / wall,
+                    })
+        finally:
+            timer.uninstall(schedule_game)
+            schedule_game.close_connections()
+
+        print(f"Blob store holds {blob_store.total_bytes} bytes in {len(blob_store.blobs)} blobs")
+
+    sys.exit(common.finish("scheduler", results, args.output, args.baseline, METRICS))
+
+if __name__ == "__main__":
+    main()
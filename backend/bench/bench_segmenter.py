@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Segmenter benchmarks
+
+Measures the compositing and encoding paths of segmenter.py on synthetic
+images, videos and masks, without SAM2 or any user interaction. Masks are
+injected past the interactive step with Segmenter.from_masks and
+VideoSegmenter.from_masks.
+
+Each stage runs in its own process and records wall time, peak RSS and
+output bytes into a JSON results file.
+
+Usage:
+    python bench/bench_segmenter.py
+    python bench/bench_segmenter.py --quick
+    python bench/bench_segmenter.py --resolutions 1080p 4k --keywords 1 7
+    python bench/bench_segmenter.py --output new.json --baseline bench/results/segmenter.json
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import common
+from common import directory_bytes, measure, run_isolated
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+    "8k": (7680, 4320),
+}
+
+METRICS = ("wall_s", "peak_rss_bytes", "rss_growth_bytes", "output_bytes")
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """
+    Build a deterministic RGB test image.
+
+    Smooth gradients plus blocky shapes and mild noise, so encoders see
+    something closer to real artwork than flat colour or pure noise.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = np.empty((height, width, 3), dtype=np.float32)
+    image[..., 0] = 255 * x / width
+    image[..., 1] = 255 * y / height
+    image[..., 2] = 127 + 127 * np.sin(x / 97.0) * np.cos(y / 61.0)
+    for _ in range(12):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        w, h = rng.integers(width // 20, width // 4), rng.integers(height // 20, height // 4)
+        image[y0:y0 + h, x0:x0 + w] = rng.integers(0, 256, size=3)
+    image += rng.normal(0, 6, size=image.shape).astype(np.float32)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def synthetic_masks(width: int, height: int, count: int, shift: int = 0) -> dict[str, np.ndarray]:
+    """
+    Build ``count`` elliptical keyword masks laid out across the image.
+
+    Neighbouring ellipses overlap slightly, like real segments often do.
+    ``shift`` moves every mask horizontally to emulate motion between frames.
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    masks = {}
+    for i in range(count):
+        cx = (i + 0.5) * width / count + shift
+        cy = height / 2 + (height / 6) * (1 if i % 2 else -1)
+        rx, ry = 0.6 * width / count, height / 4
+        masks[f"keyword{i}"] = ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2 <= 1.0
+    return masks
+
+def write_synthetic_frames(frames_dir: Path, width: int, height: int, num_frames: int) -> None:
+    """Write a synthetic clip as numbered JPEG frames, as extract_frames would."""
+    import cv2
+
+    base = synthetic_image(width, height)
+    for frame_idx in range(num_frames):
+        frame = np.roll(base, frame_idx * 4, axis=1)
+        cv2.imwrite(str(frames_dir / f"{frame_idx:05d}.jpg"), cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+def bench_image_combinations(width: int, height: int, num_keywords: int) -> dict:
+    """Segmenter._generate_combinations: composite and encode 2^k WEBPs."""
+    from segmenter import Segmenter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image = synthetic_image(width, height)
+        masks = synthetic_masks(width, height, num_keywords)
+        segmenter = Segmenter.from_masks(image, masks, f"{tmp}/masks", f"{tmp}/combinations")
+
+        metrics = measure(segmenter._generate_combinations)
+        return {**metrics, "output_bytes": directory_bytes(f"{tmp}/combinations")}
+
+def bench_video_combinations(width: int, height: int, num_keywords: int, num_frames: int) -> dict:
+    """VideoSegmenter._generate_combinations: decode, composite and encode 2^k videos."""
+    from segmenter import VideoSegmenter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        frames_dir = Path(tmp) / "frames"
+        frames_dir.mkdir()
+        write_synthetic_frames(frames_dir, width, height, num_frames)
+        video_segments = {}
+        for frame_idx in range(num_frames):
+            for keyword, mask in synthetic_masks(width, height, num_keywords, shift=frame_idx * 4).items():
+                video_segments.setdefault(keyword, {})[frame_idx] = mask
+        segmenter = VideoSegmenter.from_masks(
+            frames_dir, video_segments, 30.0, f"{tmp}/masks", f"{tmp}/combinations"
+        )
+
+        metrics = measure(segmenter._generate_combinations)
+        return {**metrics, "output_bytes": directory_bytes(f"{tmp}/combinations")}
+
+def bench_write_video(width: int, height: int, num_frames: int) -> dict:
+    """write_video: encode a single clip from in-memory RGB frames."""
+    from segmenter import write_video
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = synthetic_image(width, height)
+        frames = [np.roll(base, frame_idx * 4, axis=1) for frame_idx in range(num_frames)]
+
+        metrics = measure(lambda: write_video(Path(tmp) / "clip.mp4", frames, fps=30.0))
+        return {**metrics, "output_bytes": directory_bytes(tmp)}
+
+def main():
+    """Entry point for command line usage."""
+    parser = argparse.ArgumentParser(description="Benchmark segmenter compositing and encoding")
+    parser.add_argument("--resolutions", nargs="+", choices=RESOLUTIONS, default=["720p", "1080p", "1440p", "4k"],
+                        help="Image resolutions to benchmark (8k only on request)")
+    parser.add_argument("--keywords", nargs="+", type=int, default=[1, 3, 5, 7],
+                        help="Keyword (mask) counts to benchmark for images")
+    parser.add_argument("--video-resolutions", nargs="+", choices=RESOLUTIONS, default=["720p", "1080p"],
+                        help="Video resolutions to benchmark")
+    parser.add_argument("--video-keywords", nargs="+", type=int, default=[1, 2, 3],
+                        help="Keyword counts to benchmark for videos")
+    parser.add_argument("--frames", type=int, default=30, help="Frames per synthetic video")
+    parser.add_argument("--stages", nargs="+", default=["image", "video", "write_video"],
+                        choices=["image", "video", "write_video"], help="Stages to run")
+    parser.add_argument("--quick", action="store_true",
+                        help="Smoke-test sized run (720p, 1-2 keywords, 10 frames)")
+    parser.add_argument("--output", default=str(Path(__file__).parent / "results" / "segmenter.json"),
+                        help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.resolutions = args.video_resolutions = ["720p"]
+        args.keywords = args.video_keywords = [1, 2]
+        args.frames = 10
+
+    results = []
+    def record(case, stage, func, *func_args):
+        print(f"Running {case} [{stage}]...")
+        metrics = run_isolated(func, *func_args)
+        results.append({"case": case, "stage": stage, **metrics})
+
+    if "image" in args.stages:
+        for res in args.resolutions:
+            for k in args.keywords:
+                record(f"image/{res}/k{k}", "image_combinations",
+                       bench_image_combinations, *RESOLUTIONS[res], k)
+    if "video" in args.stages:
+        for res in args.video_resolutions:
+            for k in args.video_keywords:
+                record(f"video/{res}/k{k}/f{args.frames}", "video_combinations",
+                       bench_video_combinations, *RESOLUTIONS[res], k, args.frames)
+    if "write_video" in args.stages:
+        for res in args.video_resolutions:
+            record(f"video/{res}/f{args.frames}", "write_video",
+                   bench_write_video, *RESOLUTIONS[res], args.frames)
+
+    sys.exit(common.finish("segmenter", results, args.output, args.baseline, METRICS))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Serving benchmarks
+
+Simulates a new daily game going live: thousands of players, each an
+asyncio task, fetch the current game the moment it becomes active and then
+submit guesses. Reports throughput, latency percentiles and error rates per
+request type.
+
+Games are seeded with schedule_game.commit_games into local stand-ins (a
+throwaway redis-server and a PostgreSQL server), so the Redis layout is the
+scheduler's own. Each case crosses a target with a storage format:
+
+- targets: how players fetch the game
+  - service: HTTP GETs to game_service.py, started against the stand-ins
+  - redis: the payload built straight from Redis per request, as the
+    frontend's /api/current-game route does
+- formats: how a keyword's similarity data is stored
+  - hash: one Redis hash per keyword (the scheduler's layout); a guess is
+    an HGET
+  - json: one JSON string per keyword; a guess GETs and parses it
+
+The frontend scores guesses locally, so a guess here models the lookup a
+server-side guess check would make.
+
+Usage:
+    python bench/bench_serving.py --database-url postgresql://user@localhost/bench
+    python bench/bench_serving.py --players 5000 --guesses 10 --targets service --formats hash json
+    python bench/bench_serving.py --think-ms 500 --ramp-s 10 --baseline bench/results/serving.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import common
+from common import BACKEND_DIR, percentiles
+from services import LocalPostgres, LocalRedis, free_port
+
+METRICS = ("count", "errors", "error_rate", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms")
+
+TARGETS = ("service", "redis")
+FORMATS = ("hash", "json")
+
+# Prefix of the keys holding the json format of a similarity version
+JSON_PREFIX = "bench_json:"
+
+@dataclass
+class Scenario:
+    """What the players do, shared by every case."""
+    players: int
+    guesses: int
+    think_ms: float
+    ramp_s: float
+    hit_rate: float
+    encoding: str
+    timeout_s: float
+
+@dataclass
+class SeededGame:
+    """A game committed for one case."""
+    prompt_id: str
+    game_id: int
+    keywords: List[str]
+    # Similarity version key of each keyword
+    versions: Dict[str, str]
+    # Words per keyword that score, to draw guesses from
+    words: Dict[str, List[str]]
+    date_active: datetime
+
+class StaleGame(Exception):
+    """The previous game was served after the new one went live."""
+
+@dataclass
+class Recorder:
+    """Latencies and errors per request type."""
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Dict[str, Counter] = field(default_factory=lambda: defaultdict(Counter))
+
+    async def time(self, stage: str, request, check: Optional[Callable[[Any], None]] = None) -> Optional[Any]:
+        """Await a request; errors, including those check raises, are counted by type."""
+        start = time.perf_counter()
+        try:
+            result = await request
+            if check:
+                check(result)
+        except Exception as e:
+            self.errors[stage][type(e).__name__] += 1
+            return None
+        self.latencies[stage].append(time.perf_counter() - start)
+        return result
+
+def seed_game(work_dir: Path, prompt_id: str, date_active: datetime, num_keywords: int,
+              top_n: int, seed: int, formats: List[str]) -> SeededGame:
+    """
+    Commit a game with schedule_game and, for the json format, a JSON copy of
+    each similarity hash.
+    """
+    import schedule_game
+
+    rng = random.Random(seed)
+    keywords = [f"{prompt_id.replace('-', '')}k{i}" for i in range(num_keywords)]
+    similarity_data = {
+        kw: {f"w{j}": round(rng.random(), 4) for j in range(top_n)} | {kw: 1.0}
+        for kw in keywords
+    }
+    config = {
+        "image": f"{prompt_id}.png",
+        "prompt": "A synthetic prompt with " + " and ".join(f"[{kw}]" for kw in keywords),
+        "keywords": keywords,
+        "speech_type": ["noun"] * num_keywords,
+    }
+    game_file = work_dir / f"{prompt_id}.json"
+    game_file.write_text(json.dumps(config))
+    pixelation_map = {
+        f"{'_'.join(map(str, range(i + 1)))}.webp": f"https://blob.example/{prompt_id}/{i}.webp"
+        for i in range(2 ** num_keywords)
+    }
+
+    connections = schedule_game.get_connections()
+    with contextlib.redirect_stdout(io.StringIO()):
+        game_id, = schedule_game.commit_games(
+            [(str(game_file), f"https://blob.example/{prompt_id}.png", pixelation_map, date_active.isoformat())],
+            {prompt_id: keywords}, similarity_data, connections,
+        )
+    versions = {kw: schedule_game.similarity_key(kw) for kw in keywords}
+    if "json" in formats:
+        connections.redis().mset({
+            JSON_PREFIX + versions[kw]: json.dumps(similarity_data[kw]) for kw in keywords
+        })
+    return SeededGame(prompt_id, game_id, keywords, versions,
+                      {kw: list(similarity_data[kw]) for kw in keywords}, date_active)
+
+def remove_games(games: List[SeededGame]) -> None:
+    """
+    Remove seeded games from PostgreSQL and Redis: the index, each game's
+    keys and references, the similarity versions nothing references any
+    more and their json copies.
+    """
+    import schedule_game
+    from active_games import queue_removed_games
+
+    connections = schedule_game.get_connections()
+    with connections.postgres() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM games WHERE id = ANY(%s)", ([game.game_id for game in games],))
+        conn.commit()
+    redis_client = connections.redis()
+    pipeline = redis_client.pipeline(transaction=False)
+    queue_removed_games(pipeline, [game.game_id for game in games])
+    pipeline.execute()
+    for game in games:
+        schedule_game.release_similarity_refs(redis_client, game.prompt_id, game.keywords)
+    schedule_game.collect_similarity_garbage(redis_client)
+    json_keys = [JSON_PREFIX + version for game in games for version in game.versions.values()]
+    if json_keys:
+        redis_client.unlink(*json_keys)
+
+class HttpClient:
+    """One player's keep-alive connection to the game service."""
+
+    def __init__(self, port: int, encoding: str):
+        self.port = port
+        self.encoding = encoding
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path: str) -> bytes:
+        """GET a path and return the decompressed body."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: bench\r\nAccept-Encoding: {self.encoding}\r\n\r\n".encode()
+        )
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        status = int(head.split(" ", 2)[1])
+        headers = dict(
+            (name.lower(), value.strip())
+            for name, _, value in (line.partition(":") for line in head.split("\r\n")[1:] if line)
+        )
+        body = await self.reader.readexactly(int(headers["content-length"]))
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}")
+        if headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        elif headers.get("content-encoding") == "br":
+            import brotli
+            body = brotli.decompress(body)
+        return body
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+async def fetch_from_redis(redis_client, format: str) -> dict:
+    """Build the current game's payload from Redis, as the frontend route does."""
+    from active_games import ACTIVE_GAMES_KEY, CURRENT_GAME_CANDIDATES, decode_game, game_meta_key
+
+    candidates = await redis_client.zrevrangebyscore(
+        ACTIVE_GAMES_KEY, time.time(), "-inf", start=0, num=CURRENT_GAME_CANDIDATES, withscores=True
+    )
+    latest = [game_id for game_id, score in candidates if score == candidates[0][1]]
+    game = decode_game(await redis_client.hgetall(game_meta_key(random.choice(latest).decode())))
+    versions = await redis_client.hgetall(f"game:{game['prompt_id']}:similarity")
+    keywords = [kw.lower() for kw in game["keywords"]]
+    pipeline = redis_client.pipeline(transaction=False)
+    for kw in keywords:
+        version = versions[kw.encode()].decode()
+        if format == "hash":
+            pipeline.hgetall(version)
+        else:
+            pipeline.get(JSON_PREFIX + version)
+    similarity_data = {}
+    for kw, data in zip(keywords, await pipeline.execute()):
+        if format == "hash":
+            similarity_data[kw] = {word.decode(): float(score) for word, score in data.items()}
+        else:
+            similarity_data[kw] = json.loads(data)
+    return {**game, "similarity_data": similarity_data}
+
+async def submit_guess(redis_client, format: str, version: str, word: str) -> float:
+    """Score one guessed word against a keyword."""
+    if format == "hash":
+        score = await redis_client.hget(version, word)
+        return float(score) if score is not None else 0.0
+    return json.loads(await redis_client.get(JSON_PREFIX + version)).get(word, 0.0)
+
+async def run_case(target: str, format: str, game: SeededGame, scenario: Scenario,
+                   redis_url: str, port: Optional[int], redis_connections: int) -> Dict[str, object]:
+    """Run every player against one case and return the recorder and wall time."""
+    import redis.asyncio
+
+    pool = redis.asyncio.BlockingConnectionPool.from_url(
+        redis_url, max_connections=redis_connections, timeout=scenario.timeout_s
+    )
+    redis_client = redis.asyncio.Redis(connection_pool=pool)
+    recorder = Recorder()
+    loop = asyncio.get_running_loop()
+    go_live = loop.time() + max(0.0, game.date_active.timestamp() - time.time())
+
+    def check_game(payload: dict | bytes) -> None:
+        # The service's body isn't parsed, so that the load generator's CPU
+        # goes to generating load
+        if isinstance(payload, dict):
+            served = payload["prompt_id"] == game.prompt_id
+        else:
+            served = f'"prompt_id":"{game.prompt_id}"'.encode() in payload
+        if not served:
+            raise StaleGame()
+
+    async def player(index: int) -> None:
+        rng = random.Random(index)
+        await asyncio.sleep(max(0.0, go_live + scenario.ramp_s * index / scenario.players - loop.time()))
+        session_start = time.perf_counter()
+        client = HttpClient(port, scenario.encoding) if target == "service" else None
+        try:
+            if client:
+                request = client.get("/api/current-game")
+            else:
+                request = fetch_from_redis(redis_client, format)
+            if await recorder.time("fetch", asyncio.wait_for(request, scenario.timeout_s), check_game) is None:
+                return
+            for _ in range(scenario.guesses):
+                if scenario.think_ms:
+                    await asyncio.sleep(rng.expovariate(1000 / scenario.think_ms))
+                keyword = rng.choice(game.keywords)
+                word = rng.choice(game.words[keyword]) if rng.random() < scenario.hit_rate else f"miss{rng.random()}"
+                request = submit_guess(redis_client, format, game.versions[keyword], word)
+                await recorder.time("guess", asyncio.wait_for(request, scenario.timeout_s))
+            recorder.latencies["session"].append(time.perf_counter() - session_start)
+        finally:
+            if client:
+                client.close()
+
+    start = loop.time()
+    await asyncio.gather(*[player(i) for i in range(scenario.players)])
+    wall = loop.time() - max(start, go_live)
+    await redis_client.aclose()
+    await pool.disconnect()
+    return {"recorder": recorder, "wall_s": wall}
+
+def summarize(case: str, recorder: Recorder, wall: float) -> List[dict]:
+    """Turn a case's latencies and errors into result records."""
+    records = []
+    for stage in ("fetch", "guess", "session"):
+        values = recorder.latencies.get(stage, [])
+        errors = sum(recorder.errors.get(stage, Counter()).values())
+        total = len(values) + errors
+        if not total:
+            continue
+        records.append({
+            "case": case,
+            "stage": stage,
+            "count": total,
+            "errors": errors,
+            "error_rate": errors / total,
+            "throughput_per_s": len(values) / wall if wall else 0.0,
+            **percentiles(values),
+        })
+        if errors:
+            print(f"  {stage} errors: {dict(recorder.errors[stage])}")
+    return records
+
+@contextlib.contextmanager
+def game_service(redis_url: str, database_url: str, ready_for: SeededGame):
+    """
+    Run game_service.py against the stand-ins until the block exits.
+
+    Yields once the service has cached the game that is live now and knows
+    when the seeded game goes live.
+    """
+    import urllib.request
+
+    port = free_port()
+    env = dict(os.environ, REDIS_URL=redis_url, DATABASE_URL=database_url)
+    process = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "game_service.py"), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        expected = ready_for.date_active.isoformat()
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("game_service.py exited; run it by hand to see why")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/next-game-time", timeout=1) as response:
+                    if json.load(response)["nextGameTime"] == expected:
+                        break
+            except OSError:
+                pass
+            if time.time() >= ready_for.date_active.timestamp():
+                raise RuntimeError("game_service.py wasn't ready before go-live; raise --go-live-delay")
+            time.sleep(0.05)
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    """Entry point for command line usage."""
+    parser = argparse.ArgumentParser(description="Load test the game serving path as a new game goes live")
+    parser.add_argument("--players", type=int, default=2000, help="Concurrent players per case")
+    parser.add_argument("--guesses", type=int, default=5, help="Guesses each player submits")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause before each guess (exponential)")
+    parser.add_argument("--ramp-s", type=float, default=0, help="Spread player arrivals over this many seconds")
+    parser.add_argument("--hit-rate", type=float, default=0.5, help="Fraction of guesses that are similar words")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS), help="How players fetch games")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS),
+                        help="How similarity data is stored")
+    parser.add_argument("--encoding", default="gzip", help="Accept-Encoding sent to the game service")
+    parser.add_argument("--keywords", type=int, default=3, help="Keywords per game")
+    parser.add_argument("--top-n", type=int, default=1000, help="Similar words stored per keyword")
+    parser.add_argument("--redis-connections", type=int, default=64, help="Redis pool size of the load generator")
+    parser.add_argument("--timeout-s", type=float, default=10, help="Per-request timeout, counted as an error")
+    parser.add_argument("--go-live-delay", type=float, default=3,
+                        help="Seconds between seeding a case's game and it going live")
+    parser.add_argument("--redis-url", help="Use this Redis instead of starting redis-server")
+    parser.add_argument("--database-url", help="Use this PostgreSQL instead of starting a temporary cluster")
+    parser.add_argument("--pg-bin", help="Directory containing initdb and pg_ctl")
+    parser.add_argument("--output", default=str(Path(__file__).parent / "results" / "serving.json"),
+                        help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    args = parser.parse_args()
+
+    scenario = Scenario(args.players, args.guesses, args.think_ms, args.ramp_s, args.hit_rate,
+                        args.encoding, args.timeout_s)
+    results = []
+    seeded = []
+    with LocalRedis(args.redis_url) as local_redis, \
+         LocalPostgres(args.database_url, args.pg_bin) as local_pg, \
+         tempfile.TemporaryDirectory() as tmp:
+        os.environ["REDIS_URL"] = local_redis.url
+        os.environ["DATABASE_URL"] = local_pg.url
+
+        import schedule_game
+
+        schedule_game.close_connections()
+        run_id = int(time.time())
+        try:
+            # Yesterday's game is live until each case's game replaces it
+            seeded.append(seed_game(Path(tmp), f"bench{run_id}-previous", datetime.now(timezone.utc) - timedelta(days=1),
+                                    args.keywords, args.top_n, 0, args.formats))
+            for target in args.targets:
+                for format in args.formats:
+                    case = f"{target}/{format}"
+                    date_active = datetime.now(timezone.utc) + timedelta(seconds=args.go_live_delay)
+                    game = seed_game(Path(tmp), f"bench{run_id}-{target}-{format}", date_active,
+                                     args.keywords, args.top_n, len(seeded), args.formats)
+                    seeded.append(game)
+                    print(f"{case}: {args.players} players go live at {date_active:%H:%M:%S.%f}...")
+                    with game_service(local_redis.url, local_pg.url, game) if target == "service" \
+                            else contextlib.nullcontext() as port:
+                        outcome = asyncio.run(run_case(target, format, game, scenario, local_redis.url,
+                                                       port, args.redis_connections))
+                    results.extend(summarize(case, outcome["recorder"], outcome["wall_s"]))
+        finally:
+            if seeded:
+                remove_games(seeded)
+            schedule_game.close_connections()
+
+    sys.exit(common.finish("serving", results, args.output, args.baseline, METRICS))
+
+if __name__ == "__main__":
+    main()
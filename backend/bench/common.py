@@ -0,0 +1,270 @@
+"""
+Shared helpers for the backend benchmark suites.
+
+Every benchmark produces a list of result records of the form
+``{"case": ..., "stage": ..., "<metric>": value, ...}`` which are written to a
+JSON results file together with some run metadata. A results file can later
+be passed as ``--baseline`` to compare a new run against it.
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import traceback
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Make the backend modules importable when running `python bench/<script>.py`
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.append(str(BACKEND_DIR))
+
+# Metrics where a larger value in the new run is a regression, with the
+# default relative tolerance before a difference is reported.
+DEFAULT_TOLERANCES = {
+    "wall_s": 0.15,
+    "peak_rss_bytes": 0.10,
+    "rss_growth_bytes": 0.10,
+    "output_bytes": 0.05,
+    "p50_ms": 0.15,
+    "p95_ms": 0.20,
+    "p99_ms": 0.25,
+}
+
+# Differences smaller than this are treated as noise regardless of tolerance
+NOISE_FLOOR = {
+    "wall_s": 0.01,
+    "peak_rss_bytes": 16 * 1024 * 1024,
+    "rss_growth_bytes": 16 * 1024 * 1024,
+    "p50_ms": 1.0,
+    "p95_ms": 1.0,
+    "p99_ms": 1.0,
+}
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the kernel's peak RSS counter for this process.
+
+    Returns:
+        True if the counter was reset (Linux only), False otherwise
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_bytes() -> int:
+    """Return this process's peak resident set size in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def current_rss_bytes() -> int:
+    """Return this process's current resident set size in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def measure(func: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Time a single stage in the current process.
+
+    Inputs built before calling this are excluded from the wall time; they
+    still count towards peak RSS since they stay resident during the stage.
+
+    Returns:
+        Dictionary with ``wall_s``, ``peak_rss_bytes`` and ``rss_growth_bytes``
+        (peak minus the RSS when the stage started)
+    """
+    reset_peak_rss()
+    start_rss = current_rss_bytes()
+    start = time.perf_counter()
+    func()
+    wall = time.perf_counter() - start
+    peak = peak_rss_bytes()
+    return {"wall_s": wall, "peak_rss_bytes": peak, "rss_growth_bytes": max(0, peak - start_rss)}
+
+def directory_bytes(path: str | Path) -> int:
+    """Return the total size of all files under a directory."""
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+def _isolated_child(conn, func, args, kwargs):
+    try:
+        reset_peak_rss()
+        start = time.perf_counter()
+        extra = func(*args, **kwargs) or {}
+        wall = time.perf_counter() - start
+        conn.send({"ok": True, "wall_s": wall, "peak_rss_bytes": peak_rss_bytes(), **extra})
+    except BaseException as e:
+        conn.send({"ok": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()})
+    finally:
+        conn.close()
+
+def run_isolated(func: Callable[..., Optional[Dict[str, Any]]], *args, **kwargs) -> Dict[str, Any]:
+    """
+    Run ``func`` in a forked child process and measure it.
+
+    Running each stage in its own process keeps peak RSS measurements from
+    leaking between stages. ``func`` may return a dict of extra metrics
+    (e.g. ``output_bytes``) which is merged into the result.
+
+    Returns:
+        Dictionary with ``wall_s``, ``peak_rss_bytes`` and any extra metrics
+
+    Raises:
+        RuntimeError: If the stage raised or the child died
+    """
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    ctx = multiprocessing.get_context(method)
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_isolated_child, args=(child_conn, func, args, kwargs))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {"ok": False, "error": f"child exited with code {process.exitcode}"}
+    process.join()
+
+    if not result.pop("ok"):
+        raise RuntimeError(f"{result['error']}\n{result.get('traceback', '')}")
+    return result
+
+def percentiles(values: Sequence[float], points: Sequence[int] = (50, 95, 99)) -> Dict[str, float]:
+    """
+    Compute nearest-rank percentiles of a list of latencies in seconds.
+
+    Returns:
+        Dictionary such as ``{"p50_ms": ..., "p95_ms": ..., "p99_ms": ...}``
+    """
+    if not values:
+        return {f"p{p}_ms": 0.0 for p in points}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        rank = max(1, -(-p * len(ordered) // 100))  # ceil(p/100 * n)
+        result[f"p{p}_ms"] = ordered[rank - 1] * 1000
+    return result
+
+def run_metadata() -> Dict[str, Any]:
+    """Describe the machine and revision a benchmark ran on."""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        revision = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def write_results(path: str | Path, suite: str, results: List[Dict[str, Any]]) -> None:
+    """Write benchmark results and run metadata to a JSON file."""
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, "w") as f:
+        json.dump({"suite": suite, "meta": run_metadata(), "results": results}, f, indent=2)
+    print(f"Saved results to {path}")
+
+def load_results(path: str | Path) -> Dict[str, Any]:
+    """Load a results file written by write_results."""
+    with open(path) as f:
+        return json.load(f)
+
+def compare_to_baseline(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    tolerances: Optional[Dict[str, float]] = None
+) -> List[str]:
+    """
+    Compare results against a baseline results file.
+
+    Records are matched on (case, stage). A metric regresses when it grew by
+    more than its relative tolerance.
+
+    Returns:
+        Human readable descriptions of each regression (empty if none)
+    """
+    tolerances = tolerances or DEFAULT_TOLERANCES
+    previous = {(r["case"], r["stage"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for record in results:
+        old = previous.get((record["case"], record["stage"]))
+        if old is None:
+            continue
+        for metric, tolerance in tolerances.items():
+            if metric not in record or not old.get(metric):
+                continue
+            delta = record[metric] - old[metric]
+            change = delta / old[metric]
+            if change > tolerance and delta > NOISE_FLOOR.get(metric, 0):
+                regressions.append(
+                    f"{record['case']} [{record['stage']}] {metric}: "
+                    f"{old[metric]:.4g} -> {record[metric]:.4g} (+{change:.0%}, tolerance {tolerance:.0%})"
+                )
+    return regressions
+
+def print_results(results: List[Dict[str, Any]], metrics: Sequence[str]) -> None:
+    """Print results as an aligned table."""
+    header = ["case", "stage", *metrics]
+    rows = [[str(r.get(col, "")) if not isinstance(r.get(col), float) else f"{r[col]:.4g}"
+             for col in header] for r in results]
+    widths = [max(len(h), *(len(row[i]) for row in rows)) if rows else len(h)
+              for i, h in enumerate(header)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print("  ".join(cell.ljust(w) for cell, w in zip(row, widths)))
+
+def finish(
+    suite: str,
+    results: List[Dict[str, Any]],
+    output: str | Path,
+    baseline: Optional[str | Path],
+    metrics: Sequence[str]
+) -> int:
+    """
+    Print, save and optionally compare results.
+
+    Returns:
+        Process exit code: 1 if any metric regressed against the baseline
+    """
+    print()
+    print_results(results, metrics)
+    write_results(output, suite, results)
+    if not baseline:
+        return 0
+
+    regressions = compare_to_baseline(results, load_results(baseline))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions against {baseline}")
+    return 0
@@ -0,0 +1,289 @@
+"""
+Local stand-ins for the scheduler's external services.
+
+- LocalRedis: a throwaway ``redis-server`` process
+- LocalPostgres: a temporary cluster created with ``initdb``/``pg_ctl``,
+  migrated with migrations.py
+- LocalBlobStore: an in-process HTTP server speaking the subset of the Vercel
+  Blob API that vercel_blob uses (put, head, list, delete), plus plain GETs of
+  the returned URLs
+
+Each can instead wrap an existing service by passing its URL, in which case
+nothing is started or torn down.
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import common  # noqa: F401  (puts the backend on sys.path)
+
+def free_port() -> int:
+    """Return a TCP port that is currently free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def find_binary(name: str, search_dir: Optional[str] = None) -> str:
+    """
+    Locate a server binary in ``search_dir`` or on PATH.
+
+    Raises:
+        RuntimeError: If the binary can't be found
+    """
+    if search_dir:
+        candidate = Path(search_dir) / name
+        if candidate.exists():
+            return str(candidate)
+    found = shutil.which(name)
+    if not found:
+        raise RuntimeError(
+            f"'{name}' not found on PATH; install it or pass the URL of a running service"
+        )
+    return found
+
+class LocalRedis:
+    """A redis-server process on a free port, without persistence."""
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url
+        self._process = None
+
+    def __enter__(self) -> "LocalRedis":
+        if self.url:
+            return self
+        import redis
+
+        port = free_port()
+        self._process = subprocess.Popen(
+            [find_binary("redis-server"), "--port", str(port), "--bind", "127.0.0.1",
+             "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.url = f"redis://127.0.0.1:{port}/0"
+        client = redis.Redis.from_url(self.url)
+        for _ in range(100):
+            try:
+                client.ping()
+                break
+            except redis.ConnectionError:
+                time.sleep(0.05)
+        else:
+            self.__exit__(None, None, None)
+            raise RuntimeError("redis-server did not start")
+        client.close()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+
+class LocalPostgres:
+    """
+    A temporary PostgreSQL cluster, migrated to the current schema.
+
+    PostgreSQL refuses to run as root; in that case start a server yourself
+    and pass its URL instead.
+    """
+
+    def __init__(self, url: Optional[str] = None, bin_dir: Optional[str] = None):
+        self.url = url
+        self.bin_dir = bin_dir or os.environ.get("PG_BIN")
+        self._data_dir = None
+
+    def __enter__(self) -> "LocalPostgres":
+        if not self.url:
+            self._start()
+        self._migrate()
+        return self
+
+    def _start(self) -> None:
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            raise RuntimeError("PostgreSQL cannot run as root; pass --database-url instead")
+        self._data_dir = tempfile.mkdtemp(prefix="bench-pg-")
+        port = free_port()
+        subprocess.run(
+            [find_binary("initdb", self.bin_dir), "-D", self._data_dir, "-U", "bench",
+             "--auth=trust", "--no-sync"],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        subprocess.run(
+            [find_binary("pg_ctl", self.bin_dir), "-D", self._data_dir, "-w",
+             "-l", os.path.join(self._data_dir, "server.log"),
+             "-o", f"-p {port} -k {self._data_dir} -c listen_addresses=127.0.0.1",
+             "start"],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        self.url = f"postgresql://bench@127.0.0.1:{port}/postgres"
+
+    def _migrate(self) -> None:
+        import psycopg2
+        from migrations import run_migrations
+
+        conn = psycopg2.connect(self.url)
+        try:
+            run_migrations(conn)
+        finally:
+            conn.close()
+
+    def __exit__(self, *exc) -> None:
+        if self._data_dir is None:
+            return
+        subprocess.run(
+            [find_binary("pg_ctl", self.bin_dir), "-D", self._data_dir, "-m", "immediate", "stop"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        shutil.rmtree(self._data_dir, ignore_errors=True)
+        self._data_dir = None
+
+class _BlobHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_PUT(self):
+        store: LocalBlobStore = self.server.store
+        pathname = parse_qs(urlparse(self.path).query).get("pathname", [""])[0]
+        data = self._read_body()
+        if not pathname:
+            return self._send_json(400, {"error": {"message": "pathname is required"}})
+        with store.lock:
+            if pathname in store.blobs and self.headers.get("x-allow-overwrite") != "1":
+                return self._send_json(400, {"error": {"message": "This blob already exists"}})
+            store.blobs[pathname] = {
+                "data": data,
+                "contentType": self.headers.get("x-content-type", "application/octet-stream"),
+                "cacheControl": f"public, max-age={self.headers.get('x-cache-control-max-age')}",
+            }
+        self._send_json(200, {
+            "url": store.url_for(pathname),
+            "pathname": pathname,
+            "contentType": store.blobs[pathname]["contentType"],
+        })
+
+    def do_GET(self):
+        store: LocalBlobStore = self.server.store
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if parsed.path == "/" and "url" not in query:
+            # list(): blobs whose pathname starts with a prefix
+            prefix = query.get("prefix", [""])[0]
+            limit = int(query.get("limit", ["1000"])[0])
+            with store.lock:
+                pathnames = sorted(p for p in store.blobs if p.startswith(prefix))
+            return self._send_json(200, {
+                "blobs": [
+                    {"url": store.url_for(p), "pathname": p, "size": len(store.blobs[p]["data"])}
+                    for p in pathnames[:limit]
+                ],
+                "cursor": None,
+                "hasMore": len(pathnames) > limit,
+            })
+        if parsed.path == "/" and "url" in query:
+            # head(): metadata lookup by URL
+            pathname = store.pathname_for(query["url"][0])
+            blob = store.blobs.get(pathname)
+            if blob is None:
+                return self._send_json(404, {"error": {"code": "not_found"}})
+            return self._send_json(200, {
+                "url": store.url_for(pathname),
+                "pathname": pathname,
+                "size": len(blob["data"]),
+                "contentType": blob["contentType"],
+                "cacheControl": blob["cacheControl"],
+            })
+
+        blob = store.blobs.get(parsed.path.lstrip("/"))
+        if blob is None:
+            return self._send_json(404, {"error": {"code": "not_found"}})
+        self.send_response(200)
+        self.send_header("Content-Type", blob["contentType"])
+        self.send_header("Content-Length", str(len(blob["data"])))
+        self.send_header("Cache-Control", blob["cacheControl"])
+        self.end_headers()
+        self.wfile.write(blob["data"])
+
+    def do_POST(self):
+        store: LocalBlobStore = self.server.store
+        if urlparse(self.path).path != "/delete":
+            return self._send_json(404, {"error": {"code": "not_found"}})
+        urls = json.loads(self._read_body() or b"{}").get("urls", [])
+        with store.lock:
+            for url in urls:
+                store.blobs.pop(store.pathname_for(url), None)
+        self._send_json(200, {})
+
+class LocalBlobStore:
+    """
+    In-memory Vercel Blob stand-in served over HTTP on localhost.
+
+    While active, vercel_blob's API base URL points at this server.
+    """
+
+    def __init__(self):
+        self.blobs: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.base_url = None
+        self._server = None
+        self._thread = None
+        self._previous_base_url = None
+        self._previous_token = None
+
+    def url_for(self, pathname: str) -> str:
+        return f"{self.base_url}/{pathname}"
+
+    def pathname_for(self, url: str) -> str:
+        return urlparse(url).path.lstrip("/")
+
+    @property
+    def total_bytes(self) -> int:
+        with self.lock:
+            return sum(len(blob["data"]) for blob in self.blobs.values())
+
+    def __enter__(self) -> "LocalBlobStore":
+        import vercel_blob.blob_store
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _BlobHandler)
+        self._server.daemon_threads = True
+        self._server.store = self
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        self._previous_base_url = vercel_blob.blob_store._VERCEL_BLOB_API_BASE_URL
+        self._previous_token = os.environ.get("BLOB_READ_WRITE_TOKEN")
+        vercel_blob.blob_store._VERCEL_BLOB_API_BASE_URL = self.base_url
+        os.environ.setdefault("BLOB_READ_WRITE_TOKEN", "local-bench-token")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        import vercel_blob.blob_store
+
+        vercel_blob.blob_store._VERCEL_BLOB_API_BASE_URL = self._previous_base_url
+        if self._previous_token is None:
+            os.environ.pop("BLOB_READ_WRITE_TOKEN", None)
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,239 @@
+"""
+Encoding
+
+WEBP encoding of combinations within a per-asset budget, instead of at one
+fixed quality. An EncodingBudget says what each image must achieve:
+
+    min_ssim    use the lowest quality whose output is at least this similar
+                (SSIM on luma) to the composite
+    max_bytes   lower the quality until the output fits, down to min_quality
+
+A WebpEncoder searches the quality, and optionally the WEBP method, for the
+first image of each size it's given. Combinations of one source share most
+of their pixels, so the rest reuse what it found and are only searched again
+when they would exceed max_bytes. The first combination is the unpixelated
+one, the hardest to compress, so the reused settings err on the safe side.
+
+Each encoder counts the bytes it saved against max_quality, measured on the
+images it searched and estimated from them for the rest.
+"""
+
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from instrumentation import emit
+
+# The fixed quality combinations were saved at before budgets, and the
+# ceiling of every search
+DEFAULT_QUALITY = 90
+# Below this, pixelation blocks start to ring visibly whatever SSIM says
+MIN_QUALITY = 60
+# Qualities are searched in steps of this size
+QUALITY_STEP = 5
+DEFAULT_MIN_SSIM = 0.985
+# WEBP methods trade encoding time for size (0 fastest, 6 smallest); PIL's
+# default is 4
+DEFAULT_METHODS = (4,)
+# SSIM is computed over non-overlapping blocks of this many pixels per side
+SSIM_BLOCK = 8
+
+@dataclass(frozen=True)
+class EncodingBudget:
+    """What each encoded image must achieve; see the module docstring."""
+    min_ssim: Optional[float] = DEFAULT_MIN_SSIM
+    max_bytes: Optional[int] = None
+    min_quality: int = MIN_QUALITY
+    max_quality: int = DEFAULT_QUALITY
+    methods: Tuple[int, ...] = DEFAULT_METHODS
+
+    @classmethod
+    def fixed(cls, quality: int = DEFAULT_QUALITY, method: int = 4) -> EncodingBudget:
+        """A budget that always encodes at one quality and method, without searching."""
+        return cls(min_ssim=None, min_quality=quality, max_quality=quality, methods=(method,))
+
+    def qualities(self) -> list[int]:
+        """Candidate qualities, lowest first, always including max_quality."""
+        candidates = list(range(self.min_quality, self.max_quality, QUALITY_STEP))
+        return [*candidates, self.max_quality]
+
+def block_ssim(a: np.ndarray, b: np.ndarray, block: int = SSIM_BLOCK) -> float:
+    """
+    Mean SSIM of two equally sized luma images over non-overlapping blocks.
+
+    Args:
+        a: Reference image as a (height, width) uint8 array
+        b: Distorted image of the same shape
+        block: Block size in pixels; edges that don't fill a block are ignored
+
+    Returns:
+        Mean SSIM, 1.0 for identical images
+    """
+    height, width = (a.shape[0] // block) * block, (a.shape[1] // block) * block
+    if not height or not width:
+        return 1.0 if np.array_equal(a, b) else 0.0
+    shape = (height // block, block, width // block, block)
+    a = a[:height, :width].astype(np.float32).reshape(shape)
+    b = b[:height, :width].astype(np.float32).reshape(shape)
+    mean_a, mean_b = a.mean(axis=(1, 3), keepdims=True), b.mean(axis=(1, 3), keepdims=True)
+    var_a, var_b = a.var(axis=(1, 3)), b.var(axis=(1, 3))
+    covariance = ((a - mean_a) * (b - mean_b)).mean(axis=(1, 3))
+    mean_a, mean_b = mean_a[:, 0, :, 0], mean_b[:, 0, :, 0]
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ssim = ((2 * mean_a * mean_b + c1) * (2 * covariance + c2)) / (
+        (mean_a ** 2 + mean_b ** 2 + c1) * (var_a + var_b + c2)
+    )
+    return float(ssim.mean())
+
+def encode_webp(image: Image.Image, quality: int, method: int) -> bytes:
+    """Encode an image as WEBP in memory."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, method=method)
+    return buffer.getvalue()
+
+@dataclass
+class EncodingStats:
+    """Bytes an encoder wrote, and what max_quality would have written."""
+    images: int = 0
+    searched: int = 0
+    encodes: int = 0
+    bytes: int = 0
+    # Measured for searched images, estimated for the rest
+    baseline_bytes: float = 0.0
+
+    @property
+    def saved_bytes(self) -> float:
+        return self.baseline_bytes - self.bytes
+
+class WebpEncoder:
+    """
+    Encodes the images of one source within a budget.
+
+    Settings found by a search are memoized per image size, so the
+    combinations of a source, and each size of their renditions, are
+    searched once.
+    """
+
+    def __init__(self, budget: Optional[EncodingBudget] = None):
+        self.budget = budget or EncodingBudget()
+        self.stats = EncodingStats()
+        # (width, height) -> (quality, method, bytes at max_quality / bytes chosen)
+        self._settings: Dict[Tuple[int, int], Tuple[int, int, float]] = {}
+
+    def encode(self, image: Image.Image) -> Tuple[bytes, int, int]:
+        """
+        Encode an image within the budget.
+
+        Returns:
+            Tuple of (WEBP bytes, quality, method)
+        """
+        budget = self.budget
+        settings = self._settings.get(image.size)
+        if settings is None:
+            data, quality, method, baseline = self._search(image)
+            self._settings.setdefault(image.size, (quality, method, baseline / len(data)))
+            self.stats.searched += 1
+        else:
+            quality, method, ratio = settings
+            data = encode_webp(image, quality, method)
+            self.stats.encodes += 1
+            if budget.max_bytes is not None and len(data) > budget.max_bytes:
+                data, quality = self._fit(image, quality, method, data)
+            baseline = len(data) * ratio
+        self.stats.images += 1
+        self.stats.bytes += len(data)
+        self.stats.baseline_bytes += baseline
+        return data, quality, method
+
+    def save(self, image: Image.Image, path: str | Path) -> Tuple[int, int]:
+        """Encode an image within the budget and write it to path; returns (quality, method)."""
+        data, quality, method = self.encode(image)
+        Path(path).write_bytes(data)
+        return quality, method
+
+    def _search(self, image: Image.Image) -> Tuple[bytes, int, int, int]:
+        """Find the settings for an image; returns (bytes, quality, method, bytes at max_quality)."""
+        budget = self.budget
+        qualities = budget.qualities()
+        reference = np.asarray(image.convert("L")) if budget.min_ssim is not None else None
+        encoded: Dict[Tuple[int, int], bytes] = {}
+
+        def attempt(quality: int, method: int) -> bytes:
+            if (quality, method) not in encoded:
+                encoded[quality, method] = encode_webp(image, quality, method)
+                self.stats.encodes += 1
+            return encoded[quality, method]
+
+        def acceptable(quality: int) -> bool:
+            data = attempt(quality, budget.methods[0])
+            if reference is not None:
+                decoded = np.asarray(Image.open(io.BytesIO(data)).convert("L"))
+                if block_ssim(reference, decoded) < budget.min_ssim:
+                    return False
+            return budget.max_bytes is None or len(data) <= budget.max_bytes
+
+        baseline = len(attempt(budget.max_quality, budget.methods[0]))
+        if reference is None and budget.max_bytes is None:
+            chosen = budget.max_quality
+        elif reference is None:
+            # Highest quality that fits the byte budget
+            chosen = self._highest_fitting(qualities, lambda q: len(attempt(q, budget.methods[0])))
+        else:
+            # Lowest quality meeting min_ssim (and max_bytes); SSIM grows with
+            # quality, so bisect. If none does, max_quality is used as before.
+            low, high = 0, len(qualities) - 1
+            if not acceptable(qualities[high]):
+                chosen = budget.max_quality
+                if budget.max_bytes is not None and baseline > budget.max_bytes:
+                    chosen = self._highest_fitting(qualities, lambda q: len(attempt(q, budget.methods[0])))
+            else:
+                while low < high:
+                    middle = (low + high) // 2
+                    if acceptable(qualities[middle]):
+                        high = middle
+                    else:
+                        low = middle + 1
+                chosen = qualities[high]
+
+        # Slower methods usually give smaller files at the same quality
+        best = min(budget.methods, key=lambda method: (len(attempt(chosen, method)), method))
+        return attempt(chosen, best), chosen, best, baseline
+
+    def _highest_fitting(self, qualities: list[int], size: Callable[[int], int]) -> int:
+        """Highest quality whose size fits max_bytes, or the lowest if none does."""
+        low, high = 0, len(qualities) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if size(qualities[middle]) <= self.budget.max_bytes:
+                low = middle
+            else:
+                high = middle - 1
+        return qualities[low]
+
+    def _fit(self, image: Image.Image, quality: int, method: int, data: bytes) -> Tuple[bytes, int]:
+        """Lower the quality of an image over max_bytes until it fits, down to min_quality."""
+        for lower in reversed([q for q in self.budget.qualities() if q < quality]):
+            data = encode_webp(image, lower, method)
+            self.stats.encodes += 1
+            quality = lower
+            if len(data) <= self.budget.max_bytes:
+                break
+        return data, quality
+
+    def report(self, name: str = "images") -> None:
+        """Print and emit how many bytes the budget saved."""
+        stats = self.stats
+        if not stats.images:
+            return
+        percent = 100 * stats.saved_bytes / stats.baseline_bytes if stats.baseline_bytes else 0.0
+        print(f"Encoded {stats.images} {name} in {stats.bytes / 1e6:.2f} MB, saving about "
+              f"{stats.saved_bytes / 1e6:.2f} MB ({percent:.0f}%) against quality {self.budget.max_quality} "
+              f"(measured on {stats.searched} searched, {stats.encodes} encodes)")
+        emit("encoding", name=name, images=stats.images, searched=stats.searched, encodes=stats.encodes,
+             bytes=stats.bytes, baseline_bytes=round(stats.baseline_bytes), saved_bytes=round(stats.saved_bytes))
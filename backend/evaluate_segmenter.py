@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Evaluate Segmenter
+
+Runs the same clicks through each SAM2 model tier, optionally with int8
+quantization, and reports latency and mask IoU against the fp32 large model,
+so the segmenter's speed/quality point can be chosen deliberately.
+
+Prompts are a JSON list of clicks on our own images; Segmenter writes one as
+prompts.json next to the masks of every accepted image:
+
+    [
+      {"image": "cat.jpg", "keyword": "cat", "points": [[120, 80], [140, 95]]},
+      {"image": "cat.jpg", "keyword": "hat", "points": [[60, 20]], "labels": [1]},
+      {"image": "dog.jpg", "keyword": "dog", "box": [10, 10, 200, 180]}
+    ]
+
+Relative image paths are resolved against the prompts file. Labels default to
+all positive.
+
+Usage:
+    python evaluate_segmenter.py prompts.json
+    python evaluate_segmenter.py prompts.json --models tiny small --quantize --threads 4 --output eval.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from segmenter import DEFAULT_SAM2_MODEL, SAM2_MODELS, load_image_predictor, mask_iou, prompt_arrays
+
+# Every tier is compared against this one
+REFERENCE = (DEFAULT_SAM2_MODEL, False)
+
+def load_prompts(path: str | Path) -> List[Dict[str, Any]]:
+    """
+    Load a prompts file, resolving image paths and defaulting labels.
+
+    Raises:
+        ValueError: If a prompt has neither points nor a box
+    """
+    path = Path(path)
+    with open(path) as f:
+        prompts = json.load(f)
+
+    for prompt in prompts:
+        if not prompt.get("points") and prompt.get("box") is None:
+            raise ValueError(f"Prompt {prompt.get('keyword', '?')} for {prompt['image']} has no points or box")
+        prompt["image"] = str(path.parent / prompt["image"])
+        if prompt.get("points"):
+            prompt.setdefault("labels", [1] * len(prompt["points"]))
+    return prompts
+
+def run_variant(
+    model: str,
+    quantize: bool,
+    prompts: List[Dict[str, Any]],
+    threads: int | None = None
+) -> Tuple[Dict[str, float], List[np.ndarray]]:
+    """
+    Segment every prompt with one model variant.
+
+    Each image is embedded once and all of its prompts are decoded against
+    that embedding, as in the interactive segmenter.
+
+    Returns:
+        Tuple of (timings in milliseconds, masks in prompt order)
+    """
+    started = time.perf_counter()
+    predictor = load_image_predictor(model, quantize, threads)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    by_image: Dict[str, List[int]] = {}
+    for i, prompt in enumerate(prompts):
+        by_image.setdefault(prompt["image"], []).append(i)
+
+    masks: List[np.ndarray] = [None] * len(prompts)
+    embed_ms, predict_ms = [], []
+    for image_path, indices in by_image.items():
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not load image from {image_path}")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        started = time.perf_counter()
+        predictor.set_image(image)
+        embed_ms.append((time.perf_counter() - started) * 1000)
+
+        for i in indices:
+            point_coords, point_labels, box = prompt_arrays([prompts[i]])
+            started = time.perf_counter()
+            predicted, _, _ = predictor.predict(
+                point_coords=point_coords,
+                point_labels=point_labels,
+                box=box,
+                multimask_output=False
+            )
+            predict_ms.append((time.perf_counter() - started) * 1000)
+            masks[i] = predicted.reshape(predicted.shape[-2:]) > 0
+
+    timings = {
+        "load_ms": load_ms,
+        "embed_ms": float(np.median(embed_ms)),
+        "predict_ms": float(np.median(predict_ms)),
+    }
+    return timings, masks
+
+def evaluate(
+    prompts: List[Dict[str, Any]],
+    variants: List[Tuple[str, bool]],
+    threads: int | None = None
+) -> List[Dict[str, Any]]:
+    """
+    Compare model variants against the fp32 large model.
+
+    Args:
+        prompts: Prompts as returned by load_prompts
+        variants: (model tier, quantize) pairs to evaluate
+        threads: Number of torch CPU threads, or None for the default
+
+    Returns:
+        One result per variant with its timings, mean and minimum IoU and the
+        IoU of every prompt, the reference first
+    """
+    variants = [REFERENCE] + [v for v in variants if v != REFERENCE]
+    results = []
+    reference_masks = None
+    for model, quantize in variants:
+        print(f"Evaluating {model}{' int8' if quantize else ''}...")
+        timings, masks = run_variant(model, quantize, prompts, threads)
+        if reference_masks is None:
+            reference_masks = masks
+        ious = [mask_iou(mask, ref) for mask, ref in zip(masks, reference_masks)]
+        results.append({
+            "model": model,
+            "quantize": quantize,
+            **timings,
+            "mean_iou": float(np.mean(ious)),
+            "min_iou": float(np.min(ious)),
+            "ious": ious,
+        })
+    return results
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """Render evaluation results as a plain-text table."""
+    lines = [f"{'model':<12}{'load ms':>10}{'embed ms':>10}{'predict ms':>12}{'mean IoU':>10}{'min IoU':>10}"]
+    for r in results:
+        name = r["model"] + (" int8" if r["quantize"] else "")
+        lines.append(
+            f"{name:<12}{r['load_ms']:>10.0f}{r['embed_ms']:>10.0f}{r['predict_ms']:>12.1f}"
+            f"{r['mean_iou']:>10.3f}{r['min_iou']:>10.3f}"
+        )
+    return "\n".join(lines)
+
+def main():
+    """Entry point for command line usage."""
+    parser = argparse.ArgumentParser(description="Compare SAM2 model tiers against the large model")
+    parser.add_argument("prompts", help="JSON file of clicks on our own images")
+    parser.add_argument("--models", nargs="+", choices=list(SAM2_MODELS), default=list(SAM2_MODELS),
+                        help="Model tiers to evaluate (default: all)")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Also evaluate each tier with dynamic int8 quantization")
+    parser.add_argument("--threads", type=int, help="Number of torch CPU threads")
+    parser.add_argument("--output", help="Write the full results, including per-prompt IoU, as JSON")
+    args = parser.parse_args()
+
+    try:
+        prompts = load_prompts(args.prompts)
+        variants = [(model, False) for model in args.models]
+        if args.quantize:
+            variants += [(model, True) for model in args.models]
+        results = evaluate(prompts, variants, args.threads)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"\n{len(prompts)} prompts")
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Game Service
+
+A small HTTP service for the current game's payload, the same JSON the
+frontend's /api/current-game route returns. The payload is built once, from
+the Redis index of active games (see active_games.py) and the game's
+similarity hashes, and kept in memory until the next game's date_active.
+Every response is served from pre-serialized identity, gzip and (when the
+brotli package is installed) brotli bodies with strong ETags, so a single
+process answers thousands of requests per second.
+
+Endpoints:
+    GET /api/current-game      the current game, 404 if none is active
+    GET /api/next-game-time    {"nextGameTime": ISO 8601 or null}
+
+Usage:
+    python game_service.py [--host HOST] [--port PORT] [--refresh-seconds N]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import formatdate
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+from active_games import ACTIVE_GAMES_KEY, CURRENT_GAME_CANDIDATES, META_COLUMNS, current_game, next_game_time
+from schedule_game import ConnectionManager, get_connections
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8000
+
+# A cached payload is rebuilt at the next game's date_active, and at least
+# this often so games scheduled or removed in between show up
+DEFAULT_REFRESH_SECONDS = 60
+
+# A failed rebuild is retried after this long
+ERROR_RETRY_SECONDS = 1
+
+# Served when no game is scheduled, so clients check back
+IDLE_MAX_AGE = 60
+
+# Encodings in order of preference
+ENCODINGS = ("br", "gzip", "identity") if brotli else ("gzip", "identity")
+
+# Requests are read until this many bytes of headers
+MAX_HEADER_BYTES = 16 * 1024
+
+# Only read while the Redis index hasn't been built
+SELECT_CURRENT_GAMES_SQL = f"""
+    SELECT {', '.join(META_COLUMNS)}
+    FROM games
+    WHERE date_active <= NOW()
+    ORDER BY date_active DESC
+    LIMIT {CURRENT_GAME_CANDIDATES}
+"""
+SELECT_NEXT_GAME_TIME_SQL = "SELECT MIN(date_active) FROM games WHERE date_active > NOW()"
+
+REASONS = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 500: "Internal Server Error",
+}
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A response body pre-serialized in every encoding."""
+    status: int
+    bodies: Dict[str, bytes]
+    etags: Dict[str, str]
+    # Unix time the response stops being current, if a game is scheduled
+    next_game_time: Optional[float]
+    # Unix time the cache is rebuilt
+    expires_at: float
+
+    def max_age(self, now: float) -> int:
+        """Seconds clients may reuse the response: until the next game starts."""
+        if self.next_game_time is None:
+            return IDLE_MAX_AGE
+        return max(0, int(self.next_game_time - now))
+
+def encode_response(status: int, payload: Dict[str, Any], next_time: Optional[float], expires_at: float) -> CachedResponse:
+    """
+    Serialize and compress a payload once.
+
+    Every encoding has its own strong ETag, as the bytes differ; all of them
+    share the digest of the JSON.
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli:
+        bodies["br"] = brotli.compress(body)
+    etags = {
+        encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+        for encoding in bodies
+    }
+    return CachedResponse(status, bodies, etags, next_time, expires_at)
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """The preferred encoding a client accepts."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().lower().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 1.0 if encoding == "identity" else 0.0)) > 0:
+            return encoding
+    return "identity"
+
+def _load_game_from_database(connections: ConnectionManager) -> Tuple[Optional[Dict[str, Any]], Optional[datetime]]:
+    """The current game and next game time from PostgreSQL, picking among ties like the index."""
+    with connections.postgres() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SELECT_CURRENT_GAMES_SQL)
+            rows = [dict(zip(META_COLUMNS, row)) for row in cur.fetchall()]
+            cur.execute(SELECT_NEXT_GAME_TIME_SQL)
+            next_time = cur.fetchone()[0]
+        conn.rollback()
+    if not rows:
+        return None, next_time
+    game = random.choice([row for row in rows if row["date_active"] == rows[0]["date_active"]])
+    return {**game, "speech_types": game["speech_types"] or [], "media_type": game["media_type"] or "image"}, next_time
+
+def load_current_game(connections: ConnectionManager, now: Optional[datetime] = None) -> Tuple[int, Dict[str, Any], Optional[datetime]]:
+    """
+    Build the current game's payload.
+
+    Args:
+        connections: Pooled database connections
+        now: Time to serve the game for (defaults to now)
+
+    Returns:
+        HTTP status, JSON payload and when the next game becomes active
+
+    Raises:
+        RuntimeError: If a keyword of the game has no similarity data
+    """
+    redis_client = connections.redis()
+    game = current_game(redis_client, now)
+    next_time = next_game_time(redis_client, now)
+    if game is None and not redis_client.exists(ACTIVE_GAMES_KEY):
+        # PostgreSQL is only queried until the index has been built
+        game, next_time = _load_game_from_database(connections)
+    if game is None:
+        return 404, {"error": "No active games found"}, next_time
+
+    keywords = [keyword.lower() for keyword in game["keywords"]]
+    versions = {
+        keyword.decode(): key.decode()
+        for keyword, key in redis_client.hgetall(f"game:{game['prompt_id']}:similarity").items()
+    }
+    pipeline = redis_client.pipeline(transaction=False)
+    for keyword in keywords:
+        pipeline.hgetall(versions.get(keyword, f"similarity:{keyword}"))
+    similarity_data = {}
+    for keyword, similarities in zip(keywords, pipeline.execute()):
+        if not similarities:
+            raise RuntimeError(f"No similarity data found in Redis for keyword: {keyword}")
+        similarity_data[keyword] = {word.decode(): float(score) for word, score in similarities.items()}
+
+    return 200, {
+        "id": game["id"],
+        "prompt_id": game["prompt_id"],
+        "prompt_text": game["prompt_text"],
+        "keywords": game["keywords"],
+        "image_url": game["image_url"],
+        "similarity_data": similarity_data,
+        "speech_types": game["speech_types"],
+        "pixelation_map": game["pixelation_map"],
+        "media_type": game["media_type"],
+    }, next_time
+
+class GameCache:
+    """
+    The current game and next game time, rebuilt at most once per boundary.
+
+    Requests that arrive while the cache is being rebuilt wait for that one
+    rebuild rather than each querying the databases.
+    """
+
+    def __init__(self, connections: ConnectionManager, refresh_seconds: float = DEFAULT_REFRESH_SECONDS):
+        self.connections = connections
+        self.refresh_seconds = refresh_seconds
+        self.current: Optional[CachedResponse] = None
+        self.next_time: Optional[CachedResponse] = None
+        self._lock = asyncio.Lock()
+
+    def build(self) -> Tuple[CachedResponse, CachedResponse]:
+        """Load both payloads; runs in a worker thread."""
+        now = time.time()
+        status, payload, next_time = load_current_game(self.connections, datetime.fromtimestamp(now, timezone.utc))
+        next_timestamp = next_time.timestamp() if next_time else None
+        expires_at = now + self.refresh_seconds
+        if next_timestamp is not None:
+            expires_at = min(expires_at, next_timestamp)
+        next_payload = {"nextGameTime": next_time.astimezone(timezone.utc).isoformat() if next_time else None}
+        return (
+            encode_response(status, payload, next_timestamp, expires_at),
+            encode_response(200, next_payload, next_timestamp, expires_at),
+        )
+
+    async def get(self) -> Tuple[CachedResponse, CachedResponse]:
+        """The cached responses, rebuilt first if they have expired."""
+        if self.current is None or time.time() >= self.current.expires_at:
+            async with self._lock:
+                # Another request may have rebuilt it while this one waited
+                if self.current is None or time.time() >= self.current.expires_at:
+                    try:
+                        self.current, self.next_time = await asyncio.get_running_loop().run_in_executor(None, self.build)
+                    except Exception as e:
+                        print(f"Error fetching game data: {e}")
+                        # Served for a moment, so a failing database isn't
+                        # queried again by every request
+                        error = encode_response(
+                            500, {"error": "Failed to fetch game data"}, None, time.time() + ERROR_RETRY_SECONDS
+                        )
+                        self.current = self.next_time = error
+        return self.current, self.next_time
+
+    async def keep_fresh(self) -> None:
+        """Rebuild the cache as it expires, so requests rarely wait for it."""
+        while True:
+            current, _ = await self.get()
+            await asyncio.sleep(max(current.expires_at - time.time(), 0.01))
+
+def render(status: int, headers: Dict[str, str], body: bytes, keep_alive: bool, head: bool = False) -> bytes:
+    """Serialize an HTTP/1.1 response."""
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}", f"Date: {formatdate(usegmt=True)}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append(f"Content-Length: {len(body)}")
+    if not keep_alive:
+        lines.append("Connection: close")
+    return "\r\n".join(lines).encode() + b"\r\n\r\n" + (b"" if head else body)
+
+def respond(cached: CachedResponse, request_headers: Dict[str, str], keep_alive: bool, head: bool) -> bytes:
+    """A cached response in the client's encoding, or 304 if its ETag matches."""
+    encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+    etag = cached.etags[encoding]
+    headers = {
+        "Content-Type": "application/json",
+        "Cache-Control": f"public, max-age={cached.max_age(time.time())}",
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if cached.status != 200:
+        headers["Cache-Control"] = "no-cache"
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and cached.status == 200:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in candidates or etag in candidates:
+            headers.pop("Content-Type")
+            headers.pop("Content-Encoding", None)
+            return render(304, headers, b"", keep_alive, head=True)
+    return render(cached.status, headers, cached.bodies[encoding], keep_alive, head)
+
+def error_response(status: int, message: str, keep_alive: bool = False) -> bytes:
+    """A JSON error that isn't cached."""
+    body = json.dumps({"error": message}).encode()
+    return render(status, {"Content-Type": "application/json", "Cache-Control": "no-store"}, body, keep_alive)
+
+class GameService:
+    """HTTP/1.1 server for the cached payloads, with keep-alive."""
+
+    def __init__(self, cache: GameCache):
+        self.cache = cache
+        self.routes = {"/api/current-game": 0, "/api/next-game-time": 1}
+
+    async def handle_request(self, method: str, path: str, headers: Dict[str, str], keep_alive: bool) -> bytes:
+        """Response to one request."""
+        route = self.routes.get(path.split("?", 1)[0])
+        if route is None:
+            return error_response(404, "Not found", keep_alive)
+        if method not in ("GET", "HEAD"):
+            return error_response(405, "Method not allowed", keep_alive)
+        responses = await self.cache.get()
+        return respond(responses[route], headers, keep_alive, head=method == "HEAD")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests on a connection until the client closes it."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.LimitOverrunError:
+                    writer.write(error_response(400, "Headers too large"))
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = request_line.split(" ")
+                except ValueError:
+                    writer.write(error_response(400, "Bad request line"))
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                if int(headers.get("content-length", "0") or 0):
+                    await reader.readexactly(int(headers["content-length"]))
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                writer.write(await self.handle_request(method, path, headers, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """Listen until cancelled, keeping the cache fresh in the background."""
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        refresher = asyncio.create_task(self.cache.keep_fresh())
+        print(f"Serving games on http://{host}:{port} ({', '.join(ENCODINGS)})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            refresher.cancel()
+
+def main():
+    """Entry point for command line usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the current game's payload from an in-process cache")
+    parser.add_argument("--host", default=os.getenv("HOST", DEFAULT_HOST), help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", DEFAULT_PORT)), help="Port to listen on")
+    parser.add_argument("--refresh-seconds", type=float, default=DEFAULT_REFRESH_SECONDS,
+                        help="Longest time a payload is served before it is rebuilt")
+    args = parser.parse_args()
+
+    connections = get_connections()
+    try:
+        asyncio.run(GameService(GameCache(connections, args.refresh_seconds)).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connections.close()
+
+if __name__ == "__main__":
+    main()
@@ -18,25 +18,28 @@ Requires:
 import sys
 from typing import List
 from utils import load_spacy_model, generate_nearest_words_optimized
+from instrumentation import stage
 
-def generate_embeddings(keywords: List[str], num: int) -> None:
+def generate_embeddings(keywords: List[str], num: int, model_name: str = "en_core_web_lg") -> None:
     """
     Generate and save embeddings for the given keywords.
     
     Args:
         keywords: List of keywords to generate embeddings for
         num: Number of nearest words to include
+        model_name: spaCy model to use
     """
     # Load the spaCy model
-    model_name = "en_core_web_lg"
-    nlp = load_spacy_model(model_name)
+    with stage("spacy_load", model=model_name):
+        nlp = load_spacy_model(model_name)
     if nlp is None:
         print(f"Failed to load spaCy model '{model_name}'. Exiting.")
         sys.exit(1)
     
     # Compute nearest words for all keywords in one pass
     print(f"Generating embeddings for {len(keywords)} keywords: {', '.join(keywords)}")
-    embeddings_results = generate_nearest_words_optimized(keywords, nlp, num)
+    with stage("nearest_words", keywords=len(keywords), num=num):
+        embeddings_results = generate_nearest_words_optimized(keywords, nlp, num)
     similarity_dict = {}
     # Save a JSON file per keyword
     for keyword in embeddings_results:
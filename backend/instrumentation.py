@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Instrumentation
+
+Structured per-stage timing for the scheduling pipeline. Wrap work in
+``stage()`` and, once ``configure()`` has enabled output, each stage emits a
+JSON line when it finishes:
+
+    {"event": "stage", "stage": "upload", "path": "media/upload", "status": "ok",
+     "start": 1704067200.12, "duration_s": 0.41, "thread": "MainThread", ...}
+
+Optionally each stage also records its tracemalloc peak, and profiled
+stages dump a cProfile/pstats file that can be inspected with
+``python -m pstats FILE``. Only one stage is profiled at a time.
+
+Stages nest per thread; ``path`` joins the names of the enclosing stages.
+When instrumentation is not configured, ``stage()`` costs a few attribute
+lookups.
+"""
+
+import cProfile
+import json
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.output: Optional[TextIO] = None
+        self.close_output = False
+        self.profile_dir: Optional[Path] = None
+        self.trace_memory = False
+        self.lock = threading.Lock()
+        self.profile_count = 0
+        # From Python 3.12 only one cProfile profiler can be active per
+        # process, so at most one stage is profiled at a time
+        self.profiling = False
+
+_state = _State()
+_local = threading.local()
+
+def configure(
+    output: Optional[str | Path | TextIO] = None,
+    profile_dir: Optional[str | Path] = None,
+    trace_memory: bool = False
+) -> None:
+    """
+    Enable instrumentation.
+
+    Args:
+        output: File path, open stream or "-" for stderr to receive JSON lines.
+            Defaults to stderr when profiling or memory tracing is requested.
+        profile_dir: Directory to write one .pstats file per profiled stage
+        trace_memory: Record the tracemalloc peak of every stage
+    """
+    shutdown()
+    if output is None and not (profile_dir or trace_memory):
+        return
+
+    if output is None or output == "-":
+        _state.output = sys.stderr
+    elif hasattr(output, "write"):
+        _state.output = output
+    else:
+        _state.output = open(output, "a", buffering=1)
+        _state.close_output = True
+
+    if profile_dir:
+        _state.profile_dir = Path(profile_dir)
+        _state.profile_dir.mkdir(exist_ok=True, parents=True)
+
+    _state.trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    _state.enabled = True
+
+def shutdown() -> None:
+    """Disable instrumentation and close the output file if we opened it."""
+    if _state.close_output and _state.output is not None:
+        _state.output.close()
+    if _state.trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state.enabled = False
+    _state.output = None
+    _state.close_output = False
+    _state.profile_dir = None
+    _state.trace_memory = False
+
+def is_enabled() -> bool:
+    """Return True if stages are currently being recorded."""
+    return _state.enabled
+
+def emit(event: str, **fields: Any) -> None:
+    """Write a single JSON line event (no-op when instrumentation is disabled)."""
+    if not _state.enabled:
+        return
+    line = json.dumps({"event": event, **fields}, default=str)
+    with _state.lock:
+        _state.output.write(line + "\n")
+        _state.output.flush()
+
+def _stack() -> List[Dict[str, Any]]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _profile_path(path: str) -> Path:
+    with _state.lock:
+        _state.profile_count += 1
+        count = _state.profile_count
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", path)
+    return _state.profile_dir / f"{count:03d}-{safe}.pstats"
+
+@contextmanager
+def stage(name: str, profile: bool = True, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block of work as a named stage.
+
+    Args:
+        name: Stage name, e.g. "media" or "upload"
+        profile: Whether this stage may be profiled. A stage is only profiled
+            if no other stage, enclosing or in another thread, is already
+            profiling; those stages run unprofiled.
+        **fields: Extra JSON-serializable fields to include in the event
+
+    Yields:
+        The event's field dictionary, which the block may add to
+    """
+    if not _state.enabled:
+        yield fields
+        return
+
+    stack = _stack()
+    path = "/".join([frame["name"] for frame in stack] + [name])
+    frame = {"name": name, "memory_peak": 0}
+
+    if _state.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["memory_peak"] = max(stack[-1]["memory_peak"], peak)
+        tracemalloc.reset_peak()
+        frame["memory_start"] = current
+
+    profiler = None
+    if profile and _state.profile_dir is not None:
+        with _state.lock:
+            if not _state.profiling:
+                _state.profiling = True
+                profiler = cProfile.Profile()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool (e.g. a debugger) holds the hook
+                profiler = None
+                with _state.lock:
+                    _state.profiling = False
+
+    stack.append(frame)
+    status = "ok"
+    start_wall = time.time()
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        status = "error"
+        fields["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+
+        event = {
+            "stage": name,
+            "path": path,
+            "status": status,
+            "start": start_wall,
+            "duration_s": duration,
+            "thread": threading.current_thread().name,
+            **fields,
+        }
+
+        if profiler is not None:
+            profiler.disable()
+            with _state.lock:
+                _state.profiling = False
+            profile_path = _profile_path(path)
+            profiler.dump_stats(str(profile_path))
+            event["profile"] = str(profile_path)
+
+        if _state.trace_memory and tracemalloc.is_tracing():
+            peak = max(frame["memory_peak"], tracemalloc.get_traced_memory()[1])
+            event["memory_start_bytes"] = frame["memory_start"]
+            event["memory_peak_bytes"] = peak
+            if stack:
+                stack[-1]["memory_peak"] = max(stack[-1]["memory_peak"], peak)
+
+        emit("stage", **event)
+
+def main():
+    """Summarize a JSON lines timing file: total time per stage path."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize stage timings written by instrumentation")
+    parser.add_argument("timings", help="JSON lines file written with --timings")
+    args = parser.parse_args()
+
+    totals: Dict[str, Dict[str, float]] = {}
+    with open(args.timings) as f:
+        for line in f:
+            event = json.loads(line)
+            if event.get("event") != "stage":
+                continue
+            entry = totals.setdefault(event["path"], {"count": 0, "total_s": 0.0, "memory_peak_bytes": 0})
+            entry["count"] += 1
+            entry["total_s"] += event["duration_s"]
+            entry["memory_peak_bytes"] = max(entry["memory_peak_bytes"], event.get("memory_peak_bytes", 0))
+
+    width = max((len(path) for path in totals), default=5)
+    print(f"{'stage':<{width}}  {'count':>5}  {'total_s':>9}  {'peak_mb':>8}")
+    for path, entry in sorted(totals.items()):
+        print(f"{path:<{width}}  {entry['count']:>5}  {entry['total_s']:>9.3f}  "
+              f"{entry['memory_peak_bytes'] / 1e6:>8.1f}")
+
+if __name__ == "__main__":
+    main()
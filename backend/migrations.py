@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Migrations
+
+Versioned schema migrations for the Unprompted PostgreSQL database.
+Applied versions are recorded in the ``schema_migrations`` table so each
+migration runs exactly once. Run this at deploy time, before scheduling games:
+
+Usage:
+    python migrations.py            # apply all pending migrations
+    python migrations.py --status   # list applied and pending versions
+"""
+
+import os
+import sys
+from dataclasses import dataclass
+from typing import List, Set
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Arbitrary constant used for pg_advisory_lock so concurrent deploys
+# don't apply the same migration twice.
+MIGRATION_LOCK_ID = 72_164_001
+
+@dataclass(frozen=True)
+class Migration:
+    """A single schema migration.
+
+    Attributes:
+        version: Monotonically increasing version number
+        description: Short human readable summary
+        sql: SQL statements to execute
+        transactional: Whether the migration can run inside a transaction.
+            Statements such as ``CREATE INDEX CONCURRENTLY`` cannot.
+    """
+    version: int
+    description: str
+    sql: str
+    transactional: bool = True
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "create games table",
+        """
+        CREATE TABLE IF NOT EXISTS games (
+            id SERIAL PRIMARY KEY,
+            prompt_id TEXT NOT NULL,
+            prompt_text TEXT NOT NULL,
+            keywords JSONB NOT NULL,
+            speech_types JSONB,
+            date_active TIMESTAMP WITH TIME ZONE NOT NULL,
+            image_url TEXT NOT NULL
+        )
+        """,
+    ),
+    Migration(
+        2,
+        "add pixelation_map and media_type columns",
+        """
+        ALTER TABLE games ADD COLUMN IF NOT EXISTS pixelation_map JSONB;
+        ALTER TABLE games ADD COLUMN IF NOT EXISTS media_type VARCHAR(10)
+        """,
+    ),
+    Migration(
+        3,
+        "covering index for current/next game lookups",
+        # Serves both `WHERE date_active <= NOW() ORDER BY date_active DESC`
+        # (current-game) and `WHERE date_active > NOW() ORDER BY date_active`
+        # (next-game-time) as index-only scans.
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_games_date_active_covering
+        ON games (date_active)
+        INCLUDE (id, prompt_id, prompt_text, keywords, speech_types,
+                 image_url, pixelation_map, media_type)
+        """,
+        transactional=False,
+    ),
+    Migration(
+        4,
+        "drop superseded date_active index",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_games_date_active",
+        transactional=False,
+    ),
+    Migration(
+        5,
+        "narrow date_active index",
+        # Replaces the covering index of version 3. A btree tuple is capped
+        # at ~2.7 kB and pixelation_map alone can exceed it, so large games
+        # failed to insert. Both lookups return one row, so the heap fetch
+        # is negligible.
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_games_date_active_id
+        ON games (date_active) INCLUDE (id)
+        """,
+        transactional=False,
+    ),
+    Migration(
+        6,
+        "drop covering date_active index",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_games_date_active_covering",
+        transactional=False,
+    ),
+]
+
+def connect_to_postgres() -> psycopg2.extensions.connection:
+    """Connect to PostgreSQL database using environment variables."""
+    conn = psycopg2.connect(os.getenv('DATABASE_URL', ''))
+    print("Connected to PostgreSQL database")
+    return conn
+
+def ensure_migrations_table(conn: psycopg2.extensions.connection) -> None:
+    """Create the schema_migrations bookkeeping table if it doesn't exist."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+            )
+        """)
+    conn.commit()
+
+def applied_versions(conn: psycopg2.extensions.connection) -> Set[int]:
+    """Return the set of migration versions already applied."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cur.fetchall()}
+
+def pending_migrations(
+    conn: psycopg2.extensions.connection,
+    migrations: List[Migration] = MIGRATIONS
+) -> List[Migration]:
+    """Return migrations that haven't been applied yet, in version order."""
+    applied = applied_versions(conn)
+    return sorted(
+        (m for m in migrations if m.version not in applied),
+        key=lambda m: m.version
+    )
+
+def apply_migration(conn: psycopg2.extensions.connection, migration: Migration) -> None:
+    """
+    Apply a single migration and record its version.
+
+    Transactional migrations run together with their bookkeeping row in one
+    transaction. Non-transactional ones run in autocommit mode, so their SQL
+    must be idempotent (e.g. ``IF NOT EXISTS``) in case recording fails.
+    """
+    print(f"Applying migration {migration.version}: {migration.description}")
+    if migration.transactional:
+        with conn.cursor() as cur:
+            cur.execute(migration.sql)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (migration.version, migration.description)
+            )
+        conn.commit()
+        return
+
+    # Autocommit can only be toggled outside a transaction
+    conn.commit()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(migration.sql)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (migration.version, migration.description)
+            )
+    finally:
+        conn.autocommit = False
+
+def run_migrations(
+    conn: psycopg2.extensions.connection,
+    migrations: List[Migration] = MIGRATIONS
+) -> List[int]:
+    """
+    Apply all pending migrations.
+
+    Args:
+        conn: Open PostgreSQL connection
+        migrations: Migrations to consider (defaults to MIGRATIONS)
+
+    Returns:
+        Versions that were applied by this call
+    """
+    ensure_migrations_table(conn)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    conn.commit()
+
+    applied = []
+    try:
+        for migration in pending_migrations(conn, migrations):
+            apply_migration(conn, migration)
+            applied.append(migration.version)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+    if applied:
+        print(f"Applied {len(applied)} migration(s): {applied}")
+    else:
+        print("Database schema is up to date")
+    return applied
+
+def main():
+    """Entry point for command line usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Apply database schema migrations for the Unprompted application"
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="List applied and pending migrations without applying anything"
+    )
+    args = parser.parse_args()
+
+    try:
+        conn = connect_to_postgres()
+    except Exception as e:
+        print(f"Error connecting to PostgreSQL: {e}")
+        sys.exit(1)
+
+    try:
+        if args.status:
+            ensure_migrations_table(conn)
+            applied = applied_versions(conn)
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version in applied else "pending"
+                print(f"{migration.version:>4}  {state:<8} {migration.description}")
+        else:
+            run_migrations(conn)
+    except Exception as e:
+        print(f"Error running migrations: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Orchestrator
+
+Runs a small graph of named stages, starting each one as soon as the stages
+it depends on have finished, so independent work overlaps:
+
+    results = run_stages([
+        Stage("media", process_media, main_thread=True),
+        Stage("embeddings", generate),
+        Stage("commit", commit, depends_on=("media", "embeddings")),
+    ])
+
+Each stage's function is called with the results of its dependencies as
+keyword arguments named after them. Stages run on a thread pool, except
+``main_thread`` stages, which run on the calling thread (matplotlib's
+interactive windows must be driven from the main thread). If any stage
+raises, no new stages are started, running ones are waited for and a
+StageError is raised.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from instrumentation import stage as timed_stage
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    A unit of work in a stage graph.
+
+    Names must be unique. A ``kind:item`` name (e.g. "media:game-1") runs the
+    same kind of stage once per item; its timing event is named after the
+    kind and records the item.
+    """
+    name: str
+    func: Callable[..., Any]
+    depends_on: Tuple[str, ...] = ()
+    main_thread: bool = False
+
+class StageError(Exception):
+    """Raised when a stage fails; the original exception is the __cause__."""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+
+def validate_stages(stages: Sequence[Stage]) -> None:
+    """
+    Check that stage names are unique, dependencies exist and there are no
+    cycles.
+
+    Raises:
+        ValueError: If the graph is invalid
+    """
+    names = [s.name for s in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate stage names in {names}")
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        missing = [dep for dep in s.depends_on if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage '{s.name}' depends on unknown stages {missing}")
+
+    # Kahn's algorithm: every stage must become ready eventually
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [s for s in remaining if all(dep in done for dep in s.depends_on)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages {[s.name for s in remaining]}")
+        done.update(s.name for s in ready)
+        remaining = [s for s in remaining if s.name not in done]
+
+def run_stages(
+    stages: Sequence[Stage],
+    max_workers: int = 4,
+    **fields: Any
+) -> Dict[str, Any]:
+    """
+    Run a stage graph to completion.
+
+    Args:
+        stages: Stages to run, in any order
+        max_workers: Thread pool size for background stages
+        **fields: Extra fields recorded on every stage's timing event
+
+    Returns:
+        Dictionary mapping stage names to their results
+
+    Raises:
+        StageError: If a stage raises
+    """
+    validate_stages(stages)
+
+    results: Dict[str, Any] = {}
+    pending: List[Stage] = list(stages)
+    running: Dict[Future, Stage] = {}
+    failure: List[Tuple[str, BaseException]] = []
+
+    def call(s: Stage) -> Any:
+        kind, _, item = s.name.partition(":")
+        extra = {"item": item} if item else {}
+        with timed_stage(kind, **fields, **extra):
+            return s.func(**{dep: results[dep] for dep in s.depends_on})
+
+    def ready(s: Stage) -> bool:
+        return all(dep in results for dep in s.depends_on)
+
+    def collect(futures) -> None:
+        for future in futures:
+            s = running.pop(future)
+            try:
+                results[s.name] = future.result()
+            except (Exception, SystemExit) as e:  # some helpers call sys.exit() on failure
+                failure.append((s.name, e))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as executor:
+        while (pending or running) and not failure:
+            # Start every background stage whose inputs are available
+            for s in [s for s in pending if ready(s) and not s.main_thread]:
+                pending.remove(s)
+                running[executor.submit(call, s)] = s
+
+            main_ready = [s for s in pending if ready(s) and s.main_thread]
+            if main_ready:
+                # Run on this thread while the background stages keep going
+                s = main_ready[0]
+                pending.remove(s)
+                try:
+                    results[s.name] = call(s)
+                except (Exception, SystemExit) as e:
+                    failure.append((s.name, e))
+                collect([f for f in list(running) if f.done()])
+            elif running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                collect(done)
+
+        # Let stages that are already running finish before reporting
+        collect(list(running))
+
+    if failure:
+        name, error = failure[0]
+        raise StageError(name, error) from error
+    return results
@@ -0,0 +1,182 @@
+"""
+Renditions
+
+Smaller copies of each pixelated image combination, so players download an
+image sized for their screen instead of the full-resolution original, and a
+tiny blurred placeholder shown until it arrives.
+
+They are written next to the full-size combination:
+
+    0_1blur.webp               full size
+    0_1blur.960w.webp          960 px wide
+    0_1blur.480w.webp          480 px wide
+    0_1blur.placeholder.webp   PLACEHOLDER_WIDTH px wide, blurred
+
+and recorded in pixelation_map as a srcset-style entry instead of a URL:
+
+    "0_1blur.webp": {
+        "src": "https://.../full.webp",
+        "srcset": "https://.../480.webp 480w, https://.../960.webp 960w, https://.../full.webp 3840w",
+        "placeholder": "data:image/webp;base64,..."
+    }
+
+The placeholder is inlined so it paints with the game payload, without a
+request of its own. Combinations without renditions, such as videos, are
+still recorded as a plain URL.
+"""
+
+from __future__ import annotations
+
+import base64
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageFilter
+
+if TYPE_CHECKING:
+    from encoding import WebpEncoder
+
+# Widths of the smaller renditions; widths at or above the image's own are
+# skipped since the full-size file already covers them
+RENDITION_WIDTHS = (480, 960)
+RENDITION_QUALITY = 85
+
+PLACEHOLDER_WIDTH = 24
+PLACEHOLDER_BLUR_RADIUS = 1
+PLACEHOLDER_QUALITY = 40
+PLACEHOLDER_LABEL = "placeholder"
+
+def rendition_filename(filename: str, label: int | str) -> str:
+    """Filename of a combination's rendition, label being a width or PLACEHOLDER_LABEL."""
+    path = Path(filename)
+    suffix = f"{label}w" if isinstance(label, int) else label
+    return f"{path.stem}.{suffix}{path.suffix}"
+
+def parse_rendition(filename: str) -> Tuple[str, Optional[int | str]]:
+    """
+    Split a filename into its combination's filename and its rendition label.
+
+    The label is a width, PLACEHOLDER_LABEL, or None for the full-size file.
+    """
+    path = Path(filename)
+    stem, dot, label = path.stem.rpartition(".")
+    if not dot:
+        return filename, None
+    if label == PLACEHOLDER_LABEL:
+        return stem + path.suffix, label
+    if label.endswith("w") and label[:-1].isdigit():
+        return stem + path.suffix, int(label[:-1])
+    return filename, None
+
+def is_placeholder(filename: str) -> bool:
+    """Whether a file is a placeholder, which is inlined rather than uploaded."""
+    return parse_rendition(filename)[1] == PLACEHOLDER_LABEL
+
+def save_renditions(
+    image: Image.Image,
+    path: str | Path,
+    widths: Tuple[int, ...] = RENDITION_WIDTHS,
+    on_output: Optional[Callable[[str, str], None]] = None,
+    encoder: Optional[WebpEncoder] = None
+) -> List[Path]:
+    """
+    Save the renditions of a combination whose full-size image is saved at path.
+
+    The widths form a pyramid: each is downscaled from the next larger one
+    rather than from the full image, and the placeholder from the smallest,
+    so the whole ladder costs little more than its first step.
+
+    Args:
+        image: The combination at full size
+        path: Where the full-size combination was saved
+        widths: Rendition widths in pixels
+        on_output: Optional callback called with (filename, path) as soon as
+            each rendition is written
+        encoder: Encodes the widths within its budget; without one they're
+            saved at RENDITION_QUALITY. The placeholder always is.
+
+    Returns:
+        Paths of the files written
+    """
+    path = Path(path)
+    width, height = image.size
+    level = image
+    written = []
+    steps = [w for w in sorted(set(widths), reverse=True) if w < width]
+    for label in [*steps, PLACEHOLDER_LABEL]:
+        target = min(PLACEHOLDER_WIDTH, width) if label == PLACEHOLDER_LABEL else label
+        size = (target, max(1, round(height * target / width)))
+        level = level.resize(size, Image.LANCZOS, reducing_gap=2.0)
+        output_path = path.with_name(rendition_filename(path.name, label))
+        if label == PLACEHOLDER_LABEL:
+            level.filter(ImageFilter.GaussianBlur(PLACEHOLDER_BLUR_RADIUS)).save(
+                output_path, format="WEBP", quality=PLACEHOLDER_QUALITY
+            )
+        elif encoder:
+            encoder.save(level, output_path)
+        else:
+            level.save(output_path, format="WEBP", quality=RENDITION_QUALITY)
+        written.append(output_path)
+        if on_output:
+            on_output(output_path.name, str(output_path.absolute()))
+    return written
+
+def data_uri(file_path: str | Path) -> str:
+    """The file inlined as a data: URI."""
+    mime = {".webp": "image/webp", ".png": "image/png", ".jpg": "image/jpeg"}.get(
+        Path(file_path).suffix.lower(), "application/octet-stream"
+    )
+    return f"data:{mime};base64,{base64.b64encode(Path(file_path).read_bytes()).decode()}"
+
+def pixelation_entries(paths: Dict[str, str], urls: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Build pixelation_map from the files a segmenter wrote and their blob URLs.
+
+    Args:
+        paths: Path of every combination, rendition and placeholder file by
+            filename, as process_image returns them
+        urls: Blob URL of every uploaded file by filename; combinations
+            without a URL are left out, as are renditions without one
+
+    Returns:
+        Mapping of combination filenames to their URL, or to a srcset-style
+        entry when they have renditions (see the module docstring)
+    """
+    renditions: Dict[str, Dict[int | str, str]] = {}
+    for filename in paths:
+        combination, label = parse_rendition(filename)
+        if label is not None:
+            renditions.setdefault(combination, {})[label] = filename
+
+    entries: Dict[str, Any] = {}
+    for filename, file_path in paths.items():
+        if parse_rendition(filename)[1] is not None or filename not in urls:
+            continue
+        files = renditions.get(filename)
+        if not files:
+            entries[filename] = urls[filename]
+            continue
+        with Image.open(file_path) as image:
+            full_width = image.width
+        sources = [(urls[name], width) for width, name in sorted(
+            (label, name) for label, name in files.items() if isinstance(label, int)
+        ) if name in urls]
+        entry = {
+            "src": urls[filename],
+            "srcset": ", ".join(f"{url} {width}w" for url, width in [*sources, (urls[filename], full_width)]),
+        }
+        if PLACEHOLDER_LABEL in files:
+            entry["placeholder"] = data_uri(paths[files[PLACEHOLDER_LABEL]])
+        entries[filename] = entry
+    return entries
+
+def entry_urls(entry: str | Dict[str, Any]) -> List[str]:
+    """Blob URLs a pixelation_map entry refers to."""
+    if isinstance(entry, str):
+        return [entry]
+    urls = [entry["src"]] if entry.get("src") else []
+    for candidate in (entry.get("srcset") or "").split(","):
+        url = candidate.strip().split(" ")[0]
+        if url and url not in urls:
+            urls.append(url)
+    return urls
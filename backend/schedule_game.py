@@ -11,29 +11,124 @@ Handles the entire flow:
 5. Load data into databases
 """
 
+from __future__ import annotations
+
 import os
+import sys
 import json
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Any
 
 import psycopg2
-import redis
-import vercel_blob
+import psycopg2.extras
+import psycopg2.pool
 import dateutil.parser
 from dotenv import load_dotenv
 
-from generate_embeddings import generate_embeddings
+import instrumentation
+from active_games import ACTIVE_GAMES_KEY, game_meta_key, queue_active_games, queue_removed_games
+from instrumentation import stage
+from orchestrator import Stage, StageError, run_stages
+from renditions import entry_urls, is_placeholder, pixelation_entries
 from utils import load_json_data
 
-# Add segmenter to Python path
-import sys
-from segmenter import process_image as process_image_segmentation
-from segmenter import process_video as process_video_segmentation
+# segmenter (torch, SAM2, matplotlib), generate_embeddings (spaCy), redis
+# and vercel_blob are imported by the stages that use them, so CLI startup
+# and database-only work don't pay for them.
+if TYPE_CHECKING:
+    import redis
 
 # Load environment variables
 load_dotenv()
 
+# Columns are guaranteed by migrations.py; run it before scheduling games.
+INSERT_GAME_SQL = """
+    INSERT INTO games (
+        prompt_id, prompt_text, keywords, speech_types,
+        date_active, image_url, pixelation_map, media_type
+    )
+    VALUES (%s, %s, %s, %s, %s::timestamptz, %s, %s, %s)
+    RETURNING id, date_active
+"""
+
+# Multi-row variant for psycopg2.extras.execute_values
+INSERT_GAMES_SQL = """
+    INSERT INTO games (
+        prompt_id, prompt_text, keywords, speech_types,
+        date_active, image_url, pixelation_map, media_type
+    )
+    VALUES %s
+    RETURNING id, date_active
+"""
+INSERT_GAMES_TEMPLATE = "(%s, %s, %s, %s, %s::timestamptz, %s, %s, %s)"
+# Columns of a row built by build_game_row, in INSERT order
+GAME_ROW_COLUMNS = (
+    "prompt_id", "prompt_text", "keywords", "speech_types",
+    "date_active", "image_url", "pixelation_map", "media_type",
+)
+
+# Concurrent blob uploads per game
+UPLOAD_WORKERS = 4
+
+# Blobs are named after a hash of their content, so a name's content never
+# changes and CDNs and browsers may cache it for a year
+BLOB_HASH_LENGTH = 32
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# spaCy model and number of nearest words behind every similarity hash. Both
+# are part of the hash's Redis key (see similarity_key), so changing either
+# writes new versions next to the ones live games are reading.
+SIMILARITY_MODEL = "en_core_web_lg"
+SIMILARITY_TOP_N = 5000
+
+# Times the similarity transaction is tried before giving up when reused
+# versions keep being garbage-collected between WATCH and EXEC
+SIMILARITY_COMMIT_ATTEMPTS = 3
+
+# Unlinks each similarity version in KEYS (given as version, refs pairs)
+# whose refs set is empty, atomically with respect to commits adding
+# references; returns the versions it unlinked
+UNLINK_UNREFERENCED_SCRIPT = """
+local unlinked = {}
+for i = 1, #KEYS, 2 do
+    if redis.call('SCARD', KEYS[i + 1]) == 0 and redis.call('UNLINK', KEYS[i]) == 1 then
+        table.insert(unlinked, KEYS[i])
+    end
+end
+return unlinked
+"""
+
+# `schedule_game.py gc` removes games whose activation is older than this,
+# except the current game
+DEFAULT_RETENTION_DAYS = 30
+# Redis keys per UNLINK or GC script call, and URLs per blob delete request
+GC_BATCH_SIZE = 500
+
+# Expired games: older than the cutoff and superseded by a newer active
+# game, so the current game is never removed however old it is
+SELECT_EXPIRED_GAMES_SQL = """
+    SELECT id, prompt_id, keywords, image_url, pixelation_map
+    FROM games
+    WHERE date_active < %(cutoff)s
+      AND date_active < (SELECT max(date_active) FROM games WHERE date_active <= NOW())
+    ORDER BY date_active
+"""
+
+# Games that are kept, with what they share with the expired ones: their
+# prompt ID (and so their game:{prompt_id}:* keys) or their blobs
+SELECT_RETAINED_GAMES_SQL = """
+    SELECT prompt_id, keywords, image_url, pixelation_map
+    FROM games
+    WHERE id <> ALL(%(ids)s)
+"""
+
 def connect_to_postgres() -> psycopg2.extensions.connection:
     """Connect to PostgreSQL database using environment variables."""
     conn = psycopg2.connect(os.getenv('DATABASE_URL', ''))
@@ -42,15 +137,122 @@ def connect_to_postgres() -> psycopg2.extensions.connection:
 
 def connect_to_redis() -> redis.Redis:
     """Connect to Redis database using environment variables."""
+    import redis
+
     redis_client = redis.Redis.from_url(os.environ.get("REDIS_URL", ""))
     redis_client.ping()  # Test connection
     print("Connected to Redis database")
     return redis_client
 
+class ConnectionManager:
+    """
+    Shared PostgreSQL and Redis connection pools for the scheduler.
+    
+    Connections are opened lazily on first use and reused across stages and
+    games, so scheduling many games pays the connection setup (and the Redis
+    PING) once instead of once per statement.
+    """
+    
+    def __init__(
+        self,
+        database_url: Optional[str] = None,
+        redis_url: Optional[str] = None,
+        max_connections: int = 4
+    ):
+        """
+        Args:
+            database_url: PostgreSQL DSN (defaults to $DATABASE_URL)
+            redis_url: Redis URL (defaults to $REDIS_URL)
+            max_connections: Upper bound for each pool
+        """
+        self.database_url = database_url if database_url is not None else os.getenv('DATABASE_URL', '')
+        self.redis_url = redis_url if redis_url is not None else os.environ.get("REDIS_URL", "")
+        self.max_connections = max_connections
+        self._pg_pool = None
+        self._redis_client = None
+        self._lock = threading.Lock()
+    
+    def _get_pg_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        with self._lock:
+            if self._pg_pool is None:
+                self._pg_pool = psycopg2.pool.ThreadedConnectionPool(
+                    1, self.max_connections, self.database_url
+                )
+                print("Connected to PostgreSQL database")
+            return self._pg_pool
+    
+    @contextmanager
+    def postgres(self) -> Iterator[psycopg2.extensions.connection]:
+        """
+        Borrow a pooled PostgreSQL connection.
+        
+        Uncommitted work is rolled back if the block raises; the connection
+        is always returned to the pool.
+        """
+        pool = self._get_pg_pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+    
+    def redis(self) -> redis.Redis:
+        """Return the shared Redis client backed by a connection pool."""
+        import redis
+
+        with self._lock:
+            if self._redis_client is None:
+                pool = redis.ConnectionPool.from_url(
+                    self.redis_url, max_connections=self.max_connections
+                )
+                client = redis.Redis(connection_pool=pool)
+                client.ping()  # Test connection once per pool
+                print("Connected to Redis database")
+                self._redis_client = client
+            return self._redis_client
+    
+    def connect(self) -> None:
+        """Open both pools now, e.g. in the background while other stages run."""
+        with self.postgres():
+            pass
+        self.redis()
+    
+    def close(self) -> None:
+        """Close all pooled connections."""
+        with self._lock:
+            if self._pg_pool is not None:
+                self._pg_pool.closeall()
+                self._pg_pool = None
+            if self._redis_client is not None:
+                self._redis_client.close()
+                self._redis_client.connection_pool.disconnect()
+                self._redis_client = None
+
+_connections: Optional[ConnectionManager] = None
+
+def get_connections() -> ConnectionManager:
+    """Return the process-wide connection manager, creating it on first use."""
+    global _connections
+    if _connections is None:
+        _connections = ConnectionManager()
+    return _connections
+
+def close_connections() -> None:
+    """Close the process-wide connection manager's pools."""
+    global _connections
+    if _connections is not None:
+        _connections.close()
+        _connections = None
+
 def upload_to_blob(
     file_path: str | Path,
     blob_name: str,
-    access: str = "public"
+    access: str = "public",
+    cache_max_age: Optional[int] = None
 ) -> Optional[str]:
     """
     Upload a file to Vercel Blob Storage.
@@ -59,24 +261,76 @@ def upload_to_blob(
         file_path: Path to the file to upload
         blob_name: Name to give the blob
         access: Access level ("public" or "private")
+        cache_max_age: Cache-Control max-age of the blob in seconds (defaults
+            to the Blob API's)
         
     Returns:
         URL of the uploaded file or None if upload fails
     """
     try:
+        import vercel_blob
+
         print(f"Uploading to Vercel Blob: {file_path} -> {blob_name}")
-        with open(file_path, 'rb') as f:
-            blob = vercel_blob.put(
-                blob_name,
-                f.read(),
-                options={"access": access}
-            )
+        options = {"access": access}
+        if cache_max_age is not None:
+            options["cacheControlMaxAge"] = str(cache_max_age)
+        with stage("upload", blob=blob_name) as fields:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            fields["bytes"] = len(data)
+            blob = vercel_blob.put(blob_name, data, options=options)
         print(f"Upload successful. URL: {blob['url']}")
         return blob['url']
     except Exception as e:
         print(f"Error uploading to blob storage: {e}")
         return None
 
+def content_blob_name(file_path: str | Path) -> str:
+    """
+    Blob name of a file, derived from its content.
+    
+    Identical files get the same name whichever game or combination they
+    belong to; the extension is kept for the content type.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(partial(f.read, 1024 * 1024), b""):
+            digest.update(chunk)
+    return f"game-images/{digest.hexdigest()[:BLOB_HASH_LENGTH]}{Path(file_path).suffix.lower()}"
+
+def find_blob(blob_name: str) -> Optional[str]:
+    """URL of an existing blob, or None if there is none (or it can't be looked up)."""
+    try:
+        import vercel_blob
+
+        listing = vercel_blob.list({"prefix": blob_name, "limit": "1"})
+        for blob in listing.get("blobs", []):
+            if blob.get("pathname") == blob_name:
+                return blob["url"]
+    except Exception as e:
+        print(f"Error looking up blob {blob_name}: {e}")
+    return None
+
+def upload_content_blob(file_path: str | Path, blob_name: Optional[str] = None) -> Optional[str]:
+    """
+    Upload a file under its content_blob_name unless that blob already exists.
+    
+    A blob found by name has the same content, so it's reused as is. If
+    another upload of the same content wins a race, its blob is used.
+    
+    Args:
+        file_path: Path to the file to upload
+        blob_name: The file's content_blob_name, if already known
+        
+    Returns:
+        URL of the blob or None if the upload failed
+    """
+    blob_name = blob_name or content_blob_name(file_path)
+    if url := find_blob(blob_name):
+        print(f"Reusing existing blob: {file_path} -> {url}")
+        return url
+    return upload_to_blob(file_path, blob_name, cache_max_age=IMMUTABLE_MAX_AGE) or find_blob(blob_name)
+
 def is_video_file(file_path: str | Path) -> bool:
     """
     Check if a file is a video based on its extension.
@@ -90,17 +344,34 @@ def is_video_file(file_path: str | Path) -> bool:
     video_extensions = ['.mp4', '.gif', '.mov', '.avi', '.webm']
     return Path(file_path).suffix.lower() in video_extensions
 
+def process_image_segmentation(image_path: str, keywords: List[str], **kwargs: Any) -> Dict[str, str]:
+    """Run segmenter.process_image, importing the segmenter on first use."""
+    with stage("import_segmenter"):
+        from segmenter import process_image
+    return process_image(image_path, keywords, **kwargs)
+
+def process_video_segmentation(video_path: str, keywords: List[str], **kwargs: Any) -> Dict[str, str]:
+    """Run segmenter.process_video, importing the segmenter on first use."""
+    with stage("import_segmenter"):
+        from segmenter import process_video
+    return process_video(video_path, keywords, **kwargs)
+
 def process_game_media(
     media_path: str | Path,
     keywords: List[str],
     prompt_id: str,
     base_dir: str = "../frontend/public"
-) -> tuple[Optional[str], Optional[Dict[str, str]]]:
+) -> tuple[Optional[str], Optional[Dict[str, Any]]]:
     """
     Process a game media file (image or video):
     1. Generate pixelated combinations
     2. Upload original and pixelated media to blob storage
     
+    Uploads run on a small thread pool: the original is uploaded while the
+    combinations are generated, and each combination and rendition is
+    uploaded as soon as the segmenter has written it. Placeholders are
+    inlined in the pixelation map instead (see renditions.py).
+    
     Returns:
         Tuple of (original media URL, pixelation map with URLs)
     """
@@ -110,189 +381,926 @@ def process_game_media(
         if not full_path.exists():
             print(f"Error: Media file not found: {full_path}")
             return None, None
+        
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload") as uploads:
+            # Upload original media
+            media_upload = uploads.submit(upload_content_blob, full_path)
             
-        # Upload original media
-        blob_name = f"game-images/{prompt_id}-{Path(media_path).name}"
-        media_url = upload_to_blob(full_path, blob_name)
-        if not media_url:
-            return None, None
+            # Combinations with identical content (e.g. when masks fully
+            # overlap) share one upload
+            combination_uploads: Dict[str, Future] = {}
+            uploads_by_name: Dict[str, Future] = {}
+            uploads_lock = threading.Lock()
+            def upload_combination(filename: str, file_path: str) -> None:
+                if filename in combination_uploads or is_placeholder(filename):
+                    return
+                blob_name = content_blob_name(file_path)
+                with uploads_lock:
+                    if blob_name not in uploads_by_name:
+                        uploads_by_name[blob_name] = uploads.submit(upload_content_blob, file_path, blob_name)
+                    combination_uploads.setdefault(filename, uploads_by_name[blob_name])
             
-        # Generate pixelated combinations based on file type
-        print("\nGenerating pixelated combinations...")
-        
-        try:
-            if is_video_file(full_path):
-                print(f"Processing video file: {full_path}")
-                pixelation_map = process_video_segmentation(
-                    str(full_path),
-                    keywords
-                )
-            else:
-                print(f"Processing image file: {full_path}")
-                pixelation_map = process_image_segmentation(
-                    str(full_path),
-                    keywords
-                )
-        except Exception as e:
-            print(f"Error during media processing: {e}")
-            return None, None
+            # Generate pixelated combinations based on file type
+            print("\nGenerating pixelated combinations...")
+            
+            try:
+                if is_video_file(full_path):
+                    print(f"Processing video file: {full_path}")
+                    with stage("segmentation", media_type="video"):
+                        pixelation_map = process_video_segmentation(
+                            str(full_path),
+                            keywords,
+                            on_output=upload_combination
+                        )
+                else:
+                    print(f"Processing image file: {full_path}")
+                    with stage("segmentation", media_type="image"):
+                        pixelation_map = process_image_segmentation(
+                            str(full_path),
+                            keywords,
+                            on_output=upload_combination
+                        )
+            except Exception as e:
+                print(f"Error during media processing: {e}")
+                return None, None
+            
+            media_url = media_upload.result()
+            if not media_url:
+                return None, None
             
-        if not pixelation_map:
-            print("Warning: Failed to generate pixelated combinations")
-            return media_url, None
+            if not pixelation_map:
+                print("Warning: Failed to generate pixelated combinations")
+                return media_url, None
             
-        # Upload each pixelated combination
-        uploaded_map = {}
-        for filename, file_path in pixelation_map.items():
-            blob_name = f"game-images/{prompt_id}-pixelated-{filename}"
-            if url := upload_to_blob(file_path, blob_name):
-                uploaded_map[filename] = url
-        
-        return media_url, uploaded_map
+            # Upload combinations the segmenter didn't report as it went
+            for filename, file_path in pixelation_map.items():
+                upload_combination(filename, file_path)
+            
+            uploaded_urls = {}
+            for filename, upload in combination_uploads.items():
+                if url := upload.result():
+                    uploaded_urls[filename] = url
+            if len(uploads_by_name) < len(combination_uploads):
+                print(f"{len(combination_uploads)} combinations share {len(uploads_by_name)} blobs")
+        
+        return media_url, pixelation_entries(pixelation_map, uploaded_urls)
     except Exception as e:
         print(f"Error in process_game_media: {e}")
         return None, None
 
+def build_game_row(
+    game_file: str | Path,
+    image_url: str,
+    pixelation_map: Optional[Dict[str, Any]],
+    start_time: Optional[str] = None,
+) -> Optional[tuple]:
+    """
+    Build the parameter tuple for inserting a game into the games table.
+    
+    Args:
+        game_file: Path to the game JSON config file
+        image_url: URL of the uploaded original media
+        pixelation_map: Mapping of combination filenames to URLs or srcset entries
+        start_time: Optional ISO 8601 formatted start time
+        
+    Returns:
+        Tuple matching INSERT_GAME_SQL's placeholders, or None on error
+    """
+    # Load game data
+    game_data = load_json_data(str(game_file))
+    if not game_data:
+        print(f"Failed to load game data from {game_file}")
+        return None
+        
+    # Extract prompt ID from filename
+    prompt_id = Path(game_file).stem
+
+    # Check if the media is a video
+    is_video = is_video_file(game_data.get('image', ''))
+    
+    # Parse start time with improved timezone handling
+    try:
+        if start_time:
+            # Parse the timestamp, preserving timezone info
+            parsed_time = dateutil.parser.parse(start_time)
+            # Ensure timezone is specified
+            if parsed_time.tzinfo is None:
+                raise ValueError("Start time must include timezone information (e.g. 2024-01-01T15:30:00Z or 2024-01-01T10:30:00-05:00)")
+        else:
+            # Use current time in UTC
+            parsed_time = datetime.now(timezone.utc)
+        
+        # Always normalize to UTC for storage
+        parsed_time = parsed_time.astimezone(timezone.utc)
+        
+    except Exception as e:
+        print(f"Error parsing start time '{start_time}': {e}")
+        return None
+        
+    # Extract game data
+    prompt_text = game_data.get('prompt', '')
+    keywords = game_data.get('keywords', [])
+    speech_types = game_data.get('speech_type', [])
+    
+    return (
+        prompt_id, 
+        prompt_text, 
+        json.dumps(keywords), 
+        json.dumps(speech_types), 
+        parsed_time.isoformat(), 
+        image_url, 
+        json.dumps(pixelation_map) if pixelation_map else None,
+        'video' if is_video else 'image'
+    )
+
 def load_game_data(
     game_file: str | Path,
     image_url: str,
-    pixelation_map: Optional[Dict[str, str]],
+    pixelation_map: Optional[Dict[str, Any]],
     start_time: Optional[str] = None,
+    connections: Optional[ConnectionManager] = None,
 ) -> Optional[int]:
     """Load game data into PostgreSQL."""
-    conn = connect_to_postgres()
+    connections = connections or get_connections()
     
     try:
-        # Load game data
-        game_data = load_json_data(str(game_file))
-        if not game_data:
-            print(f"Failed to load game data from {game_file}")
+        row = build_game_row(game_file, image_url, pixelation_map, start_time)
+        if row is None:
             return None
-            
-        # Extract prompt ID from filename
-        prompt_id = Path(game_file).stem
-
-        # Check if the media is a video
-        is_video = is_video_file(game_data.get('image', ''))
         
-        # Parse start time with improved timezone handling
-        try:
-            if start_time:
-                # Parse the timestamp, preserving timezone info
-                parsed_time = dateutil.parser.parse(start_time)
-                # Ensure timezone is specified
-                if parsed_time.tzinfo is None:
-                    raise ValueError("Start time must include timezone information (e.g. 2024-01-01T15:30:00Z or 2024-01-01T10:30:00-05:00)")
-            else:
-                # Use current time in UTC
-                parsed_time = datetime.now(timezone.utc)
+        with stage("postgres_insert"), connections.postgres() as conn:
+            # Insert into database with explicit timestamp format. The schema
+            # is managed by migrations.py, which runs once at deploy time.
+            with conn.cursor() as cur:
+                cur.execute(INSERT_GAME_SQL, row)
+                game_id, stored_time = cur.fetchone()
+            conn.commit()
             
-            # Always normalize to UTC for storage
-            parsed_time = parsed_time.astimezone(timezone.utc)
+        print(f"Inserted new game record with ID {game_id}")
+        print(f"Stored activation time: {stored_time}")
+        return game_id
             
-        except Exception as e:
-            print(f"Error parsing start time '{start_time}': {e}")
+    except Exception as e:
+        print(f"Error loading game data: {e}")
+        return None
+
+def build_game_rows(games: List[tuple]) -> Optional[List[tuple]]:
+    """
+    Build insert rows for several games.
+    
+    Args:
+        games: List of (game_file, image_url, pixelation_map, start_time) tuples
+        
+    Returns:
+        List of rows in input order, or None if any game is invalid
+    """
+    rows = []
+    for game_file, image_url, pixelation_map, start_time in games:
+        row = build_game_row(game_file, image_url, pixelation_map, start_time)
+        if row is None:
             return None
-            
-        # Extract game data
-        prompt_text = game_data.get('prompt', '')
-        keywords = game_data.get('keywords', [])
-        speech_types = game_data.get('speech_type', [])
-        
-        # Check for required columns
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='games'
-            """)
-            columns = {row[0] for row in cur.fetchall()}
-            
-            if 'pixelation_map' not in columns:
-                print("Adding pixelation_map column to games table")
-                cur.execute("ALTER TABLE games ADD COLUMN pixelation_map JSONB")
-                
-            if 'media_type' not in columns:
-                print("Adding media_type column to games table")
-                cur.execute("ALTER TABLE games ADD COLUMN media_type VARCHAR(10)")
-                
-            conn.commit()
+        rows.append(row)
+    return rows
+
+def insert_game_rows(cur: psycopg2.extensions.cursor, rows: List[tuple]) -> List[tuple]:
+    """
+    Insert rows into the games table with a single multi-row INSERT.
+    
+    Returns:
+        (id, date_active) for every row, in input order
+    """
+    # execute_values expands all rows into one INSERT statement;
+    # RETURNING rows come back in VALUES order.
+    return psycopg2.extras.execute_values(
+        cur,
+        INSERT_GAMES_SQL,
+        rows,
+        template=INSERT_GAMES_TEMPLATE,
+        page_size=len(rows),
+        fetch=True
+    )
+
+def load_games_data(
+    games: List[tuple],
+    connections: Optional[ConnectionManager] = None,
+) -> Optional[List[int]]:
+    """
+    Load several games into PostgreSQL with a single multi-row INSERT.
+    
+    Args:
+        games: List of (game_file, image_url, pixelation_map, start_time) tuples
+        connections: Connection manager to use (defaults to the shared one)
         
-        # Insert into database with explicit timestamp format
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO games (
-                    prompt_id, prompt_text, keywords, speech_types, 
-                    date_active, image_url, pixelation_map, media_type
-                )
-                VALUES (%s, %s, %s, %s, %s::timestamptz, %s, %s, %s)
-                RETURNING id, date_active
-                """,
-                (
-                    prompt_id, 
-                    prompt_text, 
-                    json.dumps(keywords), 
-                    json.dumps(speech_types), 
-                    parsed_time.isoformat(), 
-                    image_url, 
-                    json.dumps(pixelation_map) if pixelation_map else None,
-                    'video' if is_video else 'image'
-                )
-            )
-            game_id, stored_time = cur.fetchone()
+    Returns:
+        List of inserted game IDs in input order, or None if any game failed
+    """
+    connections = connections or get_connections()
+    
+    try:
+        rows = build_game_rows(games)
+        if rows is None:
+            return None
+        if not rows:
+            return []
+        
+        with stage("postgres_insert", games=len(rows)), connections.postgres() as conn:
+            with conn.cursor() as cur:
+                inserted = insert_game_rows(cur, rows)
             conn.commit()
-            
-            print(f"Inserted new game record with ID {game_id}")
-            print(f"Stored activation time: {stored_time}")
-            return game_id
-            
+        
+        game_ids = [game_id for game_id, _ in inserted]
+        print(f"Inserted {len(game_ids)} game records with IDs {game_ids}")
+        return game_ids
+    
     except Exception as e:
         print(f"Error loading game data: {e}")
-        conn.rollback()
         return None
-    finally:
-        conn.close()
+
+class MissingSimilarityError(RuntimeError):
+    """A similarity version chosen for reuse was removed before the commit."""
+    
+    def __init__(self, keywords: List[str]):
+        super().__init__(f"Similarity data was removed while scheduling: {', '.join(keywords)}")
+        self.keywords = keywords
+
+def similarity_key(keyword: str, model: str = SIMILARITY_MODEL, top_n: int = SIMILARITY_TOP_N) -> str:
+    """Redis key of one version of a keyword's similarity hash."""
+    return f"similarity:{model}:{top_n}:{keyword.lower()}"
+
+def similarity_refs_key(version_key: str) -> str:
+    """Redis key of the set of prompt IDs whose games use a similarity version."""
+    return "similarity_refs:" + version_key.split(":", 1)[1]
+
+def cached_similarity_keywords(redis_client: redis.Redis, keywords: List[str]) -> List[str]:
+    """Return the keywords whose current similarity version is already in Redis."""
+    if not keywords:
+        return []
+    pipeline = redis_client.pipeline(transaction=False)
+    for keyword in keywords:
+        pipeline.exists(similarity_key(keyword))
+    return [keyword for keyword, exists in zip(keywords, pipeline.execute()) if exists]
+
+def store_similarity_data(
+    pipeline: redis.client.Pipeline,
+    prompt_id: str,
+    keywords: List[str],
+    similarity_data: Dict[str, Optional[Dict[str, float]]]
+) -> None:
+    """
+    Queue the Redis commands that store a game's similarity data on a pipeline.
+    
+    The game references one version of each keyword's hash: it is added to
+    the version's refs set and recorded in game:{prompt_id}:similarity, which
+    the frontend reads to find the hashes. Existing hashes are never deleted
+    or rewritten with different data, so live games are not disturbed.
+    
+    Args:
+        pipeline: Pipeline to queue the commands on
+        prompt_id: The game's prompt ID
+        keywords: The game's keywords
+        similarity_data: Mapping of keyword to {word: similarity} for new
+            versions to write, or to None for versions already stored
+    """
+    for keyword, similarities in similarity_data.items():
+        version = similarity_key(keyword)
+        if similarities is not None:
+            print(f"Storing {len(similarities)} similarity entries for '{keyword}'")
+            if similarities:
+                pipeline.hset(version, mapping=similarities)
+        else:
+            print(f"Reusing stored similarity entries for '{keyword}'")
+        
+        # Add reference to game
+        pipeline.sadd(similarity_refs_key(version), prompt_id)
+        pipeline.hset(f"game:{prompt_id}:similarity", keyword.lower(), version)
+        pipeline.sadd(f"game:{prompt_id}:keywords", keyword.lower())
+    
+    # Store keyword count
+    pipeline.set(f"game:{prompt_id}:count", len(keywords))
+
+def queue_similarity_data(
+    pipeline: redis.client.Pipeline,
+    games: Dict[str, List[str]],
+    similarity_data: Dict[str, Optional[Dict[str, float]]]
+) -> None:
+    """Queue the similarity data of several games on a pipeline, writing each new version once."""
+    written = set()
+    for prompt_id, keywords in games.items():
+        game_data = {}
+        for kw in keywords:
+            if kw not in similarity_data:
+                continue
+            game_data[kw] = None if kw in written else similarity_data[kw]
+            written.add(kw)
+        store_similarity_data(pipeline, prompt_id, keywords, game_data)
+
+def similarity_pipeline(
+    redis_client: redis.Redis,
+    games: Dict[str, List[str]],
+    similarity_data: Dict[str, Optional[Dict[str, float]]]
+) -> redis.client.Pipeline:
+    """
+    Start the MULTI/EXEC transaction that writes games' similarity data.
+    
+    Versions reused from earlier games are WATCHed and checked first: if one
+    was garbage-collected in the meantime no commands are queued rather than
+    referencing a missing hash, and if one disappears before EXEC the
+    transaction is aborted with a WatchError. write_similarity_data handles
+    both.
+    
+    Returns:
+        The pipeline with all commands queued, ready to execute()
+        
+    Raises:
+        MissingSimilarityError: If a reused version no longer exists
+    """
+    pipeline = redis_client.pipeline(transaction=True)
+    reused = sorted({
+        similarity_key(kw)
+        for keywords in games.values()
+        for kw in keywords
+        if kw in similarity_data and similarity_data[kw] is None
+    })
+    if reused:
+        pipeline.watch(*reused)
+        missing = {key for key in reused if not pipeline.exists(key)}
+        if missing:
+            pipeline.reset()
+            raise MissingSimilarityError([
+                kw for kw, similarities in similarity_data.items()
+                if similarities is None and similarity_key(kw) in missing
+            ])
+    pipeline.multi()
+    queue_similarity_data(pipeline, games, similarity_data)
+    return pipeline
+
+def write_similarity_data(
+    redis_client: redis.Redis,
+    games: Dict[str, List[str]],
+    similarity_data: Dict[str, Optional[Dict[str, float]]],
+    queue: Optional[Callable[[redis.client.Pipeline], None]] = None,
+) -> None:
+    """
+    Write games' similarity data in one transaction.
+    
+    Which versions to reuse is decided long before the commit (see
+    generate_similarity_data), so gc may remove one in between. Such
+    versions are generated again and the transaction retried, rather than
+    failing a batch whose media is already segmented and uploaded.
+    
+    Args:
+        redis_client: Redis client to write with
+        games: Mapping of prompt ID to that game's keywords
+        similarity_data: Output of generate_similarity_data
+        queue: Called with the pipeline to queue further commands in the
+            same transaction
+        
+    Raises:
+        RuntimeError: If the transaction kept being aborted
+    """
+    from redis.exceptions import WatchError
+    
+    similarity_data = dict(similarity_data)
+    attempts = 0
+    while attempts < SIMILARITY_COMMIT_ATTEMPTS:
+        try:
+            pipeline = similarity_pipeline(redis_client, games, similarity_data)
+        except MissingSimilarityError as e:
+            # Regenerated versions are written, not reused, so this ends
+            print(f"Regenerating removed similarity data for {', '.join(e.keywords)}")
+            similarity_data.update(generate_embeddings(e.keywords, SIMILARITY_TOP_N))
+            continue
+        if queue is not None:
+            queue(pipeline)
+        try:
+            pipeline.execute()
+            return
+        except WatchError:
+            print("Similarity data changed during the commit, retrying")
+            attempts += 1
+    raise RuntimeError(f"Similarity data kept changing during {SIMILARITY_COMMIT_ATTEMPTS} commit attempts")
+
+def release_similarity_refs(redis_client: redis.Redis, prompt_id: str, keywords: List[str]) -> None:
+    """
+    Remove a game's Redis keys and its references to similarity versions.
+    
+    The versions themselves stay until collect_similarity_garbage finds them
+    unreferenced.
+    """
+    pipeline = redis_client.pipeline(transaction=True)
+    for keyword in keywords:
+        pipeline.srem(similarity_refs_key(similarity_key(keyword)), prompt_id)
+    pipeline.delete(
+        f"game:{prompt_id}:keywords", f"game:{prompt_id}:count", f"game:{prompt_id}:similarity"
+    )
+    pipeline.execute()
+
+def _batches(items: List[Any], size: int = GC_BATCH_SIZE) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _decode(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+def unlink_unreferenced_versions(redis_client: redis.Redis, versions: List[str]) -> List[str]:
+    """
+    UNLINK the similarity versions that no game references, in batches.
+    
+    Returns:
+        The versions that were unlinked
+    """
+    unlink_unreferenced = redis_client.register_script(UNLINK_UNREFERENCED_SCRIPT)
+    unlinked = []
+    for batch in _batches(versions):
+        keys = [key for version in batch for key in (version, similarity_refs_key(version))]
+        unlinked.extend(_decode(key) for key in unlink_unreferenced(keys=keys))
+    return unlinked
+
+def collect_similarity_garbage(redis_client: redis.Redis, dry_run: bool = False) -> List[str]:
+    """
+    Delete similarity versions that no game references any more.
+    
+    Only versioned keys (see similarity_key) are considered. They are
+    unlinked in batches by a script that first checks each refs set is
+    empty, so a version a concurrent commit has just referenced is kept.
+    
+    Args:
+        redis_client: Redis client
+        dry_run: Only report what would be deleted
+        
+    Returns:
+        The unreferenced version keys (deleted unless dry_run)
+    """
+    versions = [_decode(key) for key in redis_client.scan_iter(match="similarity:*:*:*", count=GC_BATCH_SIZE)]
+    if not dry_run:
+        return unlink_unreferenced_versions(redis_client, versions)
+    
+    pipeline = redis_client.pipeline(transaction=False)
+    for version in versions:
+        pipeline.scard(similarity_refs_key(version))
+    return [version for version, refs in zip(versions, pipeline.execute()) if not refs]
+
+def _game_keys(prompt_id: str) -> List[str]:
+    return [f"game:{prompt_id}:keywords", f"game:{prompt_id}:count", f"game:{prompt_id}:similarity"]
+
+def _game_urls(image_url: Optional[str], pixelation_map: Optional[Dict[str, Any] | str]) -> List[str]:
+    if isinstance(pixelation_map, str):
+        pixelation_map = json.loads(pixelation_map)
+    entries = (pixelation_map or {}).values()
+    return [url for url in [image_url, *(url for entry in entries for url in entry_urls(entry))] if url]
+
+def _keywords(keywords: List[str] | str) -> List[str]:
+    return [kw.lower() for kw in (json.loads(keywords) if isinstance(keywords, str) else keywords)]
+
+@dataclass
+class RetentionPlan:
+    """What `schedule_game.py gc` removes for games older than a cutoff.
+    
+    Attributes:
+        game_ids: IDs of the expired games rows
+        prompt_ids: Prompt IDs whose game:{prompt_id}:* keys and similarity
+            references go, i.e. those no retained game shares
+        references: Similarity versions each of those prompt IDs references
+        similarity_versions: Versions left without references once the
+            prompt IDs are released
+        legacy_keys: Unversioned similarity:{keyword} hashes that only
+            expired games read
+        blob_urls: Media and pixelated combinations no retained game uses
+    """
+    game_ids: List[int] = field(default_factory=list)
+    prompt_ids: List[str] = field(default_factory=list)
+    references: Dict[str, List[str]] = field(default_factory=dict)
+    similarity_versions: List[str] = field(default_factory=list)
+    legacy_keys: List[str] = field(default_factory=list)
+    blob_urls: List[str] = field(default_factory=list)
+    
+    @property
+    def game_keys(self) -> List[str]:
+        return ([key for prompt_id in self.prompt_ids for key in _game_keys(prompt_id)]
+                + [game_meta_key(game_id) for game_id in self.game_ids])
+
+def plan_retention(
+    conn: psycopg2.extensions.connection,
+    redis_client: redis.Redis,
+    cutoff: datetime
+) -> RetentionPlan:
+    """
+    Find the games older than cutoff and everything that only they use.
+    
+    Nothing is changed. Games sharing a prompt ID or a blob URL with a
+    retained game keep those shared keys and blobs.
+    """
+    with conn.cursor() as cur:
+        cur.execute(SELECT_EXPIRED_GAMES_SQL, {"cutoff": cutoff})
+        expired = cur.fetchall()
+        if not expired:
+            return RetentionPlan()
+        cur.execute(SELECT_RETAINED_GAMES_SQL, {"ids": [row[0] for row in expired]})
+        retained = cur.fetchall()
+    conn.rollback()
+    
+    retained_prompt_ids = {prompt_id for prompt_id, *_ in retained}
+    retained_urls = {url for _, _, image_url, pixelation_map in retained
+                     for url in _game_urls(image_url, pixelation_map)}
+    
+    plan = RetentionPlan(game_ids=[row[0] for row in expired])
+    expired_keywords = {}
+    for _, prompt_id, keywords, image_url, pixelation_map in expired:
+        if prompt_id not in retained_prompt_ids and prompt_id not in expired_keywords:
+            plan.prompt_ids.append(prompt_id)
+            expired_keywords[prompt_id] = _keywords(keywords)
+        plan.blob_urls.extend(url for url in _game_urls(image_url, pixelation_map)
+                              if url not in retained_urls and url not in plan.blob_urls)
+    
+    # Which versions each released game uses, and which retained games still
+    # read legacy unversioned hashes (those scheduled before versions existed)
+    retained_games = sorted(retained_prompt_ids)
+    pipeline = redis_client.pipeline(transaction=False)
+    for prompt_id in plan.prompt_ids:
+        pipeline.hgetall(f"game:{prompt_id}:similarity")
+    for prompt_id in retained_games:
+        pipeline.exists(f"game:{prompt_id}:similarity")
+    results = pipeline.execute()
+    version_maps = results[:len(plan.prompt_ids)]
+    legacy_games = {prompt_id for prompt_id, versioned in zip(retained_games, results[len(plan.prompt_ids):])
+                    if not versioned}
+    
+    legacy_keywords = set()
+    for prompt_id, version_map in zip(plan.prompt_ids, version_maps):
+        plan.references[prompt_id] = sorted(_decode(version) for version in version_map.values())
+        if not version_map:
+            legacy_keywords.update(expired_keywords[prompt_id])
+    retained_legacy_keywords = {kw for prompt_id, keywords, *_ in retained if prompt_id in legacy_games
+                                for kw in _keywords(keywords)}
+    plan.legacy_keys = sorted(f"similarity:{kw}" for kw in legacy_keywords - retained_legacy_keywords)
+    
+    # A version is freed if every game referencing it is being released
+    versions = sorted({version for references in plan.references.values() for version in references})
+    released = set(plan.prompt_ids)
+    pipeline = redis_client.pipeline(transaction=False)
+    for version in versions:
+        pipeline.smembers(similarity_refs_key(version))
+    plan.similarity_versions = [
+        version for version, refs in zip(versions, pipeline.execute())
+        if {_decode(ref) for ref in refs} <= released
+    ]
+    return plan
+
+def redis_key_sizes(redis_client: redis.Redis, keys: List[str]) -> Dict[str, int]:
+    """MEMORY USAGE of each key that exists."""
+    sizes = {}
+    for batch in _batches(keys):
+        pipeline = redis_client.pipeline(transaction=False)
+        for key in batch:
+            pipeline.memory_usage(key)
+        sizes.update((key, usage) for key, usage in zip(batch, pipeline.execute()) if usage is not None)
+    return sizes
+
+def blob_bytes(urls: List[str]) -> int:
+    """Total size of blobs, looked up concurrently; missing blobs count as 0."""
+    import vercel_blob
+
+    def size(url: str) -> int:
+        try:
+            return int(vercel_blob.head(url).get("size", 0))
+        except Exception:
+            return 0
+    
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="blob-head") as pool:
+        return sum(pool.map(size, urls))
+
+def delete_blobs(urls: List[str]) -> None:
+    """Delete blobs from Vercel Blob Storage, GC_BATCH_SIZE URLs per request."""
+    import vercel_blob
+
+    for batch in _batches(urls):
+        with stage("blob_delete", blobs=len(batch)):
+            vercel_blob.delete(batch)
+
+def collect_expired_games(
+    cutoff: datetime,
+    dry_run: bool = False,
+    connections: Optional[ConnectionManager] = None,
+) -> Dict[str, int]:
+    """
+    Remove games older than cutoff, with their Redis keys and blobs.
+    
+    The current game is always kept. Shared keys and blobs are only removed
+    once no retained game uses them. Redis keys go first, in batched UNLINKs,
+    then the blobs, and the games rows last. A run that fails part way is
+    simply repeated: the rows are still there to be found.
+    
+    Args:
+        cutoff: Games activated before this are removed
+        dry_run: Only measure what would be removed
+        connections: Connection manager to use (defaults to the shared one)
+        
+    Returns:
+        Counts of removed games, Redis keys and blobs, and the bytes reclaimed
+        in Redis and blob storage
+    """
+    connections = connections or get_connections()
+    redis_client = connections.redis()
+    report = {"games": 0, "redis_keys": 0, "redis_bytes": 0, "blobs": 0, "blob_bytes": 0}
+    
+    with connections.postgres() as conn:
+        with stage("gc_plan"):
+            plan = plan_retention(conn, redis_client, cutoff)
+        if not plan.game_ids:
+            return report
+        
+        game_keys = plan.game_keys + plan.legacy_keys
+        with stage("gc_measure", blobs=len(plan.blob_urls)):
+            sizes = redis_key_sizes(redis_client, game_keys + plan.similarity_versions)
+            report["blob_bytes"] = blob_bytes(plan.blob_urls)
+        report.update(games=len(plan.game_ids), redis_keys=len(sizes), redis_bytes=sum(sizes.values()),
+                      blobs=len(plan.blob_urls))
+        if dry_run:
+            return report
+        
+        with stage("gc_redis", keys=len(game_keys)):
+            pipeline = redis_client.pipeline(transaction=False)
+            for prompt_id, references in plan.references.items():
+                for version in references:
+                    pipeline.srem(similarity_refs_key(version), prompt_id)
+            pipeline.zrem(ACTIVE_GAMES_KEY, *[str(game_id) for game_id in plan.game_ids])
+            pipeline.execute()
+            for batch in _batches(game_keys):
+                redis_client.unlink(*batch)
+            # A version referenced again since planning is kept
+            unlinked = unlink_unreferenced_versions(redis_client, plan.similarity_versions)
+            kept = [version for version in plan.similarity_versions if version in sizes and version not in unlinked]
+            report["redis_keys"] -= len(kept)
+            report["redis_bytes"] -= sum(sizes[version] for version in kept)
+        
+        delete_blobs(plan.blob_urls)
+        
+        with stage("gc_postgres", games=len(plan.game_ids)):
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM games WHERE id = ANY(%s)", (plan.game_ids,))
+            conn.commit()
+    return report
+
+def format_size(num_bytes: int) -> str:
+    """Human readable byte count."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+def generate_embeddings(keywords: List[str], num: int, model: str = SIMILARITY_MODEL) -> Dict[str, Dict[str, float]]:
+    """Run generate_embeddings.generate_embeddings, importing it on first use."""
+    from generate_embeddings import generate_embeddings as _generate_embeddings
+    return _generate_embeddings(keywords, num, model)
+
+def generate_similarity_data(
+    games: Dict[str, List[str]],
+    connections: Optional[ConnectionManager] = None,
+) -> Dict[str, Optional[Dict[str, float]]]:
+    """
+    Generate similarity data for several games.
+    
+    Keywords whose current version (same model and top N) is already stored
+    in Redis are reused, so common keywords cost nothing. The spaCy model is
+    loaded and the vocabulary scanned once for the union of the remaining
+    keywords, and not at all if there are none. Nothing is written; see
+    queue_similarity_data.
+    
+    Args:
+        games: Mapping of prompt ID to that game's keywords
+        connections: Connection manager used to look up stored versions, or
+            None to generate every keyword
+        
+    Returns:
+        Mapping of keyword to {word: similarity}, or to None for keywords
+        whose stored version is reused
+    """
+    print("\nGenerating similarity data...")
+    all_keywords = list(dict.fromkeys(kw for keywords in games.values() for kw in keywords))
+    cached = []
+    if connections is not None:
+        with stage("similarity_lookup", keywords=len(all_keywords)):
+            cached = cached_similarity_keywords(connections.redis(), all_keywords)
+    similarity_data: Dict[str, Optional[Dict[str, float]]] = dict.fromkeys(cached)
+    missing = [kw for kw in all_keywords if kw not in similarity_data]
+    print(f"Reusing stored similarity data for {len(cached)} of {len(all_keywords)} keywords")
+    if missing:
+        with stage("similarity_generation", keywords=len(missing), cached=len(cached)):
+            similarity_data.update(generate_embeddings(missing, SIMILARITY_TOP_N))
+    return similarity_data
 
 def load_similarity_data(
     keywords: List[str],
-    prompt_id: str
+    prompt_id: str,
+    connections: Optional[ConnectionManager] = None,
 ) -> bool:
     """Generate and load similarity data for keywords into Redis."""
-    redis_client = None
-    try:
-        redis_client = connect_to_redis()
+    return load_similarity_data_many({prompt_id: keywords}, connections)
+
+def load_similarity_data_many(
+    games: Dict[str, List[str]],
+    connections: Optional[ConnectionManager] = None,
+) -> bool:
+    """
+    Generate and load similarity data for several games into Redis.
+    
+    Stored versions are reused, the spaCy model is loaded and the vocabulary
+    scanned once for the union of the other keywords, and everything is
+    written in a single transaction.
+    
+    Args:
+        games: Mapping of prompt ID to that game's keywords
+        connections: Connection manager to use (defaults to the shared one)
+        
+    Returns:
+        True if the data was stored
+    """
+    connections = connections or get_connections()
+    redis_client = connections.redis()
+    
+    similarity_data = generate_similarity_data(games, connections)
+    
+    # Store in Redis using a single transaction
+    with stage("redis_write", games=len(games)):
+        write_similarity_data(redis_client, games, similarity_data)
+    return True
+
+def commit_games(
+    games: List[tuple],
+    similarity_games: Dict[str, List[str]],
+    similarity_data: Dict[str, Dict[str, float]],
+    connections: Optional[ConnectionManager] = None,
+) -> List[int]:
+    """
+    Write games to PostgreSQL and their similarity data to Redis as one unit.
+    
+    The games are inserted first but only committed once the Redis MULTI/EXEC
+    transaction has succeeded, so a Redis failure leaves no games behind. The
+    same transaction adds the games to the active-game index (see
+    active_games). If the PostgreSQL commit itself fails afterwards, the
+    per-game Redis keys, references and index entries are removed again;
+    newly written similarity versions are left for
+    collect_similarity_garbage.
+    
+    Args:
+        games: List of (game_file, image_url, pixelation_map, start_time) tuples
+        similarity_games: Mapping of prompt ID to that game's keywords
+        similarity_data: Output of generate_similarity_data
+        connections: Connection manager to use (defaults to the shared one)
         
-        # Generate similarity data for all keywords
-        print("\nGenerating similarity data...")
-        similarity_data = generate_embeddings(keywords, 5000)
+    Returns:
+        List of inserted game IDs in input order
         
-        # Store in Redis using a single pipeline
-        pipeline = redis_client.pipeline()
+    Raises:
+        ValueError: If a game's data is invalid
+        Exception: Any database error; nothing is left committed
+    """
+    connections = connections or get_connections()
+    rows = build_game_rows(games)
+    if rows is None:
+        raise ValueError("Invalid game data")
+    
+    with connections.postgres() as conn:
+        with stage("postgres_insert", games=len(rows)):
+            with conn.cursor() as cur:
+                inserted = insert_game_rows(cur, rows)
         
-        # Store similarity data for each keyword
-        for keyword, similarities in similarity_data.items():
-            redis_key = f"similarity:{keyword.lower()}"
-            print(f"Storing {len(similarities)} similarity entries for '{keyword}'")
-            
-            # Clear existing data and store new similarities
-            pipeline.delete(redis_key)
-            for word, score in similarities.items():
-                pipeline.hset(redis_key, word, score)
-                
-            # Add reference to game
-            pipeline.sadd(f"game:{prompt_id}:keywords", keyword.lower())
-        
-        # Store keyword count
-        pipeline.set(f"game:{prompt_id}:count", len(keywords))
-        
-        # Execute all commands in a single transaction
-        pipeline.execute()
-        return True
-            
-    finally:
-        if redis_client:
-            redis_client.close()
+        game_ids = [game_id for game_id, _ in inserted]
+        redis_client = connections.redis()
+        with stage("redis_write", games=len(similarity_games)):
+            write_similarity_data(redis_client, similarity_games, similarity_data, partial(
+                queue_active_games,
+                games=[
+                    {**dict(zip(GAME_ROW_COLUMNS, row)), "id": game_id, "date_active": date_active}
+                    for row, (game_id, date_active) in zip(rows, inserted)
+                ],
+            ))
+        
+        try:
+            conn.commit()
+        except Exception:
+            for prompt_id, keywords in similarity_games.items():
+                release_similarity_refs(redis_client, prompt_id, keywords)
+            pipeline = redis_client.pipeline(transaction=False)
+            queue_removed_games(pipeline, game_ids)
+            pipeline.execute()
+            raise
+    
+    print(f"Inserted {len(game_ids)} game records with IDs {game_ids}")
+    return game_ids
+
+def load_game_config(
+    game_file: str | Path,
+    base_dir: str = "../frontend/public"
+) -> Optional[tuple[Path, str, str, List[str]]]:
+    """
+    Load and validate a game config file.
+    
+    Args:
+        game_file: Path to the game JSON config file, relative to base_dir
+        base_dir: Base directory for game files
+    
+    Returns:
+        Tuple of (config path, prompt ID, media path, keywords), or None if
+        the config is missing or invalid
+    """
+    game_path = Path(base_dir) / str(game_file).lstrip('/')
+    try:
+        game_data = load_json_data(str(game_path))
+    except FileNotFoundError:
+        print(f"Error loading data from {game_path}: FileNotFoundError")
+        return None
+        
+    if not game_data:
+        print(f"Failed to load game config from {game_file}")
+        return None
+    
+    # Extract key data
+    prompt_id = Path(game_file).stem
+    image_path = game_data.get('image')
+    keywords = game_data.get('keywords', [])
+    
+    if not image_path or not keywords:
+        print("Error: Game config must specify 'image' and 'keywords'")
+        return None
+    
+    return game_path, prompt_id, image_path, keywords
+
+def process_media_stage(
+    game_path: Path,
+    prompt_id: str,
+    image_path: str,
+    keywords: List[str],
+    base_dir: str
+) -> tuple[str, Optional[Dict[str, str]]]:
+    """Stage wrapper around process_game_media that raises on failure."""
+    media_url, pixelation_map = process_game_media(image_path, keywords, prompt_id, base_dir)
+    if not media_url:
+        raise RuntimeError(f"Failed to process game media for {game_path}")
+    return media_url, pixelation_map
+
+def build_schedule_stages(
+    configs: List[tuple],
+    start_times: List[Optional[str]],
+    base_dir: str,
+    connections: ConnectionManager
+) -> List[Stage]:
+    """
+    Build the stage graph that schedules games:
+    
+    - media:<prompt_id> segments and uploads each game's media on the main
+      thread, one game after another (segmentation opens interactive windows)
+    - embeddings generates similarity data for every keyword without a
+      stored version meanwhile
+    - connect opens the PostgreSQL and Redis pools meanwhile
+    - commit writes all games and similarity data once the rest is done
+    
+    Args:
+        configs: Output of load_game_config for every game, in order
+        start_times: ISO 8601 start time of every game (None for now)
+        base_dir: Base directory for game files
+        connections: Connection manager for the commit
+    """
+    similarity_games = {prompt_id: keywords for _, prompt_id, _, keywords in configs}
+    media_stages = [f"media:{prompt_id}" for prompt_id in similarity_games]
+    
+    def commit(**inputs: Any) -> List[int]:
+        games = [
+            (game_path, *inputs[f"media:{prompt_id}"], game_start)
+            for (game_path, prompt_id, _, _), game_start in zip(configs, start_times)
+        ]
+        return commit_games(games, similarity_games, inputs["embeddings"], connections)
+    
+    stages = [
+        Stage(f"media:{prompt_id}",
+              partial(process_media_stage, game_path, prompt_id, image_path, keywords, base_dir),
+              main_thread=True)
+        for game_path, prompt_id, image_path, keywords in configs
+    ]
+    stages.append(Stage("embeddings", partial(generate_similarity_data, similarity_games, connections)))
+    stages.append(Stage("connect", connections.connect))
+    stages.append(Stage("commit", commit, depends_on=(*media_stages, "embeddings", "connect")))
+    return stages
+
+def run_schedule(
+    configs: List[tuple],
+    start_times: List[Optional[str]],
+    base_dir: str
+) -> Optional[List[int]]:
+    """
+    Schedule games whose configs are already loaded.
+    
+    Returns:
+        Inserted game IDs in input order, or None if any stage failed (in
+        which case nothing was committed)
+    """
+    stages = build_schedule_stages(configs, start_times, base_dir, get_connections())
+    try:
+        results = run_stages(stages)
+    except StageError as e:
+        print(f"Error scheduling games: {e}")
+        return None
+    return results["commit"]
 
 def schedule_game(
     game_file: str | Path,
@@ -302,10 +1310,9 @@ def schedule_game(
     """
     Schedule a new game by:
     1. Loading the game config
-    2. Generating pixelated combinations
-    3. Generating similarity data
-    4. Uploading assets to blob storage
-    5. Loading everything into databases
+    2. Generating pixelated combinations and uploading assets to blob
+       storage, while similarity data is generated in the background
+    3. Loading everything into the databases in one commit
     
     Args:
         game_file: Path to the game JSON config file
@@ -318,51 +1325,16 @@ def schedule_game(
     try:
         print(f"\nScheduling new game from {game_file}")
         
-        # Load game config
-        game_path = Path(base_dir) / game_file.lstrip('/')
-        try:
-            game_data = load_json_data(str(game_path))
-        except FileNotFoundError:
-            print(f"Error loading data from {game_path}: FileNotFoundError")
-            return False
-            
-        if not game_data:
-            print(f"Failed to load game config from {game_file}")
-            return False
-        
-        # Extract key data
-        prompt_id = Path(game_file).stem
-        image_path = game_data.get('image')
-        keywords = game_data.get('keywords', [])
-        
-        if not image_path or not keywords:
-            print("Error: Game config must specify 'image' and 'keywords'")
+        config = load_game_config(game_file, base_dir)
+        if config is None:
             return False
+        prompt_id = config[1]
         
-        # Process the media and generate pixelated combinations
-        media_url, pixelation_map = process_game_media(
-            image_path,
-            keywords,
-            prompt_id,
-            base_dir
-        )
-        if not media_url:
-            print("Failed to process game media")
+        game_ids = run_schedule([config], [start_time], base_dir)
+        if not game_ids:
             return False
         
-        # Load game data into PostgreSQL
-        game_id = load_game_data(game_path, media_url, pixelation_map, start_time)
-        if not game_id:
-            print("Failed to load game data into PostgreSQL")
-            return False
-        
-        # Generate and load similarity data into Redis
-        redis_success = load_similarity_data(keywords, prompt_id)
-        if not redis_success:
-            print("Failed to load similarity data into Redis")
-            return False
-        
-        print(f"\nSuccessfully scheduled game {prompt_id} (ID: {game_id})")
+        print(f"\nSuccessfully scheduled game {prompt_id} (ID: {game_ids[0]})")
         if start_time:
             print(f"Game will become active at: {start_time}")
         else:
@@ -374,16 +1346,119 @@ def schedule_game(
         print(f"Error scheduling game: {e}")
         return False
 
+def schedule_games(
+    game_files: List[str | Path],
+    start_time: Optional[str] = None,
+    base_dir: str = "../frontend/public",
+    interval: timedelta = timedelta(days=1)
+) -> bool:
+    """
+    Schedule several games at once.
+    
+    Media is processed game by game while the similarity data for all games
+    is generated in one vocabulary pass in the background; then all games
+    are inserted with one multi-row INSERT and their similarity data written
+    in one Redis transaction, committed together.
+    
+    Args:
+        game_files: Paths to the game JSON config files, in activation order
+        start_time: Optional ISO 8601 start time of the first game
+            (defaults to now)
+        base_dir: Base directory for game files
+        interval: Time between consecutive games' activation
+    
+    Returns:
+        True if all operations succeeded, False otherwise
+    """
+    try:
+        if start_time:
+            first_start = dateutil.parser.parse(start_time)
+            if first_start.tzinfo is None:
+                print(f"Error parsing start time '{start_time}': Start time must include timezone information")
+                return False
+        else:
+            first_start = datetime.now(timezone.utc)
+        
+        configs = []
+        for game_file in game_files:
+            config = load_game_config(game_file, base_dir)
+            if config is None:
+                return False
+            configs.append(config)
+        start_times = [(first_start + i * interval).isoformat() for i in range(len(configs))]
+        
+        print(f"\nScheduling {len(configs)} games")
+        game_ids = run_schedule(configs, start_times, base_dir)
+        if not game_ids:
+            return False
+        
+        for (_, prompt_id, _, _), game_start, game_id in zip(configs, start_times, game_ids):
+            print(f"Scheduled game {prompt_id} (ID: {game_id}) at {game_start}")
+        print(f"\nSuccessfully scheduled {len(game_ids)} games")
+        return True
+        
+    except Exception as e:
+        print(f"Error scheduling games: {e}")
+        return False
+
+def gc_main(argv: List[str]) -> None:
+    """Entry point for `schedule_game.py gc`."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="schedule_game.py gc",
+        description="Remove games past the retention period, with their Redis keys and blobs, "
+                    "and similarity data that no scheduled game references"
+    )
+    parser.add_argument(
+        "--retention-days",
+        type=float,
+        default=DEFAULT_RETENTION_DAYS,
+        help=f"Remove games activated more than this many days ago, except the current one "
+             f"(default: {DEFAULT_RETENTION_DAYS})"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report what would be removed and how many bytes it would reclaim"
+    )
+    args = parser.parse_args(argv)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=args.retention_days)
+    
+    try:
+        report = collect_expired_games(cutoff, args.dry_run)
+        collected = collect_similarity_garbage(get_connections().redis(), args.dry_run)
+    except Exception as e:
+        print(f"Error collecting garbage: {e}")
+        sys.exit(1)
+    finally:
+        close_connections()
+    
+    action = "Would remove" if args.dry_run else "Removed"
+    print(f"{action} {report['games']} game(s) activated before {cutoff.isoformat()}")
+    print(f"  Redis: {report['redis_keys']} key(s), {format_size(report['redis_bytes'])}")
+    print(f"  Blob storage: {report['blobs']} blob(s), {format_size(report['blob_bytes'])}")
+    for key in collected:
+        print(key)
+    print(f"{action} {len(collected)} other unreferenced similarity version(s)")
+
 def main():
     """Entry point for command line usage."""
     import argparse
     
+    if sys.argv[1:2] == ["gc"]:
+        gc_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
-        description="Schedule games for the Unprompted application"
+        description="Schedule games for the Unprompted application",
+        epilog="Run `schedule_game.py gc` to delete similarity data no game uses any more"
     )
     parser.add_argument(
-        "game_file",
-        help="Path to the game JSON config file"
+        "game_files",
+        nargs="+",
+        metavar="game_file",
+        help="Path to the game JSON config file (several are scheduled in one batch)"
     )
     parser.add_argument(
         "--start-time",
@@ -394,14 +1469,48 @@ def main():
         default="game-configs",
         help="Base directory for game files"
     )
+    parser.add_argument(
+        "--interval-hours",
+        type=float,
+        default=24,
+        help="Hours between consecutive games when scheduling several (default: 24)"
+    )
+    parser.add_argument(
+        "--timings",
+        metavar="FILE",
+        help="Write per-stage timings as JSON lines to FILE ('-' for stderr)"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Write a cProfile .pstats file per top-level stage to DIR"
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record the tracemalloc peak of every stage in the timings"
+    )
     
     args = parser.parse_args()
+    instrumentation.configure(args.timings, args.profile, args.trace_memory)
     
-    success = schedule_game(
-        args.game_file,
-        args.start_time,
-        args.base_dir
-    )
+    try:
+        if len(args.game_files) == 1:
+            success = schedule_game(
+                args.game_files[0],
+                args.start_time,
+                args.base_dir
+            )
+        else:
+            success = schedule_games(
+                args.game_files,
+                args.start_time,
+                args.base_dir,
+                timedelta(hours=args.interval_hours)
+            )
+    finally:
+        close_connections()
+        instrumentation.shutdown()
     
     if not success:
         print("\nGame scheduling failed")
@@ -14,28 +14,89 @@ import argparse
 import os
 import sys
 import json
+import queue
+import shutil
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import Future
 from pathlib import Path
 import numpy as np
 import cv2
-import matplotlib.pyplot as plt
-from matplotlib.widgets import Button
 from PIL import Image, ImageFilter
-import torch
 
-# Check if sam2 is installed
-from sam2.build_sam import build_sam2, build_sam2_video_predictor
-from sam2.sam2_image_predictor import SAM2ImagePredictor
+# torch, sam2 and matplotlib take seconds to import, so they are imported
+# where SAM2 or the interactive UI is first used. Compositing and encoding
+# (Segmenter.from_masks) need neither.
+from encoding import DEFAULT_METHODS, DEFAULT_MIN_SSIM, EncodingBudget, WebpEncoder
+from instrumentation import emit, stage
+from renditions import RENDITION_WIDTHS, save_renditions
 
-def extract_frames(video_path, output_dir):
+# Colour (RGB) and alpha of the mask overlay in the interactive windows
+MASK_OVERLAY_COLOR = (255, 40, 40)
+MASK_OVERLAY_ALPHA = 128
+# The overlay is drawn at no more than this many pixels per side; it only
+# needs screen resolution, and resampling a full-size RGBA array dominates
+# the redraw time for large images
+MASK_OVERLAY_MAX_SIDE = 1024
+
+# SAM2.1 checkpoint and config for each model tier, smallest and fastest first
+SAM2_MODELS = {
+    "tiny": ("checkpoints/sam2.1_hiera_tiny.pt", "configs/sam2.1/sam2.1_hiera_t.yaml"),
+    "small": ("checkpoints/sam2.1_hiera_small.pt", "configs/sam2.1/sam2.1_hiera_s.yaml"),
+    "base+": ("checkpoints/sam2.1_hiera_base_plus.pt", "configs/sam2.1/sam2.1_hiera_b+.yaml"),
+    "large": ("checkpoints/sam2.1_hiera_large.pt", "configs/sam2.1/sam2.1_hiera_l.yaml"),
+}
+DEFAULT_SAM2_MODEL = "large"
+
+# Frames shared by consecutive windows in windowed video propagation; the
+# previous window's masks on these frames seed the next window
+VIDEO_WINDOW_OVERLAP = 4
+
+# With a keyframe stride, frames between keyframes get masks warped by
+# optical flow. Where the forward and backward warps agree less than this
+# (IoU), SAM2 is rerun on the frames between the two keyframes
+KEYFRAME_MIN_CONFIDENCE = 0.8
+# Optical flow is estimated at no more than this many pixels per side and
+# scaled up; mask boundaries move smoothly, so full resolution adds little
+FLOW_MAX_SIDE = 512
+
+# Pixelated regions are resized down by this factor and back up (lower = more pixelation)
+PIXELATION_FACTOR = 20
+# Still images are composited in strips of about this many rows, so only the
+# output image and one strip's temporaries are resident
+COMPOSITE_STRIP_ROWS = 256
+
+# Video combinations are built by a decode -> composite -> encode pipeline;
+# at most this many frames wait in each queue between two stages
+PIPELINE_QUEUE_SIZE = 4
+# Codecs tried in order when writing videos, with their file extensions
+VIDEO_CODECS = [
+    ('avc1', '.mp4'),  # H.264 codec
+    ('mp4v', '.mp4'),  # fallback MP4 codec
+    ('XVID', '.avi'),  # AVI format as last resort
+]
+
+# Masks predicted at a reduced inference resolution are upsampled with a
+# guided filter of this radius (in inference pixels) and regularisation
+MASK_REFINE_RADIUS = 2
+MASK_REFINE_EPS = 1e-3
+
+def extract_frames(video_path, output_dir, inference_dir=None, inference_size=None):
     """Extract frames from a video file.
     
     Args:
         video_path: Path to the video file
         output_dir: Directory to save the frames
+        inference_dir: Optional directory to also save downscaled copies of
+            the frames in, under the same names
+        inference_size: Longest side of the downscaled copies
         
     Returns:
         List of frame filenames
     """
+    if inference_dir is not None:
+        Path(inference_dir).mkdir(exist_ok=True, parents=True)
     # Create output directory if it doesn't exist
     Path(output_dir).mkdir(exist_ok=True, parents=True)
     
@@ -56,11 +117,322 @@ def extract_frames(video_path, output_dir):
         frame_file = os.path.join(output_dir, f"{frame_count:05d}.jpg")
         cv2.imwrite(frame_file, frame)
         frame_files.append(os.path.basename(frame_file))
+        if inference_dir is not None:
+            cv2.imwrite(os.path.join(inference_dir, frame_files[-1]), resize_for_inference(frame, inference_size))
         frame_count += 1
     
     cap.release()
     return frame_files
 
+def start_background(name, func, *args, **kwargs):
+    """Run func on a daemon thread and return a Future for its result.
+    
+    Used to load SAM2 and compute features while the UI is already open.
+    
+    Args:
+        name: Thread name
+        func: Function to call with args and kwargs
+        
+    Returns:
+        concurrent.futures.Future that completes with func's result or error
+    """
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+def build_sam2_model(builder, model=DEFAULT_SAM2_MODEL, quantize=False, threads=None):
+    """Build a SAM2 model of the given tier, applying the CPU options.
+    
+    Args:
+        builder: sam2.build_sam.build_sam2 or build_sam2_video_predictor
+        model: Model tier, one of SAM2_MODELS
+        quantize: Convert the Linear layers (the bulk of the Hiera encoder and
+            the mask decoder) to dynamic int8 quantization. CPU only; ignored
+            on CUDA.
+        threads: Number of threads torch uses for CPU inference, or None for
+            torch's default
+        
+    Returns:
+        Tuple of (model, device)
+    """
+    if model not in SAM2_MODELS:
+        raise ValueError(f"Unknown SAM2 model '{model}', expected one of {list(SAM2_MODELS)}")
+    import torch
+    checkpoint, config = SAM2_MODELS[model]
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if threads:
+        torch.set_num_threads(threads)
+    
+    quantize = quantize and device.type == "cpu"
+    with stage("sam2_load", device=str(device), model=model, quantize=quantize,
+               threads=torch.get_num_threads()):
+        sam2_model = builder(config, checkpoint, device=device)
+        if quantize:
+            torch.ao.quantization.quantize_dynamic(
+                sam2_model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+    return sam2_model, device
+
+def load_image_predictor(model=DEFAULT_SAM2_MODEL, quantize=False, threads=None):
+    """Build a SAM2 image predictor; see build_sam2_model for the arguments."""
+    with stage("import_sam2"):
+        from sam2.build_sam import build_sam2
+        from sam2.sam2_image_predictor import SAM2ImagePredictor
+    sam2_model, _ = build_sam2_model(build_sam2, model, quantize, threads)
+    return SAM2ImagePredictor(sam2_model)
+
+def inference_scale(height, width, inference_size):
+    """Factor that brings the longest side down to inference_size (never above 1)."""
+    if not inference_size:
+        return 1.0
+    return min(1.0, inference_size / max(height, width))
+
+def resize_for_inference(image, inference_size):
+    """Downscale an image so its longest side is at most inference_size."""
+    height, width = image.shape[:2]
+    scale = inference_scale(height, width, inference_size)
+    if scale == 1.0:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def upsample_mask(mask, guide, radius=MASK_REFINE_RADIUS, eps=MASK_REFINE_EPS):
+    """Upsample a low-resolution mask to the guide's size, snapping it to the guide's edges.
+    
+    A fast guided filter (He and Sun, 2015): the local linear model relating
+    the mask to the guide's intensity is fit at the mask's resolution, then
+    upsampled and applied to the full-resolution guide, so mask boundaries
+    follow image edges instead of the blocky or blurred outline of a plain
+    resize.
+    
+    Args:
+        mask: (h, w) boolean or 0/1 mask
+        guide: Full-resolution image, grayscale or RGB uint8
+        radius: Filter radius in mask pixels
+        eps: Regularisation; smaller follows weaker edges
+        
+    Returns:
+        Boolean mask the size of the guide
+    """
+    height, width = guide.shape[:2]
+    if mask.shape == (height, width):
+        return mask.astype(bool)
+    gray = guide if guide.ndim == 2 else cv2.cvtColor(guide, cv2.COLOR_RGB2GRAY)
+    
+    # Fit mask ~ a * guide + b over each window at the mask's resolution
+    small = cv2.resize(gray, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_AREA).astype(np.float32) / 255
+    p = mask.astype(np.float32)
+    window = (2 * radius + 1, 2 * radius + 1)
+    mean_i = cv2.blur(small, window)
+    mean_p = cv2.blur(p, window)
+    cov_ip = cv2.blur(small * p, window) - mean_i * mean_p
+    var_i = cv2.blur(small * small, window) - mean_i * mean_i
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    
+    # Apply the smoothed coefficients at full resolution, in place
+    a = cv2.resize(cv2.blur(a, window), (width, height), interpolation=cv2.INTER_LINEAR)
+    b = cv2.resize(cv2.blur(b, window), (width, height), interpolation=cv2.INTER_LINEAR)
+    a *= gray
+    a *= 1 / 255
+    a += b
+    return a >= 0.5
+
+def prompt_arrays(prompts, scale=1.0):
+    """
+    Stack recorded prompts into the arrays of one batched SAM2 predict call.
+
+    Args:
+        prompts: Prompt dictionaries with "points" (and optional "labels",
+            all positive by default) and/or a "box" as [x0, y0, x1, y1], in
+            original image coordinates
+        scale: Inference scale the coordinates are multiplied by
+
+    Returns:
+        Tuple of (point_coords (K, N, 2), point_labels (K, N), box (K, 4)),
+        any of which is None when no prompt uses it. Prompts with fewer than
+        N points are padded with label -1, which SAM2 ignores.
+
+    Raises:
+        ValueError: If a prompt has neither points nor a box, or only some
+            prompts have a box
+    """
+    if any(not prompt.get("points") and prompt.get("box") is None for prompt in prompts):
+        raise ValueError("Every prompt needs points or a box")
+    has_box = [prompt.get("box") is not None for prompt in prompts]
+    if any(has_box) and not all(has_box):
+        raise ValueError("Either every prompt in a batch has a box or none does")
+
+    point_coords = point_labels = box = None
+    num_points = max(len(prompt.get("points") or []) for prompt in prompts)
+    if num_points:
+        point_coords = np.zeros((len(prompts), num_points, 2), dtype=np.float32)
+        point_labels = np.full((len(prompts), num_points), -1, dtype=np.int32)
+        for i, prompt in enumerate(prompts):
+            points = prompt.get("points") or []
+            if points:
+                point_coords[i, :len(points)] = np.asarray(points, dtype=np.float32) * scale
+                point_labels[i, :len(points)] = prompt.get("labels") or [1] * len(points)
+    if all(has_box):
+        box = np.array([prompt["box"] for prompt in prompts], dtype=np.float32) * scale
+    return point_coords, point_labels, box
+
+def nearest_indices(size, new_size):
+    """Source index of each output pixel when PIL resizes an axis with NEAREST."""
+    index = Image.fromarray(np.arange(size, dtype=np.int32)[None, :])
+    return np.asarray(index.resize((new_size, 1), Image.NEAREST))[0]
+
+def pixelation_indices(size, factor=PIXELATION_FACTOR):
+    """Source index of each pixel along one axis after pixelation.
+    
+    Pixelating resizes down by factor and back up with NEAREST, so along
+    each axis pixel i takes the value of pixel indices[i].
+    """
+    return nearest_indices(size, size // factor)[nearest_indices(size // factor, size)]
+
+def mask_iou(a, b):
+    """Intersection over union of two boolean masks; 1.0 if both are empty."""
+    union = np.logical_or(a, b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(a, b).sum() / union)
+
+def keyframe_indices(num_frames, stride):
+    """Every stride-th frame index, always ending with the last frame."""
+    keyframes = list(range(0, num_frames, stride))
+    if keyframes[-1] != num_frames - 1:
+        keyframes.append(num_frames - 1)
+    return keyframes
+
+def estimate_flow(src, dst, max_side=FLOW_MAX_SIDE):
+    """Dense optical flow from dst back to src.
+    
+    Args:
+        src: Grayscale frame the masks are warped from
+        dst: Grayscale frame the masks are warped to
+        max_side: Flow is estimated at no more than this many pixels per side
+        
+    Returns:
+        (height, width, 2) float32 array such that dst[y, x] matches
+        src[y + flow[y, x, 1], x + flow[y, x, 0]]
+    """
+    height, width = dst.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        src = cv2.resize(src, size, interpolation=cv2.INTER_AREA)
+        dst = cv2.resize(dst, size, interpolation=cv2.INTER_AREA)
+    flow = cv2.calcOpticalFlowFarneback(dst, src, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+    if scale < 1.0:
+        flow = cv2.resize(flow, (width, height), interpolation=cv2.INTER_LINEAR) / scale
+    return flow
+
+def warp_mask(mask, flow):
+    """Warp a float mask with a flow from estimate_flow."""
+    height, width = flow.shape[:2]
+    grid_x, grid_y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    return cv2.remap(mask, grid_x + flow[..., 0], grid_y + flow[..., 1], cv2.INTER_LINEAR,
+                     borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+def interpolate_masks(gray_frames, start_masks, end_masks):
+    """Fill the frames between two keyframes by warping their masks with optical flow.
+    
+    Each mask is warped forward from the first keyframe and backward from
+    the last, and the two are blended by temporal distance. Where the warps
+    disagree the flow is unreliable (occlusion, fast motion), so their IoU
+    is returned as the frame's confidence.
+    
+    Args:
+        gray_frames: Grayscale frames from one keyframe to the next, inclusive
+        start_masks: Dictionary mapping object IDs to boolean masks on the first frame
+        end_masks: Dictionary mapping object IDs to boolean masks on the last frame
+        
+    Returns:
+        Tuple of (masks, confidences) for the frames strictly between the
+        keyframes, each a list of dictionaries keyed by object ID
+    """
+    last = len(gray_frames) - 1
+    # forward_flows[i - 1] warps frame i - 1 onto frame i, backward_flows[i - 1] frame i + 1 onto i
+    forward_flows = [estimate_flow(gray_frames[i - 1], gray_frames[i]) for i in range(1, last)]
+    backward_flows = [estimate_flow(gray_frames[i + 1], gray_frames[i]) for i in range(1, last)]
+    
+    masks = [{} for _ in range(1, last)]
+    confidences = [{} for _ in range(1, last)]
+    for obj_id, start_mask in start_masks.items():
+        forward = [start_mask.astype(np.float32)]
+        for flow in forward_flows:
+            forward.append(warp_mask(forward[-1], flow))
+        backward = [end_masks[obj_id].astype(np.float32)]
+        for flow in reversed(backward_flows):
+            backward.append(warp_mask(backward[-1], flow))
+        backward.reverse()
+        
+        # forward[i] and backward[i - 1] are both frame i
+        for i in range(1, last):
+            weight = i / last
+            blended = (1 - weight) * forward[i] + weight * backward[i - 1]
+            masks[i - 1][obj_id] = blended >= 0.5
+            confidences[i - 1][obj_id] = mask_iou(forward[i] >= 0.5, backward[i - 1] >= 0.5)
+    return masks, confidences
+
+class MaskStore(Mapping):
+    """Per-frame object masks kept on disk instead of in memory.
+    
+    Maps frame indices to {obj_id: boolean mask} dictionaries, like the
+    in-memory video segments. Each frame is bit-packed into a compressed
+    .npz file, so a long clip costs disk space rather than RAM. The last
+    frame read is cached, as compositing reads every mask of a frame in turn.
+    """
+    
+    def __init__(self, directory, height, width):
+        self.directory = Path(directory)
+        self.directory.mkdir(exist_ok=True, parents=True)
+        self.shape = (height, width)
+        self._cached = (None, None)
+    
+    def _path(self, frame_idx):
+        return self.directory / f"{frame_idx:05d}.npz"
+    
+    def save(self, frame_idx, masks):
+        """Store a frame's {obj_id: boolean mask} dictionary."""
+        np.savez_compressed(
+            self._path(frame_idx),
+            **{str(obj_id): np.packbits(mask, axis=None) for obj_id, mask in masks.items()}
+        )
+        if self._cached[0] == frame_idx:
+            self._cached = (None, None)
+    
+    def __getitem__(self, frame_idx):
+        if self._cached[0] != frame_idx:
+            if frame_idx not in self:
+                raise KeyError(frame_idx)
+            size = self.shape[0] * self.shape[1]
+            with np.load(self._path(frame_idx)) as data:
+                masks = {
+                    int(obj_id): np.unpackbits(data[obj_id], count=size).view(bool).reshape(self.shape)
+                    for obj_id in data.files
+                }
+            self._cached = (frame_idx, masks)
+        return self._cached[1]
+    
+    def __contains__(self, frame_idx):
+        return isinstance(frame_idx, int) and self._path(frame_idx).exists()
+    
+    def __iter__(self):
+        return iter(sorted(int(path.stem) for path in self.directory.glob("*.npz")))
+    
+    def __len__(self):
+        return sum(1 for _ in self.directory.glob("*.npz"))
+
 def write_video(output_path, frames, fps=30.0):
     """Write frames to a video file, falling back to OpenCV if FFmpeg is not available.
     
@@ -68,23 +440,21 @@ def write_video(output_path, frames, fps=30.0):
         output_path: Path to save the video file
         frames: List of frames as numpy arrays in RGB format
         fps: Frames per second for the output video
+        
+    Returns:
+        Path of the written file (the extension depends on the codec used),
+        or None if there were no frames
     """
     if not frames:
-        return
+        return None
     
     # Get dimensions from first frame
     height, width = frames[0].shape[:2]
     
 
     # Try different codecs
-    codecs = [
-        ('avc1', '.mp4'),  # H.264 codec
-        ('mp4v', '.mp4'),  # fallback MP4 codec
-        ('XVID', '.avi'),  # AVI format as last resort
-    ]
-    
     last_error = None
-    for codec, ext in codecs:
+    for codec, ext in VIDEO_CODECS:
         try:
             # Update extension if needed
             out_path = str(Path(output_path).with_suffix(ext))
@@ -107,7 +477,7 @@ def write_video(output_path, frames, fps=30.0):
             # Verify the file was written and is not empty
             if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
                 print(f"Successfully saved video with {codec} codec to {out_path}")
-                return
+                return out_path
                 
         except Exception as e:
             last_error = e
@@ -118,8 +488,68 @@ def write_video(output_path, frames, fps=30.0):
     else:
         raise RuntimeError("Failed to write video with any supported codec")
 
+def open_video_writer(output_path, width, height, fps=30.0):
+    """Open a streaming video writer with the first codec that works.
+    
+    Unlike write_video, frames are written one at a time (in BGR), so a
+    video never has to be held in memory.
+    
+    Returns:
+        Tuple of (cv2.VideoWriter, path of the file being written)
+        
+    Raises:
+        RuntimeError: If no codec could be opened
+    """
+    for codec, ext in VIDEO_CODECS:
+        out_path = str(Path(output_path).with_suffix(ext))
+        writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height), isColor=True)
+        if writer.isOpened():
+            return writer, out_path
+        writer.release()
+    raise RuntimeError("Failed to open a video writer with any supported codec")
+
+class PipelineAborted(Exception):
+    """Raised inside pipeline threads once another stage has failed."""
+
+class StageCounter:
+    """Throughput counters for one pipeline stage, shared by its threads.
+    
+    busy_s is time spent working and wait_s time spent blocked on the
+    stage's queues: a stage that mostly waits for output space is being
+    held back by the stage after it (backpressure).
+    """
+    
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_s = 0.0
+        self.wait_s = 0.0
+        self._lock = threading.Lock()
+    
+    def add(self, busy_s, wait_s=0.0, items=1):
+        with self._lock:
+            self.items += items
+            self.busy_s += busy_s
+            self.wait_s += wait_s
+    
+    def report(self, elapsed_s, threads):
+        """Print and emit the stage's throughput over elapsed_s seconds."""
+        rate = self.items / elapsed_s if elapsed_s > 0 else 0.0
+        print(f"  {self.name:<10} {self.items:>6} frames  {rate:>7.1f}/s  "
+              f"busy {self.busy_s:>6.1f} s  waiting {self.wait_s:>6.1f} s  ({threads} thread(s))")
+        emit("pipeline_stage", stage=self.name, items=self.items, threads=threads,
+             busy_s=self.busy_s, wait_s=self.wait_s, items_per_s=rate)
+
 class Segmenter:
-    def __init__(self, image_path, keywords, output_dir="masked_images", combinations_dir="blurry_combinations"):
+    # Called with (filename, path) as soon as each combination or rendition is saved
+    on_output = None
+    # Widths of the smaller renditions saved with each combination (see renditions.py)
+    rendition_widths = RENDITION_WIDTHS
+    # Quality or size each WEBP must meet (see encoding.py)
+    encoding_budget = EncodingBudget()
+
+    def __init__(self, image_path, keywords, output_dir="masked_images", combinations_dir="blurry_combinations",
+                 model=DEFAULT_SAM2_MODEL, quantize=False, threads=None, inference_size=None, predictor=None):
         """
         Initialize the segmenter with an image and keywords.
         
@@ -128,145 +558,336 @@ class Segmenter:
             keywords: List of keywords for segments
             output_dir: Directory to save masks
             combinations_dir: Directory to save pixelation combinations
+            model: SAM2 model tier, one of SAM2_MODELS
+            quantize: Use dynamic int8 quantization on CPU
+            threads: Number of torch CPU threads, or None for the default
+            inference_size: Downscale the image so its longest side is at
+                most this many pixels for SAM2; clicks stay in original
+                coordinates and masks are upsampled with upsample_mask.
+                None runs SAM2 on the full-resolution image.
+            predictor: An already loaded SAM2 image predictor to reuse instead
+                of loading the model (model, quantize and threads are then
+                ignored); it must not be used by anything else meanwhile
         """
         self.image_path = Path(image_path)
         self.keywords = keywords
         self.output_dir = Path(output_dir)
         self.combinations_dir = Path(combinations_dir)
+        self.model = model
+        self.quantize = quantize
+        self.threads = threads
         
         # Create output directories if they don't exist
         self.output_dir.mkdir(exist_ok=True, parents=True)
         self.combinations_dir.mkdir(exist_ok=True, parents=True)
         
         # Load the image
-        self.image = cv2.imread(str(self.image_path))
-        if self.image is None:
-            raise ValueError(f"Could not load image from {image_path}")
-        self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        with stage("image_decode"):
+            self.image = cv2.imread(str(self.image_path))
+            if self.image is None:
+                raise ValueError(f"Could not load image from {image_path}")
+            self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
         
         # Store dimensions of the image
         self.height, self.width = self.image.shape[:2]
         
-        # Dictionary to store masks for each keyword
-        self.masks = {}
+        # SAM2 resizes its input to 1024 px anyway, so large images can be
+        # downscaled once up front
+        self.inference_scale = inference_scale(self.height, self.width, inference_size)
+        with stage("inference_resize", scale=self.inference_scale):
+            self.inference_image = resize_for_inference(self.image, inference_size)
         
-        # Initialize SAM2 model
-        print("Loading SAM2 model...")
-        sam2_checkpoint = "checkpoints/sam2.1_hiera_large.pt"
-        model_cfg = "configs/sam2.1/sam2.1_hiera_l.yaml"
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.sam2_model = build_sam2(model_cfg, sam2_checkpoint, device=self.device)
-        self.predictor = SAM2ImagePredictor(self.sam2_model)
-        self.predictor.set_image(self.image)
+        # Dictionary to store masks for each keyword, and the clicks that made them
+        self.masks = {}
+        self.prompts = {}
         
+        # Load SAM2 and embed the image in the background so the UI can open
+        # right away; clicks made meanwhile are queued (see _process_keyword)
+        self._given_predictor = predictor
+        self._warmup = start_background("sam2-warmup", self._load_predictor)
         print(f"Loaded image: {self.image_path} with keywords: {keywords}")
-        print(f"Using device: {self.device}")
+    
+    def _load_predictor(self):
+        """Build the SAM2 image predictor, unless given one, and compute the image features."""
+        predictor = self._given_predictor
+        if predictor is None:
+            print(f"Loading SAM2 model ({self.model}{', int8' if self.quantize else ''})...")
+            predictor = load_image_predictor(self.model, self.quantize, self.threads)
+        self.device = predictor.device
+        with stage("sam2_set_image", model=self.model, scale=self.inference_scale):
+            predictor.set_image(self.inference_image)
+        print(f"SAM2 ready on {self.device}")
+        return predictor
+    
+    @property
+    def predictor(self):
+        """The SAM2 predictor, waiting for the background warm-up if needed."""
+        return self._warmup.result()
+    
+    def _check_warmup(self):
+        """Re-raise a failed background warm-up on the calling thread."""
+        if self._warmup.done() and self._warmup.exception() is not None:
+            raise self._warmup.exception()
+
+    @classmethod
+    def from_masks(cls, image, masks, output_dir="masked_images", combinations_dir="blurry_combinations"):
+        """
+        Create a segmenter from an RGB image and already accepted masks.
+
+        Skips SAM2 and the interactive step entirely, so combinations can be
+        regenerated from saved masks (or benchmarked on synthetic ones).
+
+        Args:
+            image: RGB image as a (height, width, 3) uint8 array
+            masks: Dictionary mapping keywords to boolean (height, width) masks
+            output_dir: Directory to save masks
+            combinations_dir: Directory to save pixelation combinations
+        """
+        segmenter = cls.__new__(cls)
+        segmenter.image_path = None
+        segmenter.keywords = list(masks.keys())
+        segmenter.output_dir = Path(output_dir)
+        segmenter.combinations_dir = Path(combinations_dir)
+        segmenter.output_dir.mkdir(exist_ok=True, parents=True)
+        segmenter.combinations_dir.mkdir(exist_ok=True, parents=True)
+        segmenter.image = image
+        segmenter.height, segmenter.width = image.shape[:2]
+        segmenter.masks = dict(masks)
+        segmenter.prompts = {}
+        segmenter.inference_scale = 1.0
+        segmenter.inference_image = image
+        return segmenter
+
+    def segment_image(self, prompts=None):
+        """
+        Process each keyword and create masks through user interaction.
         
-    def segment_image(self):
-        """Process each keyword and create masks through user interaction."""
+        Args:
+            prompts: Optional dictionary mapping keywords to recorded prompts
+                (see prompt_arrays); those keywords are segmented headless
+                with segment_prompts and only the rest are interactive
+        """
+        if prompts:
+            self.segment_prompts(prompts)
         for keyword in self.keywords:
-            self._process_keyword(keyword)
+            if keyword in self.masks:
+                continue
+            with stage("keyword", keyword=keyword, interactive=True):
+                self._process_keyword(keyword)
             
         # Generate pixelated combinations
-        self._generate_combinations()
+        with stage("combinations", masks=len(self.masks)):
+            self._generate_combinations()
         
         # Save metadata
         self._save_metadata()
     
+    def segment_prompts(self, prompts):
+        """
+        Segment keywords from recorded prompts, without user interaction.
+        
+        All keywords are decoded in one batched predict call against the
+        shared image embedding, rather than one call per keyword.
+        
+        Args:
+            prompts: Dictionary mapping keywords to prompts with "points",
+                "labels" and/or "box" in original image coordinates; keywords
+                not in self.keywords are ignored
+        """
+        keywords = [keyword for keyword in self.keywords if keyword in prompts]
+        if not keywords:
+            return
+        point_coords, point_labels, box = prompt_arrays([prompts[k] for k in keywords], self.inference_scale)
+        
+        predictor = self.predictor
+        with stage("predict_prompts", keywords=len(keywords)):
+            masks, _, _ = predictor.predict(
+                point_coords=point_coords,
+                point_labels=point_labels,
+                box=box,
+                multimask_output=False
+            )
+        # (K, 1, H, W), or (1, H, W) when there is a single keyword
+        masks = masks.reshape(len(keywords), *masks.shape[-2:])
+        
+        for keyword, mask in zip(keywords, masks):
+            if self.inference_scale < 1.0:
+                with stage("mask_upsample", keyword=keyword):
+                    mask = upsample_mask(mask, self.image)
+            self.masks[keyword] = mask
+            self.prompts[keyword] = prompts[keyword]
+            np.save(self.output_dir / f"{keyword}_mask.npy", mask)
+        print(f"Segmented {len(keywords)} keyword(s) from recorded prompts")
+    
     def _process_keyword(self, keyword):
-        """Process a single keyword through user interaction."""
+        """Process a single keyword through user interaction.
+        
+        The figure, buttons and image are created once. Each click re-runs
+        the SAM2 decoder on all points with the previous low-resolution
+        logits as mask_input, updates the overlay in place and redraws only
+        the overlay, points and status with blitting. Per-click latency is
+        printed and emitted as a "click" instrumentation event.
+        """
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Button
+
         print(f"\nProcessing keyword: {keyword}")
         
-        # Set up the interactive plot
-        plt.figure(figsize=(10, 8))
-        plt.imshow(self.image)
-        plt.title(f"Click on the image to mark the region for '{keyword}'. Press 'Accept' when done.")
+        # Set up the interactive plot once; only the animated artists change
+        title = f"Click on the image to mark the region for '{keyword}'. Press 'Accept' when done."
+        fig = plt.figure(figsize=(10, 8))
+        main_ax = fig.add_subplot()
+        main_ax.imshow(self.image)
+        main_ax.set_title(title if self._warmup.done() else f"{title}\n(SAM2 is loading; clicks are queued)")
+        main_ax.set_label("main")
+        
+        step = -(-max(self.height, self.width) // MASK_OVERLAY_MAX_SIDE)
+        overlay = np.zeros((-(-self.height // step), -(-self.width // step), 4), dtype=np.uint8)
+        overlay[..., :3] = MASK_OVERLAY_COLOR
+        overlay_artist = main_ax.imshow(
+            overlay, animated=True, interpolation='nearest',
+            extent=(-0.5, self.width - 0.5, self.height - 0.5, -0.5)
+        )
+        points_artist, = main_ax.plot([], [], 'ro', markersize=8, animated=True)
+        status_artist = main_ax.text(
+            0.01, 0.01, "", transform=main_ax.transAxes, color='white', fontsize=9,
+            bbox=dict(facecolor='black', alpha=0.6), animated=True
+        )
+        animated = (overlay_artist, points_artist, status_artist)
         
         # Initialize the points and mask
         points = []
         mask = None
+        logits = None
+        background = None
+        latencies = []
+        
+        def draw_animated():
+            for artist in animated:
+                main_ax.draw_artist(artist)
+        
+        def on_draw(event):
+            # A full redraw (first show, resize): cache everything static
+            nonlocal background
+            background = fig.canvas.copy_from_bbox(fig.bbox)
+            draw_animated()
+        
+        def refresh():
+            if background is None or not fig.canvas.supports_blit:
+                fig.canvas.draw_idle()
+                return
+            fig.canvas.restore_region(background)
+            draw_animated()
+            fig.canvas.blit(fig.bbox)
+            fig.canvas.flush_events()
+        
+        def show_points():
+            xy = np.array(points).reshape(-1, 2)
+            points_artist.set_data(xy[:, 0], xy[:, 1])
+        
+        def predict_and_draw(started):
+            nonlocal mask, logits
+            masks, _, low_res_logits = self.predictor.predict(
+                point_coords=np.array(points) * self.inference_scale,
+                point_labels=np.ones(len(points)),
+                mask_input=logits,
+                multimask_output=False
+            )
+            predicted = time.perf_counter()
+            
+            # Store the latest mask and refine from its logits next time
+            mask = masks[0]
+            logits = low_res_logits
+            
+            if mask.shape == (self.height, self.width):
+                shown = mask[::step, ::step]
+            else:
+                # Predicted at the inference resolution
+                shown = cv2.resize(mask.astype(np.uint8), (overlay.shape[1], overlay.shape[0]),
+                                   interpolation=cv2.INTER_NEAREST)
+            overlay[..., 3] = np.where(shown > 0, MASK_OVERLAY_ALPHA, 0)
+            overlay_artist.set_data(overlay)
+            show_points()
+            predict_ms = (predicted - started) * 1000
+            status_artist.set_text(f"{len(points)} point(s), predict {predict_ms:.0f} ms")
+            refresh()
+            
+            finished = time.perf_counter()
+            latency = {
+                "predict_ms": predict_ms,
+                "draw_ms": (finished - predicted) * 1000,
+                "total_ms": (finished - started) * 1000,
+            }
+            latencies.append(latency["total_ms"])
+            print(f"Click {len(points)} for '{keyword}': predict {latency['predict_ms']:.0f} ms, "
+                  f"draw {latency['draw_ms']:.0f} ms, total {latency['total_ms']:.0f} ms")
+            emit("click", keyword=keyword, points=len(points), **latency)
         
         # Function to handle mouse clicks
         def onclick(event):
+            started = time.perf_counter()
             # Ignore clicks on the buttons
-            if event.inaxes and event.inaxes.get_label() == "main":  # Only process clicks on the main plot
-                if event.xdata is not None and event.ydata is not None:
-                    x, y = int(event.xdata), int(event.ydata)
-                    points.append([x, y])
-                    
-                    # Update the mask prediction
-                    if len(points) > 0:
-                        prompt_points = np.array(points)
-                        masks, _, _ = self.predictor.predict(
-                            point_coords=prompt_points,
-                            point_labels=np.ones(len(prompt_points)),
-                            multimask_output=False
-                        )
-                        # Display the mask overlay
-                        plt.clf()
-                        plt.imshow(self.image)
-                        plt.title(f"Segmentation for '{keyword}'. Press 'Accept' or 'Reset'.")
-                        plt.imshow(masks[0], alpha=0.5, cmap='jet')
-                        plt.plot(np.array(points)[:, 0], np.array(points)[:, 1], 'ro', markersize=8)
-                        
-                        # Reset the main plot label
-                        plt.gca().set_label("main")
-                        
-                        # Create new accept/reset buttons
-                        ax_accept = plt.axes([0.7, 0.05, 0.1, 0.075])
-                        ax_reset = plt.axes([0.81, 0.05, 0.1, 0.075])
-                        
-                        button_accept = Button(ax_accept, 'Accept')
-                        button_reset = Button(ax_reset, 'Reset')
-                        
-                        button_accept.on_clicked(on_accept)
-                        button_reset.on_clicked(on_reset)
-                        
-                        plt.draw()
-                        
-                        # Store the latest mask
-                        nonlocal mask
-                        mask = masks[0]
+            if event.inaxes is main_ax and event.xdata is not None and event.ydata is not None:
+                points.append([int(event.xdata), int(event.ydata)])
+                
+                if self._warmup.done():
+                    predict_and_draw(started)
+                else:
+                    # SAM2 is still loading: show the click, predict once ready
+                    show_points()
+                    status_artist.set_text(f"SAM2 is loading; {len(points)} click(s) queued")
+                    refresh()
+        
+        # Poll the warm-up from the GUI thread and replay queued clicks
+        def flush_queued_clicks():
+            if not self._warmup.done():
+                return
+            warmup_timer.stop()
+            if self._warmup.exception() is not None:
+                print(f"SAM2 failed to load: {self._warmup.exception()}")
+                plt.close(fig)
+                return
+            main_ax.set_title(title)
+            if points:
+                predict_and_draw(time.perf_counter())
+            fig.canvas.draw_idle()
         
-        # Set the label for the main plot area
-        plt.gca().set_label("main")
+        warmup_timer = fig.canvas.new_timer(interval=100)
+        if not self._warmup.done():
+            warmup_timer.add_callback(flush_queued_clicks)
+            warmup_timer.start()
         
         accepted = [False]
         
         def on_accept(event):
             if mask is not None:
-                self.masks[keyword] = mask
+                if self.inference_scale < 1.0:
+                    with stage("mask_upsample", keyword=keyword):
+                        self.masks[keyword] = upsample_mask(mask, self.image)
+                else:
+                    self.masks[keyword] = mask
+                self.prompts[keyword] = {"points": [list(point) for point in points]}
                 accepted[0] = True
-                plt.close()
+                plt.close(fig)
         
         def on_reset(event):
-            nonlocal points, mask
+            nonlocal points, mask, logits
             points = []
             mask = None
-            plt.clf()
-            plt.imshow(self.image)
-            plt.title(f"Click on the image to mark the region for '{keyword}'. Press 'Accept' when done.")
-            plt.gca().set_label("main")  # Reset the main plot label
-            
-            # Create new accept/reset buttons after reset
-            ax_accept = plt.axes([0.7, 0.05, 0.1, 0.075])
-            ax_reset = plt.axes([0.81, 0.05, 0.1, 0.075])
-            
-            button_accept = Button(ax_accept, 'Accept')
-            button_reset = Button(ax_reset, 'Reset')
-            
-            button_accept.on_clicked(on_accept)
-            button_reset.on_clicked(on_reset)
-            
-            plt.draw()
+            logits = None
+            overlay[..., 3] = 0
+            overlay_artist.set_data(overlay)
+            show_points()
+            status_artist.set_text("")
+            refresh()
         
-        # Connect the click event
-        fig = plt.gcf()
-        cid = fig.canvas.mpl_connect('button_press_event', onclick)
+        # Connect the draw and click events
+        fig.canvas.mpl_connect('draw_event', on_draw)
+        fig.canvas.mpl_connect('button_press_event', onclick)
         
-        # Add initial accept and reset buttons
-        ax_accept = plt.axes([0.7, 0.05, 0.1, 0.075])
-        ax_reset = plt.axes([0.81, 0.05, 0.1, 0.075])
+        # Add accept and reset buttons (created once)
+        ax_accept = fig.add_axes([0.7, 0.05, 0.1, 0.075])
+        ax_reset = fig.add_axes([0.81, 0.05, 0.1, 0.075])
         
         button_accept = Button(ax_accept, 'Accept')
         button_reset = Button(ax_reset, 'Reset')
@@ -274,8 +895,13 @@ class Segmenter:
         button_accept.on_clicked(on_accept)
         button_reset.on_clicked(on_reset)
         
-        plt.tight_layout()
         plt.show()
+        warmup_timer.stop()
+        self._check_warmup()
+        
+        if latencies:
+            print(f"Click-to-overlay latency for '{keyword}': "
+                  f"median {np.median(latencies):.0f} ms, max {max(latencies):.0f} ms over {len(latencies)} click(s)")
         
         if accepted[0]:
             # Save the mask
@@ -284,7 +910,7 @@ class Segmenter:
             print(f"Saved mask for '{keyword}' to {mask_path}")
         else:
             print(f"Skipped '{keyword}' - no mask was accepted")
-    
+
     def _generate_combinations(self):
         """Generate all possible combinations of pixelated and non-pixelated masks."""
         print("\nGenerating pixelated combinations...")
@@ -297,47 +923,30 @@ class Segmenter:
         total_combinations = 2**num_masks
         print(f"Generating {total_combinations} combinations...")
         
+        # Composite strip by strip into one RGBX buffer that PIL encodes in
+        # place, unless pixelation source pixels aren't fixed points (see
+        # _composite_tiled), where only the full-image path is exact
+        rows = pixelation_indices(self.height)
+        cols = pixelation_indices(self.width)
+        tiled = bool((rows[rows] == rows).all() and (cols[cols] == cols).all())
+        if tiled:
+            output = np.empty((self.height, self.width, 4), dtype=np.uint8)
+            output[..., 3] = 255
+        
+        # Combinations share settings searched on the first one (see encoding.py)
+        encoder = WebpEncoder(self.encoding_budget)
+        
         for i in range(total_combinations):
             # Convert number to binary to determine which masks to pixelate
             binary = format(i, f'0{num_masks}b')
+            blurred_indices = [j for j, digit in enumerate(binary) if digit == '1']
             
-            # Create a copy of the original image
-            result_image = self.image.copy().astype(np.uint8)  # Ensure uint8 data type
-            
-            # Record which indices are blurred
-            blurred_indices = []
-            
-            # Apply pixelation to selected masks
-            for j, digit in enumerate(binary):
-                if digit == '1':  # Pixelate this mask
-                    keyword = keywords_with_masks[j]
-                    mask = self.masks[keyword].astype(bool)  # Convert to boolean mask for indexing
-                    
-                    # Create PIL Image for pixelation
-                    pil_image = Image.fromarray(result_image)
-                    
-                    # Create a copy of the image for the masked region
-                    masked_region = result_image.copy()
-                    
-                    # Apply pixelation effect (resize down and up to pixelate)
-                    pixelation_factor = 20  # Lower number = more pixelation
-                    small_size = (self.width // pixelation_factor, self.height // pixelation_factor)
-                    
-                    # Create PIL image of masked area only
-                    mask_image = Image.fromarray(np.uint8(mask * 255))  # Convert mask to uint8
-                    
-                    # Create a pixelated version of the entire image
-                    small_img = pil_image.resize(small_size, Image.NEAREST)
-                    pixelated_img = small_img.resize((self.width, self.height), Image.NEAREST)
-                    
-                    # Convert back to numpy arrays
-                    pixelated_array = np.array(pixelated_img)
-                    
-                    # Apply the mask: replace pixels in result_image with pixelated pixels where mask is True
-                    result_image[mask] = pixelated_array[mask]
-                    
-                    # Record that this index was blurred
-                    blurred_indices.append(j)
+            with stage("composite", combination=i, tiled=tiled):
+                if tiled:
+                    self._composite_tiled(blurred_indices, rows, cols, output)
+                    result = Image.frombuffer("RGBX", (self.width, self.height), output, "raw", "RGBX", 0, 1)
+                else:
+                    result = Image.fromarray(self._composite_full(blurred_indices))
             
             # Create filename based on which indices are blurred
             filename_parts = []
@@ -350,22 +959,96 @@ class Segmenter:
             filename = "_".join(filename_parts) + ".webp"
             output_path = self.combinations_dir / filename
             
-            # Ensure result_image is the right type for PIL
-            result_image = np.clip(result_image, 0, 255).astype(np.uint8)
-            
             # Save the result
-            try:
-                Image.fromarray(result_image).save(output_path, format="WEBP", quality=90)
-                print(f"Saved combination: {filename}")
-            except Exception as e:
-                print(f"Error saving {filename}: {e}")
-                # Fallback to PNG if WEBP fails
+            with stage("encode", filename=filename):
                 try:
-                    fallback_path = self.combinations_dir / f"{filename.replace('.webp', '.png')}"
-                    Image.fromarray(result_image).save(fallback_path, format="PNG")
-                    print(f"Saved as PNG instead: {fallback_path.name}")
-                except Exception as e2:
-                    print(f"Failed to save image: {e2}")
+                    quality, method = encoder.save(result, output_path)
+                    print(f"Saved combination: {filename} (quality {quality}, method {method})")
+                    saved = True
+                except Exception as e:
+                    saved = False
+                    print(f"Error saving {filename}: {e}")
+                    # Fallback to PNG if WEBP fails
+                    try:
+                        fallback_path = self.combinations_dir / f"{filename.replace('.webp', '.png')}"
+                        result.convert("RGB").save(fallback_path, format="PNG")
+                        print(f"Saved as PNG instead: {fallback_path.name}")
+                    except Exception as e2:
+                        print(f"Failed to save image: {e2}")
+            if saved and self.on_output:
+                self.on_output(filename, str(output_path.absolute()))
+            
+            # Smaller renditions and the placeholder are downscaled from the
+            # composite just encoded, not composited again
+            if saved:
+                with stage("renditions", filename=filename, widths=list(self.rendition_widths)):
+                    save_renditions(result, output_path, self.rendition_widths, self.on_output, encoder)
+        
+        encoder.report()
+    
+    def _composite_tiled(self, blurred_indices, rows, cols, output):
+        """Composite one combination into output, strip by strip.
+        
+        Pixelation copies pixel (y, x) from pixel (rows[y], cols[x]). When
+        those source pixels map to themselves, pixelating one mask never
+        changes what a later mask samples, so the result is simply the
+        original with original[rows][:, cols] wherever any blurred mask is
+        set: the same pixels _composite_full produces, without its full-size
+        copies. Strips end on pixelation block boundaries, so each one only
+        reads its own rows.
+        
+        Args:
+            blurred_indices: Indices of the masks to pixelate
+            rows: pixelation_indices for the image height
+            cols: pixelation_indices for the image width
+            output: (height, width, 4) RGBX buffer to write into
+        """
+        keywords = list(self.masks.keys())
+        block_starts = np.flatnonzero(np.diff(rows)) + 1
+        y0 = 0
+        while y0 < self.height:
+            later = block_starts[block_starts >= y0 + COMPOSITE_STRIP_ROWS]
+            y1 = int(later[0]) if len(later) else self.height
+            
+            strip = output[y0:y1, :, :3]
+            strip[...] = self.image[y0:y1]
+            if blurred_indices:
+                mask = np.zeros((y1 - y0, self.width), dtype=bool)
+                for j in blurred_indices:
+                    mask |= self.masks[keywords[j]][y0:y1].astype(bool)
+                pixelated = self.image[rows[y0:y1]][:, cols]
+                strip[mask] = pixelated[mask]
+            y0 = y1
+    
+    def _composite_full(self, blurred_indices):
+        """Composite one combination by pixelating the whole image once per mask."""
+        keywords_with_masks = list(self.masks.keys())
+        
+        # Create a copy of the original image
+        result_image = self.image.copy().astype(np.uint8)  # Ensure uint8 data type
+        
+        # Apply pixelation to selected masks
+        for j in blurred_indices:
+            keyword = keywords_with_masks[j]
+            mask = self.masks[keyword].astype(bool)  # Convert to boolean mask for indexing
+            
+            # Create PIL Image for pixelation
+            pil_image = Image.fromarray(result_image)
+            
+            # Apply pixelation effect (resize down and up to pixelate)
+            small_size = (self.width // PIXELATION_FACTOR, self.height // PIXELATION_FACTOR)
+            
+            # Create a pixelated version of the entire image
+            small_img = pil_image.resize(small_size, Image.NEAREST)
+            pixelated_img = small_img.resize((self.width, self.height), Image.NEAREST)
+            
+            # Convert back to numpy arrays
+            pixelated_array = np.array(pixelated_img)
+            
+            # Apply the mask: replace pixels in result_image with pixelated pixels where mask is True
+            result_image[mask] = pixelated_array[mask]
+        
+        return result_image
     
     def _save_metadata(self):
         """Save metadata linking keywords to mask indices."""
@@ -386,8 +1069,25 @@ class Segmenter:
             json.dump(mask_keywords, f, indent=2)
         
         print(f"Saved keyword mapping to {keywords_path}")
+        
+        # The accepted prompts, in the format evaluate_segmenter.py and
+        # process_images read
+        if self.prompts:
+            prompts = [
+                {"image": str(self.image_path.absolute()), "keyword": keyword, **prompt}
+                for keyword, prompt in self.prompts.items()
+            ]
+            prompts_path = self.output_dir / "prompts.json"
+            with open(prompts_path, "w") as f:
+                json.dump(prompts, f, indent=2)
+            print(f"Saved prompts to {prompts_path}")
 
-def process_image(image_path: str, keywords: list[str], output_dir: str = "masked_images", combinations_dir: str = "blurry_combinations") -> dict[str, str]:
+def process_image(image_path: str, keywords: list[str], output_dir: str = "masked_images", combinations_dir: str = "blurry_combinations",
+                  on_output=None, model: str = DEFAULT_SAM2_MODEL, quantize: bool = False,
+                  threads: int | None = None, inference_size: int | None = None,
+                  prompts: dict[str, dict] | None = None,
+                  rendition_widths: tuple[int, ...] = RENDITION_WIDTHS,
+                  encoding_budget: EncodingBudget | None = None) -> dict[str, str]:
     """
     Process an image with the given keywords and return a mapping of combination filenames to their paths.
     
@@ -396,16 +1096,33 @@ def process_image(image_path: str, keywords: list[str], output_dir: str = "maske
         keywords: List of keywords for segmentation
         output_dir: Directory to save masks
         combinations_dir: Directory to save combinations
+        on_output: Optional callback called with (filename, path) as soon as
+            each combination is written, e.g. to start its upload
+        model: SAM2 model tier, one of SAM2_MODELS
+        quantize: Use dynamic int8 quantization on CPU
+        threads: Number of torch CPU threads, or None for the default
+        inference_size: Longest side SAM2 sees, or None for full resolution
+        prompts: Optional recorded prompts per keyword; those keywords are
+            segmented without user interaction (see Segmenter.segment_prompts)
+        rendition_widths: Widths of the smaller renditions of each combination
+        encoding_budget: Quality or size each WEBP must meet, or None for
+            EncodingBudget's defaults
         
     Returns:
-        Dictionary mapping combination filenames to their file paths
+        Dictionary mapping combination, rendition and placeholder filenames
+        to their file paths
     """
     try:
         # Initialize segmenter
-        segmenter = Segmenter(image_path, keywords, output_dir, combinations_dir)
+        segmenter = Segmenter(image_path, keywords, output_dir, combinations_dir,
+                              model=model, quantize=quantize, threads=threads,
+                              inference_size=inference_size)
+        segmenter.on_output = on_output
+        segmenter.rendition_widths = rendition_widths
+        segmenter.encoding_budget = encoding_budget or EncodingBudget()
         
         # Process the image
-        segmenter.segment_image()
+        segmenter.segment_image(prompts)
         
         # Create a mapping of combination filenames to their paths
         combinations_path = Path(combinations_dir)
@@ -421,8 +1138,153 @@ def process_image(image_path: str, keywords: list[str], output_dir: str = "maske
         print(f"Error processing image: {e}")
         return {}
 
+def generate_image_combinations(image_path: str, keywords: list[str], output_dir: str = "masked_images",
+                                combinations_dir: str = "blurry_combinations", on_output=None,
+                                rendition_widths: tuple[int, ...] = RENDITION_WIDTHS,
+                                encoding_budget: EncodingBudget | None = None) -> dict[str, str]:
+    """
+    Generate the pixelated combinations of an image from masks saved earlier.
+    
+    The masks are the {keyword}_mask.npy files Segmenter writes, so
+    segmentation and combination encoding can run as separate steps.
+    
+    Args:
+        image_path: Path to the image file
+        keywords: Keywords in combination order; each needs a saved mask
+        output_dir: Directory the masks were saved to
+        combinations_dir: Directory to save combinations
+        on_output: Optional callback called with (filename, path) as soon as
+            each combination is written
+        rendition_widths: Widths of the smaller renditions of each combination
+        encoding_budget: Quality or size each WEBP must meet, or None for
+            EncodingBudget's defaults
+        
+    Returns:
+        Dictionary mapping combination, rendition and placeholder filenames
+        to their file paths
+    """
+    with stage("image_decode"):
+        image = cv2.imread(str(image_path))
+        if image is None:
+            raise ValueError(f"Could not load image from {image_path}")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    masks = {keyword: np.load(Path(output_dir) / f"{keyword}_mask.npy") for keyword in keywords}
+    
+    segmenter = Segmenter.from_masks(image, masks, output_dir, combinations_dir)
+    segmenter.image_path = Path(image_path)
+    segmenter.on_output = on_output
+    segmenter.rendition_widths = rendition_widths
+    segmenter.encoding_budget = encoding_budget or EncodingBudget()
+    with stage("combinations", masks=len(masks)):
+        segmenter._generate_combinations()
+    segmenter._save_metadata()
+    return {
+        file_path.name: str(file_path.absolute())
+        for file_path in segmenter.combinations_dir.glob("*.webp")
+    }
+
+def process_images(prompts: list[dict], output_dir: str = "masked_images", combinations_dir: str = "blurry_combinations",
+                   batch_size: int = 4, on_output=None, model: str = DEFAULT_SAM2_MODEL, quantize: bool = False,
+                   threads: int | None = None, inference_size: int | None = None,
+                   rendition_widths: tuple[int, ...] = RENDITION_WIDTHS,
+                   encoding_budget: EncodingBudget | None = None) -> dict[str, dict[str, str]]:
+    """
+    Segment many images headless from recorded prompts.
+    
+    SAM2 is loaded once. Images are embedded batch_size at a time with
+    set_image_batch, and every keyword of an image is decoded in a single
+    batched call, so throughput grows with the batch size rather than the
+    number of keywords. Each image's masks and combinations are written to
+    a subdirectory named after the image.
+    
+    Args:
+        prompts: List of {"image", "keyword", "points", "labels", "box"}
+            prompts, as in prompts.json (see prompt_arrays)
+        output_dir: Directory to save masks
+        combinations_dir: Directory to save combinations
+        batch_size: Number of images embedded together
+        on_output: Optional callback called with (filename, path) as soon as
+            each combination is written
+        model: SAM2 model tier, one of SAM2_MODELS
+        quantize: Use dynamic int8 quantization on CPU
+        threads: Number of torch CPU threads, or None for the default
+        inference_size: Longest side SAM2 sees, or None for full resolution
+        rendition_widths: Widths of the smaller renditions of each combination
+        encoding_budget: Quality or size each WEBP must meet, or None for
+            EncodingBudget's defaults
+        
+    Returns:
+        Dictionary mapping each image path to its pixelation map
+    """
+    by_image = {}
+    for prompt in prompts:
+        by_image.setdefault(prompt["image"], {})[prompt["keyword"]] = prompt
+    
+    predictor = load_image_predictor(model, quantize, threads)
+    image_paths = list(by_image)
+    results = {}
+    for start in range(0, len(image_paths), batch_size):
+        batch = image_paths[start:start + batch_size]
+        images, scales, arrays = [], [], []
+        for image_path in batch:
+            with stage("image_decode"):
+                image = cv2.imread(str(image_path))
+                if image is None:
+                    raise ValueError(f"Could not load image from {image_path}")
+                images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            scales.append(inference_scale(*images[-1].shape[:2], inference_size))
+            arrays.append(prompt_arrays(list(by_image[image_path].values()), scales[-1]))
+        
+        with stage("sam2_set_image_batch", model=model, images=len(batch)):
+            predictor.set_image_batch([resize_for_inference(image, inference_size) for image in images])
+        with stage("predict_prompts", images=len(batch), keywords=sum(len(by_image[p]) for p in batch)):
+            masks_batch, _, _ = predictor.predict_batch(
+                point_coords_batch=[a[0] for a in arrays],
+                point_labels_batch=[a[1] for a in arrays],
+                box_batch=[a[2] for a in arrays],
+                multimask_output=False
+            )
+        
+        for image_path, image, scale, masks in zip(batch, images, scales, masks_batch):
+            image_prompts = by_image[image_path]
+            masks = masks.reshape(len(image_prompts), *masks.shape[-2:])
+            name = Path(image_path).stem
+            image_masks = {}
+            for keyword, mask in zip(image_prompts, masks):
+                if scale < 1.0:
+                    with stage("mask_upsample", keyword=keyword):
+                        mask = upsample_mask(mask, image)
+                image_masks[keyword] = mask
+            
+            segmenter = Segmenter.from_masks(image, image_masks, Path(output_dir) / name, Path(combinations_dir) / name)
+            segmenter.image_path = Path(image_path)
+            segmenter.prompts = {
+                keyword: {k: v for k, v in prompt.items() if k not in ("image", "keyword")}
+                for keyword, prompt in image_prompts.items()
+            }
+            segmenter.on_output = on_output
+            segmenter.rendition_widths = rendition_widths
+            segmenter.encoding_budget = encoding_budget or EncodingBudget()
+            for keyword, mask in image_masks.items():
+                np.save(segmenter.output_dir / f"{keyword}_mask.npy", mask)
+            with stage("combinations", masks=len(image_masks)):
+                segmenter._generate_combinations()
+            segmenter._save_metadata()
+            
+            results[image_path] = {
+                file_path.name: str(file_path.absolute())
+                for file_path in segmenter.combinations_dir.glob("*.webp")
+            }
+        print(f"Segmented {len(results)}/{len(image_paths)} image(s)")
+    return results
+
 class VideoSegmenter:
-    def __init__(self, video_path, keywords, output_dir="masked_images", combinations_dir="blurry_combinations", frames_dir="video_frames"):
+    # Called with (filename, path) as soon as each combination is saved
+    on_output = None
+
+    def __init__(self, video_path, keywords, output_dir="masked_images", combinations_dir="blurry_combinations", frames_dir="video_frames",
+                 model=DEFAULT_SAM2_MODEL, quantize=False, threads=None, window=None, window_overlap=VIDEO_WINDOW_OVERLAP,
+                 keyframe_stride=1, min_confidence=KEYFRAME_MIN_CONFIDENCE, inference_size=None, workers=None):
         """
         Initialize the video segmenter with a video and keywords.
         
@@ -432,79 +1294,379 @@ class VideoSegmenter:
             output_dir: Directory to save masks
             combinations_dir: Directory to save pixelation combinations
             frames_dir: Directory to save extracted frames
+            model: SAM2 model tier, one of SAM2_MODELS
+            quantize: Use dynamic int8 quantization on CPU
+            threads: Number of torch CPU threads, or None for the default
+            window: Propagate masks over windows of this many frames so memory
+                is bounded by the window rather than the clip length (see
+                _propagate_windowed), or None to propagate the whole clip at once
+            window_overlap: Frames shared by consecutive windows
+            keyframe_stride: Run SAM2 only on every keyframe_stride-th frame
+                and fill the frames in between with optical flow (see
+                _interpolate_keyframes); 1 runs SAM2 on every frame
+            min_confidence: Forward/backward warp agreement (IoU) below which
+                SAM2 is rerun on the frames between two keyframes
+            inference_size: Give SAM2 copies of the frames downscaled so their
+                longest side is at most this many pixels; clicks stay in
+                original coordinates and masks are upsampled with
+                upsample_mask. None runs SAM2 on the full-resolution frames.
+            workers: Number of compositor threads building combinations, or
+                None for one per CPU core
         """
+        if keyframe_stride < 1:
+            raise ValueError(f"keyframe_stride must be at least 1, got {keyframe_stride}")
+        if window is not None and not 0 < window_overlap < window:
+            raise ValueError(f"window_overlap must be between 1 and window - 1, got {window_overlap}")
         self.video_path = Path(video_path)
         self.keywords = keywords
         self.output_dir = Path(output_dir)
         self.combinations_dir = Path(combinations_dir)
         self.frames_dir = Path(frames_dir)
+        self.model = model
+        self.quantize = quantize
+        self.threads = threads
+        self.window = window
+        self.window_overlap = window_overlap
+        self.keyframe_stride = keyframe_stride
+        self.min_confidence = min_confidence
+        self.inference_size = inference_size
+        self.workers = workers
         
         # Create output directories
         self.output_dir.mkdir(exist_ok=True, parents=True)
         self.combinations_dir.mkdir(exist_ok=True, parents=True)
         self.frames_dir.mkdir(exist_ok=True, parents=True)
         
-        # Extract frames from video
-        print("Extracting video frames...")
-        self.frame_files = extract_frames(video_path, str(self.frames_dir))
-        if not self.frame_files:
-            raise ValueError(f"No frames extracted from video {video_path}")
-        
-        # Get video dimensions from first frame
-        first_frame = cv2.imread(str(self.frames_dir / self.frame_files[0]))
+        # Decode just the first frame (shown for clicking) and the video properties
+        with stage("image_decode"):
+            cap = cv2.VideoCapture(str(video_path))
+            ret, first_frame = cap.read()
+            self.fps = cap.get(cv2.CAP_PROP_FPS)
+            cap.release()
+        if not ret:
+            raise ValueError(f"Could not read video file {video_path}")
+        self.first_frame = cv2.cvtColor(first_frame, cv2.COLOR_BGR2RGB)
         self.height, self.width = first_frame.shape[:2]
         
-        # Initialize SAM2 model for video
-        print("Loading SAM2 model...")
-        sam2_checkpoint = "checkpoints/sam2.1_hiera_large.pt"
-        model_cfg = "configs/sam2.1/sam2.1_hiera_l.yaml"
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.predictor = build_sam2_video_predictor(model_cfg, sam2_checkpoint, device=self.device)
-        
-        # Initialize inference state
-        print("Initializing video inference state...")
-        self.inference_state = self.predictor.init_state(video_path=str(self.frames_dir))
+        # SAM2 reads its own downscaled copy of the frames if they are large
+        self.inference_scale = inference_scale(self.height, self.width, inference_size)
+        self.sam2_frames_dir = self.frames_dir / "sam2" if self.inference_scale < 1.0 else self.frames_dir
         
         # Dictionary to store masks for each keyword
         self.masks = {}
         self.video_segments = {}
         
-        print(f"Loaded video: {self.video_path} with {len(self.frame_files)} frames")
-        print(f"Using device: {self.device}")
+        # Extract frames, load SAM2 and build the inference state in the
+        # background so the UI can open right away; clicks made meanwhile
+        # are queued (see _process_keyword)
+        self._warmup = start_background("sam2-warmup", self._load_predictor)
+        print(f"Loaded video: {self.video_path}")
+    
+    def _load_predictor(self):
+        """Extract the frames, build the SAM2 video predictor and its inference state."""
+        print("Extracting video frames...")
+        with stage("extract_frames") as fields:
+            if self.inference_scale < 1.0:
+                self.frame_files = extract_frames(self.video_path, str(self.frames_dir),
+                                                  str(self.sam2_frames_dir), self.inference_size)
+            else:
+                self.frame_files = extract_frames(self.video_path, str(self.frames_dir))
+            fields["frames"] = len(self.frame_files)
+        if not self.frame_files:
+            raise ValueError(f"No frames extracted from video {self.video_path}")
+        self.keyframes = keyframe_indices(len(self.frame_files), self.keyframe_stride)
+        
+        # Initialize SAM2 model for video
+        print(f"Loading SAM2 model ({self.model}{', int8' if self.quantize else ''})...")
+        with stage("import_sam2"):
+            from sam2.build_sam import build_sam2_video_predictor
+        predictor, self.device = build_sam2_model(
+            build_sam2_video_predictor, self.model, self.quantize, self.threads
+        )
+        
+        # Initialize inference state (only over the first window of keyframes
+        # if propagation is deferred; that is where the clicks are made)
+        print("Initializing video inference state...")
+        with stage("sam2_init_state", window=self.window, keyframe_stride=self.keyframe_stride):
+            if self.deferred_propagation:
+                window_dir = self._window_dir(self.keyframes[:self.window or len(self.keyframes)])
+                inference_state = predictor.init_state(
+                    video_path=str(window_dir), offload_video_to_cpu=True, offload_state_to_cpu=True
+                )
+            else:
+                inference_state = predictor.init_state(video_path=str(self.sam2_frames_dir))
+        
+        print(f"SAM2 ready on {self.device} with {len(self.frame_files)} frames")
+        return predictor, inference_state
+    
+    @property
+    def predictor(self):
+        """The SAM2 video predictor, waiting for the background warm-up if needed."""
+        return self._warmup.result()[0]
+    
+    @property
+    def inference_state(self):
+        """The SAM2 inference state, waiting for the background warm-up if needed."""
+        return self._warmup.result()[1]
+    
+    def _check_warmup(self):
+        """Re-raise a failed background warm-up on the calling thread."""
+        if self._warmup.done() and self._warmup.exception() is not None:
+            raise self._warmup.exception()
+    
+    @property
+    def deferred_propagation(self):
+        """Whether masks are propagated for all keywords after the last one is accepted."""
+        return bool(self.window) or self.keyframe_stride > 1
+    
+    def _window_dir(self, frames, name=None):
+        """Link the given frames into their own directory, numbered from 0."""
+        window_dir = self.frames_dir / "windows" / (name or f"{frames[0]:05d}")
+        window_dir.mkdir(exist_ok=True, parents=True)
+        for local_idx, frame_idx in enumerate(frames):
+            link = window_dir / f"{local_idx:05d}.jpg"
+            if link.exists():
+                continue
+            try:
+                os.link(self.sam2_frames_dir / self.frame_files[frame_idx], link)
+            except OSError:
+                shutil.copyfile(self.sam2_frames_dir / self.frame_files[frame_idx], link)
+        return window_dir
+    
+    def _propagate_state(self, state, frames, seeds, store, obj_ids):
+        """Run SAM2 over one inference state and store the masks it predicts.
+        
+        Args:
+            state: Inference state over exactly the given frames; it is freed
+            frames: Global indices of the state's frames, in order
+            seeds: Frames whose stored masks are added as conditioning frames
+                first; they are not overwritten
+            store: MaskStore to read the seeds from and write the masks to
+            obj_ids: Dictionary mapping keywords to object IDs
+        """
+        predictor = self.predictor
+        for frame_idx in seeds:
+            seeded = store[frame_idx]
+            for obj_id in obj_ids.values():
+                predictor.add_new_mask(state, frame_idx=frames.index(frame_idx), obj_id=obj_id, mask=seeded[obj_id])
+        
+        for local_idx, out_obj_ids, out_mask_logits in predictor.propagate_in_video(state):
+            if frames[local_idx] in seeds:
+                continue
+            store.save(frames[local_idx], {
+                out_obj_id: self._full_mask(np.squeeze((out_mask_logits[i] > 0.0).cpu().numpy()), frames[local_idx])
+                for i, out_obj_id in enumerate(out_obj_ids)
+                if out_obj_id in obj_ids.values()
+            })
+        
+        # Free the frames and features
+        predictor.reset_state(state)
+        state.clear()
+    
+    def _full_mask(self, mask, frame_idx):
+        """Bring a mask predicted at the inference resolution up to the frame's size."""
+        if mask.shape == (self.height, self.width):
+            return mask
+        guide = cv2.imread(str(self.frames_dir / self.frame_files[frame_idx]), cv2.IMREAD_GRAYSCALE)
+        return upsample_mask(mask, guide)
+    
+    def _propagate_windowed(self, frames, store, obj_ids):
+        """Propagate every accepted mask through the given frames in overlapping windows.
+        
+        The first window reuses the interactive inference state. Each later
+        window gets a fresh state over just its frames, with the previous
+        window's masks on the overlapping frames added as conditioning
+        frames, so every object carries across the boundary. Masks are
+        written to a MaskStore on disk, and each window's state is freed
+        before the next is built, so peak memory depends on the window size
+        rather than the clip length.
+        
+        Args:
+            frames: Global indices of the frames to run SAM2 on, starting with
+                the clicked frame 0
+            store: MaskStore to write the masks to
+            obj_ids: Dictionary mapping keywords to object IDs
+        """
+        window = self.window or len(frames)
+        state = self.inference_state
+        start = 0
+        while True:
+            end = min(start + window, len(frames))
+            window_frames = frames[start:end]
+            with stage("propagate_window", start=window_frames[0], frames=len(window_frames), objects=len(obj_ids)):
+                if start > 0:
+                    state = self.predictor.init_state(
+                        video_path=str(self._window_dir(window_frames)),
+                        offload_video_to_cpu=True, offload_state_to_cpu=True
+                    )
+                seeds = window_frames[:self.window_overlap] if start > 0 else []
+                self._propagate_state(state, window_frames, seeds, store, obj_ids)
+                shutil.rmtree(self.frames_dir / "windows" / f"{window_frames[0]:05d}", ignore_errors=True)
+            
+            print(f"Propagated masks through frames {window_frames[0]}-{window_frames[-1]} "
+                  f"({len(window_frames)} frames) of {len(self.frame_files)}")
+            if end == len(frames):
+                break
+            start = end - self.window_overlap
+    
+    def _interpolate_keyframes(self, store, obj_ids):
+        """Fill the frames between keyframes with flow-warped masks.
+        
+        Each gap is interpolated from the masks on the keyframes either side
+        (see interpolate_masks). If any frame's confidence is below
+        min_confidence, SAM2 is rerun on the whole gap, seeded with both
+        keyframes' masks. A report of every frame's confidence and the
+        gaps that were rerun is saved as propagation.json.
+        
+        Args:
+            store: MaskStore holding the keyframe masks; filled in place
+            obj_ids: Dictionary mapping keywords to object IDs
+        """
+        report = {"keyframe_stride": self.keyframe_stride, "min_confidence": self.min_confidence,
+                  "confidence": {}, "sam2_reruns": []}
+        for start, end in zip(self.keyframes, self.keyframes[1:]):
+            if end - start < 2:
+                continue
+            with stage("interpolate", start=start, frames=end - start - 1) as fields:
+                gray_frames = [
+                    cv2.imread(str(self.frames_dir / self.frame_files[frame_idx]), cv2.IMREAD_GRAYSCALE)
+                    for frame_idx in range(start, end + 1)
+                ]
+                masks, confidences = interpolate_masks(gray_frames, store[start], store[end])
+                lowest = min(min(frame.values()) for frame in confidences)
+                fields["confidence"] = lowest
+                fields["rerun"] = lowest < self.min_confidence
+                
+                if fields["rerun"]:
+                    gap = list(range(start, end + 1))
+                    state = self.predictor.init_state(
+                        video_path=str(self._window_dir(gap, f"gap_{start:05d}")),
+                        offload_video_to_cpu=True, offload_state_to_cpu=True
+                    )
+                    self._propagate_state(state, gap, [start, end], store, obj_ids)
+                    shutil.rmtree(self.frames_dir / "windows" / f"gap_{start:05d}", ignore_errors=True)
+                    report["sam2_reruns"].append([start, end])
+                    print(f"Frames {start}-{end}: flow confidence {lowest:.2f}, reran SAM2")
+                else:
+                    for frame_idx, frame_masks in enumerate(masks, start=start + 1):
+                        store.save(frame_idx, frame_masks)
+            
+            for frame_idx, frame in enumerate(confidences, start=start + 1):
+                report["confidence"][frame_idx] = {
+                    keyword: frame[obj_id] for keyword, obj_id in obj_ids.items()
+                }
         
-        # Get video properties
-        cap = cv2.VideoCapture(str(video_path))
-        self.fps = cap.get(cv2.CAP_PROP_FPS)
-        cap.release()
+        report_path = self.output_dir / "propagation.json"
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Interpolated {len(report['confidence'])} frames, reran SAM2 on "
+              f"{len(report['sam2_reruns'])} gaps; saved report to {report_path}")
     
+    def _propagate_deferred(self):
+        """Propagate all accepted masks once the last keyword is accepted.
+        
+        SAM2 runs on the keyframes (every frame with a stride of 1), in
+        windows if a window size is set, and the frames in between are
+        interpolated. The masks are kept on disk in a MaskStore.
+        """
+        obj_ids = {keyword: obj_id for obj_id, keyword in enumerate(self.masks, start=1)}
+        if not obj_ids:
+            return
+        store = MaskStore(self.output_dir / "video_masks", self.height, self.width)
+        self._propagate_windowed(self.keyframes, store, obj_ids)
+        if self.keyframe_stride > 1:
+            self._interpolate_keyframes(store, obj_ids)
+        for keyword in obj_ids:
+            self.video_segments[keyword] = store
+
+    @classmethod
+    def from_masks(cls, frames_dir, video_segments, fps=30.0, output_dir="masked_images",
+                   combinations_dir="blurry_combinations"):
+        """
+        Create a video segmenter from extracted frames and already propagated masks.
+
+        Skips SAM2 and the interactive step entirely, so combinations can be
+        regenerated from saved masks (or benchmarked on synthetic ones).
+
+        Args:
+            frames_dir: Directory of extracted JPEG frames (as written by extract_frames)
+            video_segments: Dictionary mapping keywords to {frame_idx: boolean mask}
+            fps: Frames per second for the output videos
+            output_dir: Directory to save masks
+            combinations_dir: Directory to save pixelation combinations
+        """
+        segmenter = cls.__new__(cls)
+        segmenter.video_path = None
+        segmenter.keywords = list(video_segments.keys())
+        segmenter.output_dir = Path(output_dir)
+        segmenter.combinations_dir = Path(combinations_dir)
+        segmenter.frames_dir = Path(frames_dir)
+        segmenter.output_dir.mkdir(exist_ok=True, parents=True)
+        segmenter.combinations_dir.mkdir(exist_ok=True, parents=True)
+
+        segmenter.frame_files = sorted(p.name for p in segmenter.frames_dir.glob("*.jpg"))
+        if not segmenter.frame_files:
+            raise ValueError(f"No frames found in {frames_dir}")
+        first_frame = cv2.imread(str(segmenter.frames_dir / segmenter.frame_files[0]))
+        segmenter.height, segmenter.width = first_frame.shape[:2]
+        segmenter.fps = fps
+        segmenter.window = None
+        segmenter.keyframe_stride = 1
+        segmenter.inference_scale = 1.0
+        segmenter.sam2_frames_dir = segmenter.frames_dir
+        segmenter.workers = None
+
+        # Object IDs start from 1, in keyword order
+        segmenter.masks = {}
+        segmenter.video_segments = {}
+        for obj_id, (keyword, frames) in enumerate(video_segments.items(), start=1):
+            segmenter.masks[keyword] = frames[min(frames)]
+            segmenter.video_segments[keyword] = {
+                frame_idx: {obj_id: mask} for frame_idx, mask in frames.items()
+            }
+        return segmenter
+
     def segment_video(self):
         """Process each keyword and create masks through user interaction."""
-        # Reset state before processing
-        self.predictor.reset_state(self.inference_state)
+        # Reset state before processing (a state still being built is fresh)
+        if self._warmup.done():
+            self.predictor.reset_state(self.inference_state)
         
         for keyword in self.keywords:
-            self._process_keyword(keyword)
+            with stage("keyword", keyword=keyword, interactive=True):
+                self._process_keyword(keyword)
+        
+        # Compositing needs the extracted frames
+        self._warmup.result()
+        
+        if self.deferred_propagation:
+            with stage("propagate", masks=len(self.masks), window=self.window,
+                       keyframe_stride=self.keyframe_stride):
+                self._propagate_deferred()
         
         # Generate pixelated combinations for each frame
-        self._generate_combinations()
+        with stage("combinations", masks=len(self.masks)):
+            self._generate_combinations()
         
         # Save metadata
         self._save_metadata()
     
     def _process_keyword(self, keyword):
         """Process a single keyword through user interaction."""
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Button
+
         print(f"\nProcessing keyword: {keyword}")
         
         # Always start with the first frame for consistency
         frame_idx = 0
-        frame_path = str(self.frames_dir / self.frame_files[frame_idx])
-        frame = cv2.imread(frame_path)
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = self.first_frame
         
         # Set up the interactive plot
-        plt.figure(figsize=(10, 8))
+        title = f"Click on the frame to mark the region for '{keyword}'. Press 'Accept' when done."
+        fig = plt.figure(figsize=(10, 8))
         plt.imshow(frame)
-        plt.title(f"Click on the frame to mark the region for '{keyword}'. Press 'Accept' when done.")
+        plt.title(title if self._warmup.done() else f"{title}\n(SAM2 is loading; clicks are queued)")
         
         points = []
         masks = None
@@ -534,57 +1696,88 @@ class VideoSegmenter:
         # Show existing masks initially
         show_existing_masks()
         
+        def predict_and_draw():
+            # Convert points to numpy array
+            prompt_points = np.array(points, dtype=np.float32) * self.inference_scale
+            prompt_labels = np.ones(len(points), dtype=np.int32)
+            
+            # Get object ID based on keyword index
+            obj_id = len(self.masks) + 1
+            
+            # Add points and get prediction
+            _, obj_ids, mask_logits = self.predictor.add_new_points_or_box(
+                inference_state=self.inference_state,
+                frame_idx=frame_idx,
+                obj_id=obj_id,
+                points=prompt_points,
+                labels=prompt_labels
+            )
+            
+            # Get binary mask and squeeze extra dimensions
+            binary_mask = (mask_logits[0] > 0.0).cpu().numpy()
+            binary_mask = np.squeeze(binary_mask)  # Remove singleton dimensions
+            if binary_mask.shape != frame.shape[:2]:
+                # Predicted at the inference resolution; nearest is enough to show it
+                binary_mask = cv2.resize(binary_mask.astype(np.uint8), (frame.shape[1], frame.shape[0]),
+                                         interpolation=cv2.INTER_NEAREST)
+            
+            # Display the mask overlay - clear first to avoid overlay issues
+            plt.clf()
+            plt.imshow(frame)
+            plt.title(f"Segmentation for '{keyword}'. Press 'Accept' or 'Reset'.")
+            
+            # Show existing masks first
+            show_existing_masks()
+            
+            # Show current mask with a distinct color
+            plt.imshow(binary_mask, alpha=0.6, cmap='jet')
+            plt.plot(np.array(points)[:, 0], np.array(points)[:, 1], 'ro', markersize=8)
+            
+            # Add a legend for current mask
+            plt.text(10, frame.shape[0] - 20, f"Current: {keyword}", 
+                     color='yellow', fontsize=10, 
+                     bbox=dict(facecolor='black', alpha=0.7))
+            
+            plt.draw()
+            
+            # Store the latest mask
+            nonlocal masks
+            masks = mask_logits
+        
         # Function to handle mouse clicks
         def onclick(event):
             if event.xdata is not None and event.ydata is not None:
                 x, y = int(event.xdata), int(event.ydata)
                 points.append([x, y])
-                plt.plot(x, y, 'ro', markersize=8)
-                plt.draw()
                 
-                if len(points) > 0:
-                    # Convert points to numpy array
-                    prompt_points = np.array(points, dtype=np.float32)
-                    prompt_labels = np.ones(len(points), dtype=np.int32)
-                    
-                    # Get object ID based on keyword index
-                    obj_id = len(self.masks) + 1
-                    
-                    # Add points and get prediction
-                    _, obj_ids, mask_logits = self.predictor.add_new_points_or_box(
-                        inference_state=self.inference_state,
-                        frame_idx=frame_idx,
-                        obj_id=obj_id,
-                        points=prompt_points,
-                        labels=prompt_labels
-                    )
-                    
-                    # Get binary mask and squeeze extra dimensions
-                    binary_mask = (mask_logits[0] > 0.0).cpu().numpy()
-                    binary_mask = np.squeeze(binary_mask)  # Remove singleton dimensions
-                    
-                    # Display the mask overlay - clear first to avoid overlay issues
-                    plt.clf()
-                    plt.imshow(frame)
-                    plt.title(f"Segmentation for '{keyword}'. Press 'Accept' or 'Reset'.")
-                    
-                    # Show existing masks first
-                    show_existing_masks()
-                    
-                    # Show current mask with a distinct color
-                    plt.imshow(binary_mask, alpha=0.6, cmap='jet')
-                    plt.plot(np.array(points)[:, 0], np.array(points)[:, 1], 'ro', markersize=8)
-                    
-                    # Add a legend for current mask
-                    plt.text(10, frame.shape[0] - 20, f"Current: {keyword}", 
-                             color='yellow', fontsize=10, 
-                             bbox=dict(facecolor='black', alpha=0.7))
-                    
+                if self._warmup.done():
+                    plt.plot(x, y, 'ro', markersize=8)
                     plt.draw()
-                    
-                    # Store the latest mask
-                    nonlocal masks
-                    masks = mask_logits
+                    predict_and_draw()
+                else:
+                    # SAM2 is still loading: show the click, predict once ready
+                    event.inaxes.plot(x, y, 'ro', markersize=8)
+                    event.inaxes.set_title(f"SAM2 is loading; {len(points)} click(s) queued for '{keyword}'")
+                    fig.canvas.draw_idle()
+        
+        # Poll the warm-up from the GUI thread and replay queued clicks
+        def flush_queued_clicks():
+            if not self._warmup.done():
+                return
+            warmup_timer.stop()
+            if self._warmup.exception() is not None:
+                print(f"SAM2 failed to load: {self._warmup.exception()}")
+                plt.close(fig)
+            elif points:
+                predict_and_draw()
+            else:
+                fig.axes[0].set_title(title)
+                fig.canvas.draw_idle()
+        
+        warmup_timer = fig.canvas.new_timer(interval=100)
+        if not self._warmup.done():
+            warmup_timer.add_callback(flush_queued_clicks)
+            warmup_timer.start()
         
         # Connect the click event
         cid = plt.gcf().canvas.mpl_connect('button_press_event', onclick)
@@ -601,7 +1794,7 @@ class VideoSegmenter:
         def on_accept(event):
             if masks is not None:
                 # Store reference mask - make sure to squeeze extra dimensions
-                self.masks[keyword] = np.squeeze((masks[0] > 0.0).cpu().numpy())
+                self.masks[keyword] = upsample_mask(np.squeeze((masks[0] > 0.0).cpu().numpy()), frame)
                 accepted[0] = True
                 plt.close()
         
@@ -621,16 +1814,24 @@ class VideoSegmenter:
         
         plt.tight_layout()
         plt.show()
-        
-        if accepted[0]:
+        warmup_timer.stop()
+        self._check_warmup()
+        
+        if accepted[0] and self.deferred_propagation:
+            # Propagated for all keywords at once once they are accepted;
+            # until then only the clicked frame's mask is known
+            self.video_segments[keyword] = {frame_idx: {len(self.masks): self.masks[keyword]}}
+            print(f"Accepted '{keyword}'; it is propagated after the last keyword")
+        elif accepted[0]:
             print("Propagating masks through video...")
             # Propagate masks through video
             video_segments = {}
-            for out_frame_idx, out_obj_ids, out_mask_logits in self.predictor.propagate_in_video(self.inference_state):
-                video_segments[out_frame_idx] = {
-                    out_obj_id: np.squeeze((out_mask_logits[i] > 0.0).cpu().numpy())  # Squeeze extra dimensions
-                    for i, out_obj_id in enumerate(out_obj_ids)
-                }
+            with stage("propagate", keyword=keyword):
+                for out_frame_idx, out_obj_ids, out_mask_logits in self.predictor.propagate_in_video(self.inference_state):
+                    video_segments[out_frame_idx] = {
+                        out_obj_id: self._full_mask(np.squeeze((out_mask_logits[i] > 0.0).cpu().numpy()), out_frame_idx)
+                        for i, out_obj_id in enumerate(out_obj_ids)
+                    }
             
             # Store video segments for this keyword
             self.video_segments[keyword] = video_segments
@@ -639,7 +1840,19 @@ class VideoSegmenter:
             print(f"Skipped '{keyword}' - no mask was accepted")
 
     def _generate_combinations(self):
-        """Generate all possible combinations of pixelated and non-pixelated masks and save as videos."""
+        """Generate all possible combinations of pixelated and non-pixelated masks and save as videos.
+        
+        Frames flow through a pipeline of threads connected by bounded
+        queues: one decoder reads each frame and its masks, self.workers
+        compositors build every combination of a frame, and one encoder per
+        combination streams its frames to a video writer in order. cv2,
+        NumPy and PIL release the GIL for most of this, so the stages run
+        on separate cores. At most workers + PIPELINE_QUEUE_SIZE frames are
+        in flight; once that many are decoded the decoder waits for the
+        slowest encoder, so memory stays bounded however long the clip is.
+        Per-stage throughput is printed and emitted as "pipeline_stage"
+        events.
+        """
         print("\nGenerating pixelated combinations...")
         
         # Create a list of all keywords for which we have masks
@@ -648,100 +1861,219 @@ class VideoSegmenter:
         
         # For each possible combination (2^num_masks)
         total_combinations = 2**num_masks
-        print(f"Generating {total_combinations} video combinations...")
-        
-        # Dictionary to store frames for each combination
-        combination_frames = {}
-        
-        # Process each frame
-        for frame_idx, frame_file in enumerate(self.frame_files):
-            # Load the frame
-            frame_path = str(self.frames_dir / frame_file)
-            frame = cv2.imread(frame_path)
-            if frame is None:
-                print(f"Warning: Could not read frame {frame_path}")
-                continue
-                
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Generate all combinations for this frame
-            for i in range(total_combinations):
-                # Convert number to binary to determine which masks to pixelate
-                binary = format(i, f'0{num_masks}b')
+        workers = self.workers or os.cpu_count() or 1
+        print(f"Generating {total_combinations} video combinations with {workers} compositor(s)...")
+        
+        # Combination i pixelates mask j when bit j of its binary form is set
+        combinations = []
+        for i in range(total_combinations):
+            binary = format(i, f'0{num_masks}b')
+            blurred_indices = [j for j, digit in enumerate(binary) if digit == '1']
+            key = "_".join(f"{j}blur" if j in blurred_indices else f"{j}" for j in range(num_masks))
+            combinations.append((key, blurred_indices))
+        
+        num_frames = len(self.frame_files)
+        decoded = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        encode_queues = [queue.Queue(maxsize=PIPELINE_QUEUE_SIZE) for _ in combinations]
+        # A slot is taken per decoded frame and released once every encoder
+        # has written it; this also bounds the encoders' reorder buffers
+        slots = threading.Semaphore(workers + PIPELINE_QUEUE_SIZE)
+        remaining = [total_combinations] * num_frames
+        remaining_lock = threading.Lock()
+        abort = threading.Event()
+        errors = []
+        written = {}
+        counters = {name: StageCounter(name) for name in ("decode", "composite", "encode")}
+        
+        def put(q, item):
+            while True:
+                if abort.is_set():
+                    raise PipelineAborted()
+                try:
+                    return q.put(item, timeout=0.1)
+                except queue.Full:
+                    pass
+        
+        def get(q):
+            while True:
+                if abort.is_set():
+                    raise PipelineAborted()
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        
+        def run(target, *args):
+            try:
+                target(*args)
+            except PipelineAborted:
+                pass
+            except Exception as e:
+                errors.append(e)
+                abort.set()
+        
+        def decode():
+            # The only thread reading masks, as a MaskStore caches one frame
+            for frame_idx, frame_file in enumerate(self.frame_files):
+                started = time.perf_counter()
+                while not slots.acquire(timeout=0.1):
+                    if abort.is_set():
+                        raise PipelineAborted()
+                waited = time.perf_counter() - started
                 
-                # Create a copy of the frame
-                result_image = frame.copy()
+                frame_path = str(self.frames_dir / frame_file)
+                frame = cv2.imread(frame_path)
+                frame_masks = {}
+                if frame is None:
+                    print(f"Warning: Could not read frame {frame_path}")
+                else:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    for j, keyword in enumerate(keywords_with_masks):
+                        frame_masks[j] = self._frame_mask(keyword, j + 1, frame_idx)
+                decoded_at = time.perf_counter()
+                put(decoded, (frame_idx, frame, frame_masks))
+                counters["decode"].add(decoded_at - started - waited, waited + time.perf_counter() - decoded_at)
+            for _ in range(workers):
+                put(decoded, None)
+        
+        def composite():
+            while True:
+                started = time.perf_counter()
+                item = get(decoded)
+                if item is None:
+                    return
+                frame_idx, frame, frame_masks = item
+                waited = time.perf_counter() - started
                 
-                # Record which indices are blurred
-                blurred_indices = []
+                started = time.perf_counter()
+                results = [None] * total_combinations
+                if frame is not None:
+                    results = self._composite_frame(frame, frame_masks, combinations)
+                composited = time.perf_counter()
+                for q, result in zip(encode_queues, results):
+                    put(q, (frame_idx, result))
+                counters["composite"].add(composited - started, waited + time.perf_counter() - composited)
                 
-                # Apply pixelation to selected masks
-                for j, digit in enumerate(binary):
-                    if digit == '1':  # Pixelate this mask
-                        keyword = keywords_with_masks[j]
-                        # Get mask for current frame
-                        obj_id = j + 1  # Object IDs start from 1
-                        if frame_idx not in self.video_segments[keyword]:
-                            print(f"Warning: No mask for frame {frame_idx} in keyword '{keyword}'")
-                            continue
-                        if obj_id not in self.video_segments[keyword][frame_idx]:
-                            print(f"Warning: No object {obj_id} in frame {frame_idx} for keyword '{keyword}'")
-                            continue
-                            
-                        mask = self.video_segments[keyword][frame_idx][obj_id]
-                        
-                        # Create PIL Image for pixelation
-                        pil_image = Image.fromarray(result_image)
-                        
-                        # Apply pixelation effect
-                        pixelation_factor = 20
-                        small_size = (self.width // pixelation_factor, self.height // pixelation_factor)
-                        
-                        # Create a pixelated version of the entire image
-                        small_img = pil_image.resize(small_size, Image.NEAREST)
-                        pixelated_img = small_img.resize((self.width, self.height), Image.NEAREST)
-                        
-                        # Apply the mask
-                        result_image[mask] = np.array(pixelated_img)[mask]
-                        
-                        # Record that this index was blurred
-                        blurred_indices.append(j)
+                if frame_idx % 10 == 0:  # Progress update every 10 frames
+                    print(f"Processed combinations for frame {frame_idx}/{num_frames}")
+        
+        def encode(i, q):
+            key = combinations[i][0]
+            writer = None
+            pending = {}
+            next_idx = 0
+            try:
+                while next_idx < num_frames:
+                    started = time.perf_counter()
+                    frame_idx, result = get(q)
+                    waited = time.perf_counter() - started
+                    pending[frame_idx] = result
+                    
+                    # Compositors finish out of order; write frames in order
+                    started = time.perf_counter()
+                    frames = 0
+                    while next_idx in pending:
+                        result = pending.pop(next_idx)
+                        if result is not None:
+                            if writer is None:
+                                writer, written[key] = open_video_writer(
+                                    self.combinations_dir / f"{key}.mp4", self.width, self.height, self.fps
+                                )
+                            writer.write(cv2.cvtColor(result, cv2.COLOR_RGB2BGR))
+                            frames += 1
+                        with remaining_lock:
+                            remaining[next_idx] -= 1
+                            if remaining[next_idx] == 0:
+                                slots.release()
+                        next_idx += 1
+                    counters["encode"].add(time.perf_counter() - started, waited, items=frames)
+            finally:
+                if writer is not None:
+                    writer.release()
+        
+        started = time.perf_counter()
+        threads = [threading.Thread(target=run, args=(decode,), name="combinations-decode", daemon=True)]
+        threads += [
+            threading.Thread(target=run, args=(composite,), name=f"combinations-composite-{n}", daemon=True)
+            for n in range(workers)
+        ]
+        threads += [
+            threading.Thread(target=run, args=(encode, i, q), name=f"combinations-encode-{i}", daemon=True)
+            for i, q in enumerate(encode_queues)
+        ]
+        with stage("composite", frames=num_frames, combinations=total_combinations, workers=workers):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        
+        print(f"Pipeline throughput over {elapsed:.1f} s:")
+        counters["decode"].report(elapsed, 1)
+        counters["composite"].report(elapsed, workers)
+        counters["encode"].report(elapsed, total_combinations)
+        
+        for key, _ in combinations:
+            written_path = written.get(key)
+            if written_path is None or not os.path.getsize(written_path):
+                print(f"Warning: No frames to save for combination {key}")
+                continue
+            print(f"Saved {written_path}")
+            if self.on_output:
+                self.on_output(Path(written_path).name, str(Path(written_path).absolute()))
+        
+        print("Finished generating video combinations")
+    
+    def _frame_mask(self, keyword, obj_id, frame_idx):
+        """The mask of keyword's object on one frame, or None if there is none."""
+        if frame_idx not in self.video_segments[keyword]:
+            print(f"Warning: No mask for frame {frame_idx} in keyword '{keyword}'")
+            return None
+        if obj_id not in self.video_segments[keyword][frame_idx]:
+            print(f"Warning: No object {obj_id} in frame {frame_idx} for keyword '{keyword}'")
+            return None
+        return self.video_segments[keyword][frame_idx][obj_id]
+    
+    def _composite_frame(self, frame, frame_masks, combinations):
+        """Composite every combination of one frame.
+        
+        Args:
+            frame: RGB frame
+            frame_masks: Dictionary mapping mask indices to boolean masks (or
+                None when the frame has no mask for that keyword)
+            combinations: (key, blurred_indices) pairs
+            
+        Returns:
+            One RGB frame per combination
+        """
+        results = []
+        for _, blurred_indices in combinations:
+            # Create a copy of the frame
+            result_image = frame.copy()
+            
+            # Apply pixelation to selected masks
+            for j in blurred_indices:
+                mask = frame_masks[j]
+                if mask is None:
+                    continue
                 
-                # Create combination key based on which indices are blurred
-                key_parts = []
-                for j in range(num_masks):
-                    if j in blurred_indices:
-                        key_parts.append(f"{j}blur")
-                    else:
-                        key_parts.append(f"{j}")
-                combination_key = "_".join(key_parts)
+                # Create PIL Image for pixelation
+                pil_image = Image.fromarray(result_image)
                 
-                # Initialize list for this combination if needed
-                if combination_key not in combination_frames:
-                    combination_frames[combination_key] = []
+                # Apply pixelation effect
+                small_size = (self.width // PIXELATION_FACTOR, self.height // PIXELATION_FACTOR)
                 
-                # Ensure frame is uint8 and clip values
-                result_image = np.clip(result_image, 0, 255).astype(np.uint8)
-                combination_frames[combination_key].append(result_image)
-            
-            if frame_idx % 10 == 0:  # Progress update every 10 frames
-                print(f"Processed combinations for frame {frame_idx}/{len(self.frame_files)}")
-        
-        # Save each combination as a video
-        print("\nSaving video combinations...")
-        for combination_key, frames in combination_frames.items():
-            if not frames:
-                print(f"Warning: No frames to save for combination {combination_key}")
-                continue
+                # Create a pixelated version of the entire image
+                small_img = pil_image.resize(small_size, Image.NEAREST)
+                pixelated_img = small_img.resize((self.width, self.height), Image.NEAREST)
                 
-            video_path = self.combinations_dir / f"{combination_key}.mp4"
-            print(f"Saving {video_path}...")
-            try:
-                write_video(video_path, frames, fps=self.fps)
-            except Exception as e:
-                print(f"Error saving video {combination_key}: {e}")
-        
-        print("Finished generating video combinations")
+                # Apply the mask
+                result_image[mask] = np.array(pixelated_img)[mask]
+            
+            results.append(result_image)
+        return results
     
     def _save_metadata(self):
         """Save metadata linking keywords to mask indices."""
@@ -764,7 +2096,12 @@ class VideoSegmenter:
         print(f"Saved keyword mapping to {keywords_path}")
 
 def process_video(video_path: str, keywords: list[str], output_dir: str = "masked_images", 
-                 combinations_dir: str = "blurry_combinations", frames_dir: str = "video_frames") -> dict[str, str]:
+                 combinations_dir: str = "blurry_combinations", frames_dir: str = "video_frames",
+                 on_output=None, model: str = DEFAULT_SAM2_MODEL, quantize: bool = False,
+                 threads: int | None = None, window: int | None = None,
+                 window_overlap: int = VIDEO_WINDOW_OVERLAP, keyframe_stride: int = 1,
+                 min_confidence: float = KEYFRAME_MIN_CONFIDENCE,
+                 inference_size: int | None = None, workers: int | None = None) -> dict[str, str]:
     """
     Process a video with the given keywords and return a mapping of combination filenames to their paths.
     
@@ -774,13 +2111,32 @@ def process_video(video_path: str, keywords: list[str], output_dir: str = "maske
         output_dir: Directory to save masks
         combinations_dir: Directory to save combinations
         frames_dir: Directory to save extracted frames
+        on_output: Optional callback called with (filename, path) as soon as
+            each combination is written, e.g. to start its upload
+        model: SAM2 model tier, one of SAM2_MODELS
+        quantize: Use dynamic int8 quantization on CPU
+        threads: Number of torch CPU threads, or None for the default
+        window: Propagate masks over windows of this many frames to bound
+            memory on long clips, or None to propagate the whole clip at once
+        window_overlap: Frames shared by consecutive windows
+        keyframe_stride: Run SAM2 only on every keyframe_stride-th frame and
+            interpolate the rest with optical flow
+        min_confidence: Flow confidence below which SAM2 is rerun between
+            two keyframes
+        inference_size: Longest side SAM2 sees, or None for full resolution
+        workers: Number of compositor threads, or None for one per CPU core
         
     Returns:
         Dictionary mapping combination filenames to their file paths
     """
     try:
         # Initialize video segmenter
-        segmenter = VideoSegmenter(video_path, keywords, output_dir, combinations_dir, frames_dir)
+        segmenter = VideoSegmenter(video_path, keywords, output_dir, combinations_dir, frames_dir,
+                                   model=model, quantize=quantize, threads=threads,
+                                   window=window, window_overlap=window_overlap,
+                                   keyframe_stride=keyframe_stride, min_confidence=min_confidence,
+                                   inference_size=inference_size, workers=workers)
+        segmenter.on_output = on_output
         
         # Process the video
         segmenter.segment_video()
@@ -805,20 +2161,70 @@ def main():
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument("--image", help="Path to the input image")
     input_group.add_argument("--video", help="Path to the input video")
-    parser.add_argument("--keywords", nargs="+", required=True, help="List of keywords for segmentation")
+    input_group.add_argument("--prompts",
+                             help="Segment every image in a prompts.json file headless, without --keywords")
+    parser.add_argument("--keywords", nargs="+", help="List of keywords for segmentation")
     parser.add_argument("--output-dir", default="masked_images", help="Directory to save masks")
     parser.add_argument("--combinations-dir", default="blurry_combinations", help="Directory to save pixelated combinations")
     parser.add_argument("--frames-dir", default="video_frames", help="Directory to save extracted video frames")
+    parser.add_argument("--model", choices=list(SAM2_MODELS), default=DEFAULT_SAM2_MODEL,
+                        help="SAM2 model tier; smaller tiers are faster, especially on CPU")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Use dynamic int8 quantization for CPU inference")
+    parser.add_argument("--threads", type=int, help="Number of torch CPU threads")
+    parser.add_argument("--inference-size", type=int,
+                        help="Downscale inputs so SAM2 sees at most this many pixels per side; "
+                             "masks are upsampled to full resolution")
+    parser.add_argument("--window", type=int,
+                        help="Propagate video masks over windows of this many frames to bound memory on long clips")
+    parser.add_argument("--window-overlap", type=int, default=VIDEO_WINDOW_OVERLAP,
+                        help="Frames shared by consecutive windows")
+    parser.add_argument("--keyframe-stride", type=int, default=1,
+                        help="Run SAM2 on every Nth video frame and fill the rest with optical flow")
+    parser.add_argument("--min-confidence", type=float, default=KEYFRAME_MIN_CONFIDENCE,
+                        help="Flow confidence (IoU) below which SAM2 is rerun between keyframes")
+    parser.add_argument("--workers", type=int,
+                        help="Compositor threads for video combinations (default: one per CPU core)")
+    parser.add_argument("--batch-size", type=int, default=4,
+                        help="Images embedded together with --prompts")
+    parser.add_argument("--rendition-widths", type=int, nargs="*", default=list(RENDITION_WIDTHS),
+                        help="Widths of the smaller renditions saved with each image combination")
+    parser.add_argument("--min-ssim", type=float, default=DEFAULT_MIN_SSIM,
+                        help="Encode each WEBP at the lowest quality reaching this SSIM; 0 disables the search")
+    parser.add_argument("--max-bytes", type=int,
+                        help="Lower the quality of any WEBP larger than this many bytes")
+    parser.add_argument("--webp-methods", type=int, nargs="+", default=list(DEFAULT_METHODS),
+                        help="WEBP methods to search (0 fastest to 6 smallest)")
     
     args = parser.parse_args()
+    if not args.prompts and not args.keywords:
+        parser.error("--keywords is required with --image or --video")
+    sam2_options = {"model": args.model, "quantize": args.quantize, "threads": args.threads,
+                    "inference_size": args.inference_size}
+    encoding_budget = EncodingBudget(min_ssim=args.min_ssim or None, max_bytes=args.max_bytes,
+                                     methods=tuple(args.webp_methods))
     
     try:
+        if args.prompts:
+            with open(args.prompts) as f:
+                prompts = json.load(f)
+            for prompt in prompts:
+                prompt["image"] = str(Path(args.prompts).parent / prompt["image"])
+            results = process_images(prompts, args.output_dir, args.combinations_dir,
+                                     batch_size=args.batch_size, rendition_widths=tuple(args.rendition_widths),
+                                     encoding_budget=encoding_budget, **sam2_options)
+            for image_path, pixelation_map in results.items():
+                print(f"{image_path}: {len(pixelation_map)} pixelated combinations")
+            return
         if args.image:
             pixelation_map = process_image(
                 args.image, 
                 args.keywords, 
                 args.output_dir, 
-                args.combinations_dir
+                args.combinations_dir,
+                rendition_widths=tuple(args.rendition_widths),
+                encoding_budget=encoding_budget,
+                **sam2_options
             )
             print(f"Successfully generated {len(pixelation_map)} pixelated combinations")
         else:  # args.video
@@ -827,7 +2233,13 @@ def main():
                 args.keywords,
                 args.output_dir,
                 args.combinations_dir,
-                args.frames_dir
+                args.frames_dir,
+                window=args.window,
+                window_overlap=args.window_overlap,
+                keyframe_stride=args.keyframe_stride,
+                min_confidence=args.min_confidence,
+                workers=args.workers,
+                **sam2_options
             )
             print(f"Successfully generated {len(pixelation_map)} pixelated frame combinations")
             
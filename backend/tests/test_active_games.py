@@ -0,0 +1,97 @@
+import json
+import pytest
+from pathlib import Path
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from active_games import current_game, decode_game, encode_game, game_meta_key, next_game_time, reconcile
+
+NOW = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+def game(game_id, day, pixelation_map=None):
+    """A games row as psycopg2 returns it."""
+    return {
+        "id": game_id,
+        "prompt_id": f"game-{game_id}",
+        "prompt_text": "A [cat]",
+        "keywords": ["cat"],
+        "speech_types": ["noun"],
+        "image_url": f"https://blob/{game_id}.png",
+        "pixelation_map": pixelation_map,
+        "media_type": "image",
+        "date_active": datetime(2024, 1, day, tzinfo=timezone.utc),
+    }
+
+def stored(row):
+    """The metadata hash of a game, as HGETALL returns it."""
+    return {k.encode(): v.encode() for k, v in encode_game(row).items()}
+
+def test_meta_round_trip():
+    """Decoded metadata matches the row, whether JSON columns were text or decoded."""
+    row = game(3, 1, {"0blur.webp": "https://blob/0blur.webp"})
+    assert decode_game(stored(row)) == {**row, "date_active": "2024-01-01T00:00:00+00:00"}
+    as_text = {**row, "keywords": json.dumps(row["keywords"]), "pixelation_map": json.dumps(row["pixelation_map"])}
+    assert encode_game(as_text) == encode_game(row)
+
+def test_current_game_picks_among_latest():
+    """The latest game that has started is served; ties are broken at random."""
+    client = Mock()
+    client.zrevrangebyscore.return_value = [(b"5", 100.0), (b"4", 100.0), (b"3", 50.0)]
+    client.hgetall.side_effect = lambda key: stored(game(int(key.split(":")[1]), 1))
+
+    picked = {current_game(client, NOW)["id"] for _ in range(50)}
+    assert picked == {4, 5}
+    client.zrevrangebyscore.assert_called_with(
+        "games:active", NOW.timestamp(), "-inf", start=0, num=10, withscores=True
+    )
+
+    client.zrevrangebyscore.return_value = []
+    assert current_game(client, NOW) is None
+
+def test_next_game_time():
+    """The next game is the first strictly after now."""
+    client = Mock()
+    start = datetime(2024, 1, 3, tzinfo=timezone.utc)
+    client.zrangebyscore.return_value = [(b"6", start.timestamp())]
+    assert next_game_time(client, NOW) == start
+    client.zrangebyscore.assert_called_with(
+        "games:active", f"({NOW.timestamp()}", "+inf", start=0, num=1, withscores=True
+    )
+    client.zrangebyscore.return_value = []
+    assert next_game_time(client, NOW) is None
+
+def test_reconcile_adds_updates_and_removes():
+    """The index ends up matching the games table."""
+    rows = [game(1, 1, {"b": "https://blob/b", "a": "https://blob/a"}), game(2, 2), game(3, 3)]
+    conn, cur = Mock(), Mock()
+    cur.fetchall.return_value = [tuple(row.values()) for row in rows]
+    conn.cursor.return_value.__enter__ = Mock(return_value=cur)
+    conn.cursor.return_value.__exit__ = Mock(return_value=None)
+
+    client = Mock()
+    # Game 1 is current (its map in another key order), game 2 moved, game 3
+    # is missing and game 9 was deleted
+    client.zrange.return_value = [
+        (b"1", rows[0]["date_active"].timestamp()),
+        (b"2", rows[0]["date_active"].timestamp()),
+        (b"9", 0.0),
+    ]
+    pipeline = client.pipeline.return_value
+    pipeline.execute.return_value = [stored({**rows[0], "pixelation_map": {"a": "https://blob/a", "b": "https://blob/b"}}),
+                                     stored(rows[1])]
+
+    assert reconcile(conn, client, dry_run=True) == {"added": 1, "updated": 1, "removed": 1}
+    pipeline.zadd.assert_not_called()
+
+    assert reconcile(conn, client) == {"added": 1, "updated": 1, "removed": 1}
+    assert [c.args[1] for c in pipeline.zadd.call_args_list] == [
+        {"3": rows[2]["date_active"].timestamp()},
+        {"2": rows[1]["date_active"].timestamp()},
+    ]
+    pipeline.hset.assert_any_call(game_meta_key(3), mapping=encode_game(rows[2]))
+    pipeline.zrem.assert_called_once_with("games:active", "9")
+    pipeline.unlink.assert_any_call("game_meta:9")
@@ -0,0 +1,67 @@
+import io
+import numpy as np
+import pytest
+from pathlib import Path
+from PIL import Image, ImageFilter
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from encoding import EncodingBudget, WebpEncoder, block_ssim, encode_webp
+
+@pytest.fixture
+def smooth_image():
+    """A smooth image that compresses well at lower qualities."""
+    y, x = np.mgrid[0:240, 0:320]
+    pixels = np.stack([128 + 100 * np.sin(x / 30), 128 + 90 * np.cos(y / 20), (x // 40 * 37 + y // 30 * 53) % 256], -1)
+    return Image.fromarray(pixels.astype(np.uint8)).filter(ImageFilter.GaussianBlur(1))
+
+def decoded_ssim(image, data):
+    reference = np.asarray(image.convert("L"))
+    return block_ssim(reference, np.asarray(Image.open(io.BytesIO(data)).convert("L")))
+
+def test_block_ssim():
+    """Identical images score 1 and noise lowers the score."""
+    rng = np.random.default_rng(0)
+    image = np.add.outer(np.arange(64), np.arange(64)).astype(np.uint8)
+    noisy = np.clip(image + rng.normal(0, 20, image.shape), 0, 255).astype(np.uint8)
+    assert block_ssim(image, image) == pytest.approx(1.0)
+    assert block_ssim(image, noisy) < 0.95
+
+def test_lowest_quality_meeting_ssim_is_searched_once_per_size(smooth_image):
+    """The first image of a size is searched; the rest reuse its settings and report savings."""
+    encoder = WebpEncoder(EncodingBudget(min_ssim=0.98))
+    data, quality, _ = encoder.encode(smooth_image)
+
+    assert quality < 90
+    assert decoded_ssim(smooth_image, data) >= 0.98
+    lower = encode_webp(smooth_image, quality - 5, 4)
+    assert quality == 60 or decoded_ssim(smooth_image, lower) < 0.98
+
+    searched = encoder.stats.encodes
+    assert encoder.encode(smooth_image.transpose(Image.FLIP_LEFT_RIGHT))[1] == quality
+    assert encoder.stats.encodes == searched + 1
+    encoder.encode(smooth_image.resize((160, 120)))
+    assert encoder.stats.searched == 2
+    assert encoder.stats.saved_bytes > 0
+
+def test_byte_budget(smooth_image):
+    """Outputs are brought under max_bytes, down to min_quality."""
+    sizes = {q: len(encode_webp(smooth_image, q, 4)) for q in (60, 75, 90)}
+    encoder = WebpEncoder(EncodingBudget(min_ssim=None, max_bytes=sizes[75]))
+    data, quality, _ = encoder.encode(smooth_image)
+    assert quality == 75 and len(data) == sizes[75]
+
+    # A noisier image of the same size gets lowered further than the memo
+    rng = np.random.default_rng(1)
+    noisy = Image.fromarray(np.clip(np.asarray(smooth_image) + rng.normal(0, 8, (240, 320, 3)), 0, 255).astype(np.uint8))
+    data, quality, _ = encoder.encode(noisy)
+    assert quality < 75 and (len(data) <= sizes[75] or quality == 60)
+
+def test_fixed_budget_matches_plain_encoding(smooth_image):
+    """A fixed budget writes exactly what saving at that quality did."""
+    data, quality, method = WebpEncoder(EncodingBudget.fixed(90)).encode(smooth_image)
+    expected = io.BytesIO()
+    smooth_image.save(expected, format="WEBP", quality=90)
+    assert (quality, method) == (90, 4) and data == expected.getvalue()
@@ -0,0 +1,61 @@
+import json
+import pytest
+from pathlib import Path
+from unittest.mock import Mock, patch
+import numpy as np
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from evaluate_segmenter import evaluate, load_prompts, mask_iou
+
+@pytest.fixture
+def prompts_file(tmp_path):
+    """Two prompts on one image, with a relative image path."""
+    from PIL import Image
+    Image.fromarray(np.zeros((10, 10, 3), dtype=np.uint8)).save(tmp_path / "cat.png")
+    path = tmp_path / "prompts.json"
+    path.write_text(json.dumps([
+        {"image": "cat.png", "keyword": "cat", "points": [[2, 2]]},
+        {"image": "cat.png", "keyword": "hat", "points": [[7, 7], [8, 8]], "labels": [1, 0]},
+    ]))
+    return path
+
+def test_mask_iou():
+    """IoU of overlapping, disjoint and empty masks."""
+    a = np.zeros((4, 4), dtype=bool)
+    b = np.zeros((4, 4), dtype=bool)
+    assert mask_iou(a, b) == 1.0
+    a[:2] = True
+    b[1:3] = True
+    assert mask_iou(a, b) == pytest.approx(1 / 3)
+    assert mask_iou(a, ~a) == 0.0
+
+def test_evaluate_compares_tiers_against_large(prompts_file):
+    """Each image is embedded once per tier and every mask is scored against large."""
+    prompts = load_prompts(prompts_file)
+    assert prompts[0]["image"] == str(prompts_file.parent / "cat.png")
+    assert prompts[0]["labels"] == [1]
+
+    predictors = {}
+
+    def load(model, quantize, threads):
+        # large predicts the top half, tiny the top quarter
+        rows = {"large": 5, "tiny": 3}[model]
+        mask = np.zeros((1, 10, 10), dtype=np.float32)
+        mask[:, :rows] = 1
+        predictor = Mock()
+        predictor.predict.return_value = (mask, None, None)
+        predictors[(model, quantize)] = predictor
+        return predictor
+
+    with patch("evaluate_segmenter.load_image_predictor", load):
+        results = evaluate(prompts, [("tiny", True)])
+
+    assert [(r["model"], r["quantize"]) for r in results] == [("large", False), ("tiny", True)]
+    assert results[0]["ious"] == [1.0, 1.0]
+    assert results[1]["mean_iou"] == pytest.approx(0.6)
+    for predictor in predictors.values():
+        predictor.set_image.assert_called_once()
+        assert predictor.predict.call_count == 2
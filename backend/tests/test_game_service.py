@@ -0,0 +1,134 @@
+import asyncio
+import gzip
+import json
+import time
+import pytest
+from pathlib import Path
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from active_games import encode_game
+from game_service import GameCache, GameService, encode_response, load_current_game, negotiate_encoding, respond
+from schedule_game import ConnectionManager
+
+NOW = datetime(2024, 1, 2, tzinfo=timezone.utc)
+NEXT = datetime(2024, 1, 3, tzinfo=timezone.utc)
+
+@pytest.fixture
+def connections():
+    """Connections whose Redis index has one current game and one upcoming."""
+    meta = encode_game({
+        "id": 7, "prompt_id": "game-7", "prompt_text": "A [Cat]", "keywords": ["Cat"],
+        "speech_types": ["noun"], "image_url": "https://blob/7.png", "pixelation_map": {"0.webp": "https://blob/0.webp"},
+        "media_type": "image", "date_active": NOW,
+    })
+    client = Mock()
+    client.zrevrangebyscore.return_value = [(b"7", NOW.timestamp())]
+    client.zrangebyscore.return_value = [(b"8", NEXT.timestamp())]
+    client.hgetall.side_effect = lambda key: {
+        "game_meta:7": {k.encode(): v.encode() for k, v in meta.items()},
+        "game:game-7:similarity": {b"cat": b"similarity:lg:1000:cat"},
+    }[key]
+    client.pipeline.return_value.execute.return_value = [{b"kitten": b"0.8", b"cat": b"1.0"}]
+    connections = Mock(spec=ConnectionManager)
+    connections.redis.return_value = client
+    return connections
+
+def test_payload_is_read_from_index(connections):
+    """The payload matches the current-game route without touching PostgreSQL."""
+    status, payload, next_time = load_current_game(connections, NOW)
+    assert status == 200 and next_time == NEXT
+    assert payload == {
+        "id": 7, "prompt_id": "game-7", "prompt_text": "A [Cat]", "keywords": ["Cat"],
+        "image_url": "https://blob/7.png", "similarity_data": {"cat": {"kitten": 0.8, "cat": 1.0}},
+        "speech_types": ["noun"], "pixelation_map": {"0.webp": "https://blob/0.webp"}, "media_type": "image",
+    }
+    connections.redis.return_value.pipeline.return_value.hgetall.assert_called_once_with("similarity:lg:1000:cat")
+    connections.postgres.assert_not_called()
+
+    connections.redis.return_value.zrevrangebyscore.return_value = []
+    assert load_current_game(connections, NOW)[0] == 404
+    connections.postgres.assert_not_called()
+
+def test_encoding_negotiation():
+    """Clients get the best encoding they accept, identity unless refused."""
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") == "identity"
+    assert negotiate_encoding("") == "identity"
+    assert negotiate_encoding("*") in ("br", "gzip")
+
+def test_etags_and_cache_control():
+    """Bodies are pre-compressed, and a matching ETag gets a bodiless 304."""
+    cached = encode_response(200, {"id": 7}, time.time() + 120, time.time() + 60)
+    assert json.loads(gzip.decompress(cached.bodies["gzip"])) == {"id": 7}
+    assert cached.etags["gzip"] != cached.etags["identity"]
+
+    response = respond(cached, {"accept-encoding": "gzip"}, keep_alive=True, head=False)
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert b"Content-Encoding: gzip" in head and body == cached.bodies["gzip"]
+    assert b"Cache-Control: public, max-age=119" in head or b"Cache-Control: public, max-age=120" in head
+
+    response = respond(cached, {"accept-encoding": "gzip", "if-none-match": cached.etags["gzip"]}, True, False)
+    assert response.startswith(b"HTTP/1.1 304 Not Modified") and response.endswith(b"Content-Length: 0\r\n\r\n")
+    # The identity ETag doesn't validate the gzip body
+    response = respond(cached, {"accept-encoding": "gzip", "if-none-match": cached.etags["identity"]}, True, False)
+    assert response.startswith(b"HTTP/1.1 200 OK")
+
+def test_cache_rebuilds_once_at_the_boundary(connections):
+    """Concurrent requests share one rebuild, and the cache expires at the next game."""
+    clock = [NOW.timestamp()]
+    cache = GameCache(connections, refresh_seconds=3600 * 48)
+
+    async def bursts():
+        await asyncio.gather(*[cache.get() for _ in range(20)])
+        assert connections.redis.return_value.zrevrangebyscore.call_count == 1
+        assert cache.current.expires_at == NEXT.timestamp()
+        assert cache.current.max_age(clock[0]) == 24 * 3600
+
+        clock[0] = NEXT.timestamp()
+        connections.redis.return_value.zrangebyscore.return_value = [(b"9", NEXT.timestamp() + 3600)]
+        await asyncio.gather(*[cache.get() for _ in range(20)])
+        assert connections.redis.return_value.zrevrangebyscore.call_count == 2
+        assert cache.current.max_age(clock[0]) == 3600
+
+    with patch("game_service.time.time", side_effect=lambda: clock[0]):
+        asyncio.run(bursts())
+
+def test_failed_rebuild_is_not_retried_per_request(connections):
+    """While Redis fails, requests get a 500 without each querying it."""
+    connections.redis.return_value.pipeline.return_value.execute.return_value = [{}]
+    cache = GameCache(connections)
+
+    async def burst():
+        return await asyncio.gather(*[cache.get() for _ in range(20)])
+
+    responses = asyncio.run(burst())
+    assert {current.status for current, _ in responses} == {500}
+    assert connections.redis.return_value.zrevrangebyscore.call_count == 1
+
+def test_serves_keep_alive_requests(connections):
+    """Several requests are answered on one connection."""
+    async def exchange():
+        service = GameService(GameCache(connections))
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for path in ("/api/current-game", "/api/next-game-time", "/missing"):
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            head = (await reader.readuntil(b"\r\n\r\n")).decode()
+            length = int(head.split("Content-Length: ")[1].split("\r\n")[0])
+            responses.append((head.split(" ")[1], json.loads(await reader.readexactly(length))))
+        writer.close()
+        server.close()
+        return responses
+
+    current, next_time, missing = asyncio.run(exchange())
+    assert current[0] == "200" and current[1]["prompt_id"] == "game-7"
+    assert next_time == ("200", {"nextGameTime": "2024-01-03T00:00:00+00:00"})
+    assert missing[0] == "404"
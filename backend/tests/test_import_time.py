@@ -0,0 +1,45 @@
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Only the stages that need these may import them
+HEAVY_MODULES = {"torch", "torchvision", "sam2", "matplotlib", "cv2", "spacy", "thinc"}
+
+# Cumulative import time budget for the non-media CLI modules, in microseconds
+IMPORT_BUDGET_US = 300_000
+
+def import_times(module: str) -> dict[str, int]:
+    """
+    Import ``module`` in a fresh interpreter with ``-X importtime``.
+
+    Returns:
+        Dictionary mapping every imported module to its cumulative import
+        time in microseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+@pytest.mark.parametrize("module", ["schedule_game", "migrations", "instrumentation", "utils"])
+def test_cli_modules_skip_heavy_imports(module):
+    """Importing a CLI module must not pull in torch, SAM2, matplotlib, OpenCV or spaCy."""
+    imported = {name.split(".")[0] for name in import_times(module)}
+    assert not imported & HEAVY_MODULES
+
+@pytest.mark.parametrize("module", ["schedule_game", "migrations"])
+def test_cli_import_time_budget(module):
+    """Non-media CLI startup stays within the import time budget."""
+    # Best of three to ride out a cold filesystem cache or a busy machine
+    best = min(import_times(module)[module] for _ in range(3))
+    assert best < IMPORT_BUDGET_US, f"importing {module} took {best / 1000:.0f} ms"
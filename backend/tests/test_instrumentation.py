@@ -0,0 +1,103 @@
+import io
+import json
+import pstats
+import threading
+import pytest
+from pathlib import Path
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+import instrumentation
+from instrumentation import stage
+
+@pytest.fixture
+def timings():
+    """Enable instrumentation into an in-memory stream."""
+    output = io.StringIO()
+    instrumentation.configure(output)
+    yield output
+    instrumentation.shutdown()
+
+def events(output):
+    """Parse every JSON line written so far."""
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+def test_stage_is_noop_when_disabled():
+    """Without configure() stages still run but nothing is recorded."""
+    instrumentation.shutdown()
+    with stage("media", prompt_id="p1") as fields:
+        fields["bytes"] = 10
+    assert not instrumentation.is_enabled()
+
+def test_nested_stages_emit_paths(timings):
+    """Inner stages finish first and carry the enclosing stage names."""
+    with stage("media", prompt_id="p1"):
+        with stage("upload", blob="a.webp") as fields:
+            fields["bytes"] = 42
+
+    inner, outer = events(timings)
+    assert inner["path"] == "media/upload"
+    assert inner["blob"] == "a.webp"
+    assert inner["bytes"] == 42
+    assert outer["path"] == "media"
+    assert outer["prompt_id"] == "p1"
+    assert outer["duration_s"] >= inner["duration_s"]
+    assert all(e["event"] == "stage" and e["status"] == "ok" for e in (inner, outer))
+
+def test_failed_stage_records_error(timings):
+    """Exceptions propagate and the stage is marked as failed."""
+    with pytest.raises(ValueError):
+        with stage("postgres_insert"):
+            raise ValueError("boom")
+
+    event, = events(timings)
+    assert event["status"] == "error"
+    assert event["error"] == "ValueError: boom"
+
+def test_profile_and_memory(tmp_path):
+    """Top-level stages dump a pstats file; every stage reports its memory peak."""
+    output = io.StringIO()
+    instrumentation.configure(output, profile_dir=tmp_path, trace_memory=True)
+    try:
+        with stage("similarity"):
+            with stage("similarity_generation"):
+                data = bytearray(2_000_000)
+            del data
+    finally:
+        instrumentation.shutdown()
+
+    inner, outer = events(output)
+    assert "profile" not in inner
+    assert Path(outer["profile"]).parent == tmp_path
+    pstats.Stats(outer["profile"])
+    assert inner["memory_peak_bytes"] >= 2_000_000
+    # The parent's peak includes its children's
+    assert outer["memory_peak_bytes"] >= inner["memory_peak_bytes"]
+
+def test_concurrent_stages_are_profiled_one_at_a_time(tmp_path):
+    """A stage that starts while another thread's stage is profiled runs unprofiled."""
+    output = io.StringIO()
+    instrumentation.configure(output, profile_dir=tmp_path)
+    barrier = threading.Barrier(2)
+    def run(name):
+        with stage(name):
+            barrier.wait()
+            barrier.wait()
+    try:
+        threads = [threading.Thread(target=run, args=(name,)) for name in ("media", "embeddings")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with stage("commit"):
+            pass
+    finally:
+        instrumentation.shutdown()
+
+    results = {event["stage"]: event for event in events(output)}
+    assert all(event["status"] == "ok" for event in results.values())
+    assert sum("profile" in results[name] for name in ("media", "embeddings")) == 1
+    # The profiler is released once its stage ends
+    assert "profile" in results["commit"]
@@ -0,0 +1,81 @@
+import pytest
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from migrations import (
+    MIGRATIONS,
+    Migration,
+    pending_migrations,
+    run_migrations
+)
+
+@pytest.fixture
+def mock_db():
+    """Mock database connection and cursor."""
+    mock_conn = Mock()
+    mock_cur = Mock()
+    mock_cur.fetchall.return_value = []
+
+    mock_cm = Mock()
+    mock_cm.__enter__ = Mock(return_value=mock_cur)
+    mock_cm.__exit__ = Mock(return_value=None)
+    mock_conn.cursor.return_value = mock_cm
+
+    return mock_conn, mock_cur
+
+def executed_sql(mock_cur):
+    """Return the SQL text of every execute() call."""
+    return [call[0][0] for call in mock_cur.execute.call_args_list]
+
+def test_migration_versions_are_unique_and_ordered():
+    """Versions must be unique and listed in ascending order."""
+    versions = [m.version for m in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+def test_pending_migrations_skips_applied(mock_db):
+    """Only migrations not recorded in schema_migrations are pending."""
+    mock_conn, mock_cur = mock_db
+    mock_cur.fetchall.return_value = [(1,), (2,)]
+
+    pending = pending_migrations(mock_conn)
+    assert [m.version for m in pending] == [m.version for m in MIGRATIONS[2:]]
+
+def test_run_migrations_applies_pending_once(mock_db):
+    """Pending migrations run in order and record their version."""
+    mock_conn, mock_cur = mock_db
+    migrations = [
+        Migration(2, "second", "SELECT 2"),
+        Migration(1, "first", "SELECT 1"),
+        Migration(3, "concurrent", "SELECT 3", transactional=False),
+    ]
+    mock_cur.fetchall.return_value = [(1,)]
+
+    applied = run_migrations(mock_conn, migrations)
+
+    assert applied == [2, 3]
+    sql = executed_sql(mock_cur)
+    assert "SELECT 1" not in sql
+    assert sql.index("SELECT 2") < sql.index("SELECT 3")
+    # Advisory lock is always released
+    assert any("pg_advisory_unlock" in s for s in sql)
+    # Autocommit is restored after non-transactional migrations
+    assert mock_conn.autocommit is False
+
+def test_run_migrations_releases_lock_on_failure(mock_db):
+    """A failing migration rolls back and still releases the advisory lock."""
+    mock_conn, mock_cur = mock_db
+
+    def execute(sql, params=None):
+        if sql == "BROKEN":
+            raise RuntimeError("syntax error")
+    mock_cur.execute.side_effect = execute
+
+    with pytest.raises(RuntimeError):
+        run_migrations(mock_conn, [Migration(1, "broken", "BROKEN")])
+
+    mock_conn.rollback.assert_called()
+    assert any("pg_advisory_unlock" in s for s in executed_sql(mock_cur))
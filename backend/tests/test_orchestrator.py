@@ -0,0 +1,74 @@
+import threading
+import pytest
+from pathlib import Path
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from orchestrator import Stage, StageError, run_stages, validate_stages
+
+def test_dependencies_receive_results():
+    """Each stage gets its dependencies' results as keyword arguments."""
+    results = run_stages([
+        Stage("total", lambda a, b: a + b, depends_on=("a", "b")),
+        Stage("a", lambda: 1),
+        Stage("b", lambda: 2),
+    ])
+    assert results == {"a": 1, "b": 2, "total": 3}
+
+def test_background_stages_overlap_main_thread_stage():
+    """Background stages run while a main-thread stage is still going."""
+    embeddings_started = threading.Event()
+    threads = {}
+
+    def media():
+        threads["media"] = threading.current_thread()
+        # Only returns if the embeddings stage runs concurrently
+        assert embeddings_started.wait(timeout=5)
+        return "media"
+
+    def embeddings():
+        threads["embeddings"] = threading.current_thread()
+        embeddings_started.set()
+        return "embeddings"
+
+    results = run_stages([
+        Stage("media", media, main_thread=True),
+        Stage("embeddings", embeddings),
+        Stage("commit", lambda media, embeddings: (media, embeddings),
+              depends_on=("media", "embeddings")),
+    ])
+    assert results["commit"] == ("media", "embeddings")
+    assert threads["media"] is threading.main_thread()
+    assert threads["embeddings"] is not threading.main_thread()
+
+def test_failure_stops_dependents():
+    """A failing stage raises StageError and its dependents never run."""
+    committed = []
+
+    def fail():
+        raise RuntimeError("no media")
+
+    with pytest.raises(StageError) as excinfo:
+        run_stages([
+            Stage("media", fail, main_thread=True),
+            Stage("embeddings", lambda: {}),
+            Stage("commit", lambda media, embeddings: committed.append(1),
+                  depends_on=("media", "embeddings")),
+        ])
+    assert excinfo.value.stage == "media"
+    assert isinstance(excinfo.value.__cause__, RuntimeError)
+    assert not committed
+
+def test_validate_stages_rejects_bad_graphs():
+    """Unknown dependencies, duplicate names and cycles are rejected."""
+    with pytest.raises(ValueError, match="unknown"):
+        validate_stages([Stage("a", lambda b: b, depends_on=("b",))])
+    with pytest.raises(ValueError, match="Duplicate"):
+        validate_stages([Stage("a", lambda: 1), Stage("a", lambda: 2)])
+    with pytest.raises(ValueError, match="cycle"):
+        validate_stages([
+            Stage("a", lambda b: b, depends_on=("b",)),
+            Stage("b", lambda a: a, depends_on=("a",)),
+        ])
@@ -0,0 +1,55 @@
+import base64
+import numpy as np
+from pathlib import Path
+from unittest.mock import patch
+from PIL import Image
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from renditions import entry_urls, parse_rendition, pixelation_entries, rendition_filename, save_renditions
+
+def test_rendition_names_round_trip():
+    """Renditions are named after their combination and parsed back to it."""
+    assert rendition_filename("0_1blur.webp", 480) == "0_1blur.480w.webp"
+    assert parse_rendition("0_1blur.480w.webp") == ("0_1blur.webp", 480)
+    assert parse_rendition("0_1blur.placeholder.webp") == ("0_1blur.webp", "placeholder")
+    assert parse_rendition("0_1blur.webp") == ("0_1blur.webp", None)
+    assert parse_rendition("0_1blur.mp4") == ("0_1blur.mp4", None)
+
+def test_each_width_is_downscaled_from_the_next_larger(tmp_path):
+    """The ladder is a pyramid, skips widths the image doesn't exceed and ends in a placeholder."""
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 256, (600, 1200, 3), dtype=np.uint8))
+    path = tmp_path / "0blur.webp"
+    outputs = []
+    resize = Image.Image.resize
+    with patch.object(Image.Image, "resize", autospec=True, side_effect=resize) as resized:
+        written = save_renditions(image, path, (480, 960, 1600), lambda name, _: outputs.append(name))
+
+    assert outputs == [p.name for p in written] == ["0blur.960w.webp", "0blur.480w.webp", "0blur.placeholder.webp"]
+    assert [call.args[0].width for call in resized.call_args_list] == [1200, 960, 480]
+    assert [Image.open(p).size for p in written] == [(960, 480), (480, 240), (24, 12)]
+
+def test_pixelation_entries(tmp_path):
+    """Combinations with renditions become srcset entries with an inlined placeholder."""
+    paths = {}
+    for name, width in [("0.webp", 1200), ("0.480w.webp", 480), ("0.960w.webp", 960), ("0.placeholder.webp", 24)]:
+        paths[name] = str(tmp_path / name)
+        Image.new("RGB", (width, width // 2)).save(paths[name], format="WEBP")
+    paths["0blur.mp4"] = str(tmp_path / "0blur.mp4")
+    urls = {name: f"https://blob/{name}" for name in paths if "placeholder" not in name}
+    # A failed rendition upload only drops it from the srcset
+    del urls["0.960w.webp"]
+
+    entries = pixelation_entries(paths, urls)
+    assert set(entries) == {"0.webp", "0blur.mp4"}
+    assert entries["0blur.mp4"] == "https://blob/0blur.mp4"
+    entry = entries["0.webp"]
+    assert entry["src"] == "https://blob/0.webp"
+    assert entry["srcset"] == "https://blob/0.480w.webp 480w, https://blob/0.webp 1200w"
+    prefix = "data:image/webp;base64,"
+    assert base64.b64decode(entry["placeholder"][len(prefix):]) == Path(paths["0.placeholder.webp"]).read_bytes()
+
+    assert entry_urls(entry) == ["https://blob/0.webp", "https://blob/0.480w.webp"]
+    assert entry_urls("https://blob/0blur.mp4") == ["https://blob/0blur.mp4"]
@@ -0,0 +1,539 @@
+import json
+import threading
+from concurrent.futures import Future
+import pytest
+from pathlib import Path
+from unittest.mock import Mock, patch
+import numpy as np
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.backend_bases import FigureCanvasBase, MouseEvent
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from segmenter import (SAM2_MODELS, MaskStore, Segmenter, VideoSegmenter, build_sam2_model,
+                       generate_image_combinations, interpolate_masks, keyframe_indices, mask_iou, pixelation_indices, process_images,
+                       prompt_arrays, start_background, upsample_mask)
+from encoding import EncodingBudget
+from renditions import parse_rendition
+
+@pytest.fixture
+def image_file(tmp_path):
+    """A small RGB PNG on disk."""
+    from PIL import Image
+    path = tmp_path / "image.png"
+    Image.fromarray(np.full((40, 60, 3), 128, dtype=np.uint8)).save(path)
+    return path
+
+@pytest.fixture
+def slow_predictor():
+    """Patch the SAM2 warm-up with one that blocks until released."""
+    release = threading.Event()
+    predictor = Mock()
+    predictor.predict.return_value = (np.ones((1, 40, 60), dtype=bool), None, None)
+
+    def load(self):
+        assert release.wait(timeout=5)
+        return predictor
+
+    with patch.object(Segmenter, "_load_predictor", load):
+        yield predictor, release
+
+class FakeTimer:
+    """Stands in for a GUI timer; tests fire it by hand."""
+
+    def __init__(self, *args, **kwargs):
+        self.callbacks = []
+        self.running = False
+
+    def add_callback(self, func, *args, **kwargs):
+        self.callbacks.append(func)
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def fire(self):
+        for func in list(self.callbacks):
+            if self.running:
+                func()
+
+def test_start_background():
+    """Results and errors come back through the Future."""
+    assert start_background("test", lambda x: x * 2, 21).result(timeout=5) == 42
+
+    def fail():
+        raise RuntimeError("no checkpoint")
+    with pytest.raises(RuntimeError, match="no checkpoint"):
+        start_background("test", fail).result(timeout=5)
+
+def test_init_does_not_wait_for_sam2(image_file, tmp_path, slow_predictor):
+    """The constructor returns after decoding; the predictor waits for the warm-up."""
+    predictor, release = slow_predictor
+    segmenter = Segmenter(image_file, ["cat"], tmp_path / "masks", tmp_path / "combinations")
+    assert segmenter.image.shape == (40, 60, 3)
+    assert not segmenter._warmup.done()
+
+    release.set()
+    assert segmenter.predictor is predictor
+
+def test_clicks_queue_until_sam2_is_ready(image_file, tmp_path, slow_predictor):
+    """Clicks made while SAM2 loads are predicted together once it is ready."""
+    predictor, release = slow_predictor
+    segmenter = Segmenter(image_file, ["cat"], tmp_path / "masks", tmp_path / "combinations")
+    timers = []
+
+    def new_timer(canvas, *args, **kwargs):
+        timers.append(FakeTimer())
+        return timers[-1]
+
+    def interact(*args, **kwargs):
+        fig = plt.gcf()
+        main_ax = next(ax for ax in fig.axes if ax.get_label() == "main")
+        for point in [(10.5, 20.5), (30.5, 15.5)]:
+            x, y = main_ax.transData.transform(point)
+            fig.canvas.callbacks.process(
+                "button_press_event", MouseEvent("button_press_event", fig.canvas, x, y, button=1)
+            )
+        # Nothing is predicted while the model is loading
+        predictor.predict.assert_not_called()
+
+        release.set()
+        segmenter._warmup.result(timeout=5)
+        timers[0].fire()
+        plt.close(fig)
+
+    with patch.object(FigureCanvasBase, "new_timer", new_timer), \
+         patch("matplotlib.pyplot.show", interact):
+        segmenter._process_keyword("cat")
+
+    predictor.predict.assert_called_once()
+    coords = predictor.predict.call_args.kwargs["point_coords"]
+    assert coords.tolist() == [[10, 20], [30, 15]]
+
+def test_clicks_refine_previous_logits_in_place(image_file, tmp_path):
+    """Each click feeds the previous low-res logits back and reuses the figure."""
+    predictor = Mock()
+    logits = [np.full((1, 256, 256), i, dtype=np.float32) for i in range(2)]
+    predictor.predict.side_effect = [
+        (np.ones((1, 40, 60), dtype=np.float32), None, logits[0]),
+        (np.zeros((1, 40, 60), dtype=np.float32), None, logits[1]),
+    ]
+    with patch.object(Segmenter, "_load_predictor", lambda self: predictor):
+        segmenter = Segmenter(image_file, ["cat"], tmp_path / "masks", tmp_path / "combinations")
+        segmenter._warmup.result(timeout=5)
+
+    events = []
+    def interact(*args, **kwargs):
+        fig = plt.gcf()
+        fig.canvas.draw()  # caches the blitting background
+        main_ax = next(ax for ax in fig.axes if ax.get_label() == "main")
+        axes_before = list(fig.axes)
+        for point in [(10.5, 20.5), (30.5, 15.5)]:
+            x, y = main_ax.transData.transform(point)
+            fig.canvas.callbacks.process(
+                "button_press_event", MouseEvent("button_press_event", fig.canvas, x, y, button=1)
+            )
+        assert fig.axes == axes_before
+        plt.close(fig)
+
+    with patch("matplotlib.pyplot.show", interact), \
+         patch("segmenter.emit", lambda event, **fields: events.append((event, fields))):
+        segmenter._process_keyword("cat")
+
+    first, second = predictor.predict.call_args_list
+    assert first.kwargs["mask_input"] is None
+    assert second.kwargs["mask_input"] is logits[0]
+    assert [fields["points"] for event, fields in events if event == "click"] == [1, 2]
+
+def test_build_sam2_model_tier_and_quantization():
+    """The tier picks the checkpoint and config; quantize converts Linear layers to int8."""
+    import torch
+    built = []
+
+    def builder(config, checkpoint, device):
+        built.append((config, checkpoint))
+        return torch.nn.Sequential(torch.nn.Linear(8, 8), torch.nn.ReLU())
+
+    threads = torch.get_num_threads()
+    try:
+        model, device = build_sam2_model(builder, "tiny", quantize=True, threads=1)
+        assert torch.get_num_threads() == 1
+    finally:
+        torch.set_num_threads(threads)
+
+    checkpoint, config = SAM2_MODELS["tiny"]
+    assert built == [(config, checkpoint)]
+    if device.type == "cpu":
+        assert isinstance(model[0], torch.ao.nn.quantized.dynamic.Linear)
+        assert model(torch.ones(1, 8)).shape == (1, 8)
+
+    with pytest.raises(ValueError, match="Unknown SAM2 model"):
+        build_sam2_model(builder, "huge")
+
+def test_mask_store_round_trip(tmp_path):
+    """Masks come back bit-exact from disk and the store behaves like a dict of frames."""
+    rng = np.random.default_rng(0)
+    store = MaskStore(tmp_path, 5, 7)
+    masks = {frame_idx: {1: rng.random((5, 7)) > 0.5, 2: rng.random((5, 7)) > 0.5} for frame_idx in (0, 3)}
+    for frame_idx, frame_masks in masks.items():
+        store.save(frame_idx, frame_masks)
+
+    assert list(store) == [0, 3] and len(store) == 2
+    assert 1 not in store
+    for frame_idx, frame_masks in masks.items():
+        for obj_id, mask in frame_masks.items():
+            assert store[frame_idx][obj_id].dtype == bool
+            np.testing.assert_array_equal(store[frame_idx][obj_id], mask)
+    with pytest.raises(KeyError):
+        store[1]
+
+class FakeVideoPredictor:
+    """Marks row ``frame_idx % 6`` of every mask, and records how windows were built."""
+
+    def __init__(self, frames_dir):
+        # Window directories hold hard links, so inodes identify the frames
+        self.frame_index = {path.stat().st_ino: int(path.stem) for path in frames_dir.glob("*.jpg")}
+        self.window_sizes = []
+        self.seeded = []
+
+    def init_state(self, video_path, **kwargs):
+        frames = [self.frame_index[path.stat().st_ino] for path in sorted(Path(video_path).glob("*.jpg"))]
+        self.window_sizes.append(len(frames))
+        return {"frames": frames}
+
+    def add_new_mask(self, state, frame_idx, obj_id, mask):
+        self.seeded.append((state["frames"][frame_idx], obj_id, mask.copy()))
+
+    def propagate_in_video(self, state):
+        import torch
+        for local_idx, frame_idx in enumerate(state["frames"]):
+            logits = -torch.ones((1, 1, 6, 8))
+            logits[..., frame_idx % 6, :] = 1
+            yield local_idx, [1], logits
+
+    def reset_state(self, state):
+        pass
+
+def deferred_segmenter(tmp_path, num_frames, window, keyframe_stride, frame=None):
+    """A VideoSegmenter with one accepted keyword, ready for _propagate_deferred."""
+    import cv2
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    for i in range(num_frames):
+        image = frame(i) if frame else np.zeros((6, 8, 3), dtype=np.uint8)
+        cv2.imwrite(str(frames_dir / f"{i:05d}.jpg"), image)
+    segmenter = VideoSegmenter.from_masks(frames_dir, {"cat": {0: np.zeros((6, 8), dtype=bool)}},
+                                          output_dir=tmp_path / "masks")
+    segmenter.window, segmenter.window_overlap = window, 2
+    segmenter.keyframe_stride, segmenter.min_confidence = keyframe_stride, 0.8
+    segmenter.keyframes = keyframe_indices(num_frames, keyframe_stride)
+    predictor = FakeVideoPredictor(frames_dir)
+    segmenter._warmup = Future()
+    segmenter._warmup.set_result((predictor, {"frames": segmenter.keyframes[:window]}))
+    return segmenter, predictor
+
+def test_windowed_propagation_carries_masks_across_windows(tmp_path):
+    """Each window sees only its own frames and is seeded with the previous window's overlap."""
+    segmenter, predictor = deferred_segmenter(tmp_path, num_frames=7, window=4, keyframe_stride=1)
+
+    segmenter._propagate_deferred()
+
+    # Windows cover frames 0-3 (the interactive state), 2-5 and 4-6
+    assert predictor.window_sizes == [4, 3]
+    assert [frame_idx for frame_idx, _, _ in predictor.seeded] == [2, 3, 4, 5]
+    store = segmenter.video_segments["cat"]
+    assert isinstance(store, MaskStore)
+    for frame_idx in range(7):
+        assert store[frame_idx][1].nonzero()[0].tolist() == [frame_idx % 6] * 8
+    for frame_idx, obj_id, mask in predictor.seeded:
+        np.testing.assert_array_equal(mask, store[frame_idx][obj_id])
+    assert not list((segmenter.frames_dir / "windows").iterdir())
+
+def test_keyframe_indices():
+    """Keyframes are every stride-th frame plus the last one."""
+    assert keyframe_indices(7, 1) == list(range(7))
+    assert keyframe_indices(7, 3) == [0, 3, 6]
+    assert keyframe_indices(8, 3) == [0, 3, 6, 7]
+
+def test_interpolate_masks_follows_motion():
+    """A square moving right is tracked between keyframes with high confidence."""
+    def square(x):
+        frame = np.zeros((64, 96), dtype=np.uint8)
+        frame[20:40, x:x + 20] = 255
+        return frame
+
+    def square_mask(x):
+        return square(x) > 0
+
+    xs = [10, 14, 18, 22, 26]
+    masks, confidences = interpolate_masks([square(x) for x in xs],
+                                           {1: square_mask(xs[0])}, {1: square_mask(xs[-1])})
+    assert len(masks) == len(confidences) == 3
+    for x, frame_masks, frame_confidences in zip(xs[1:-1], masks, confidences):
+        assert mask_iou(frame_masks[1], square_mask(x)) > 0.9
+        assert frame_confidences[1] > 0.8
+
+def test_low_confidence_gap_reruns_sam2(tmp_path):
+    """Where the warps disagree the gap is re-run with SAM2; elsewhere flow fills it."""
+    def frame(i):
+        image = np.zeros((6, 8, 3), dtype=np.uint8)
+        image[:, :4] = 200
+        return image
+    segmenter, predictor = deferred_segmenter(tmp_path, num_frames=7, window=None,
+                                              keyframe_stride=3, frame=frame)
+
+    segmenter._propagate_deferred()
+
+    # Keyframes 0, 3, 6 in one window; the fake marks a different row on each
+    # frame, so static frames make the forward and backward warps disagree
+    assert predictor.window_sizes == [4, 4]
+    report = json.loads((tmp_path / "masks" / "propagation.json").read_text())
+    assert report["sam2_reruns"] == [[0, 3], [3, 6]]
+    assert sorted(int(frame_idx) for frame_idx in report["confidence"]) == [1, 2, 4, 5]
+    store = segmenter.video_segments["cat"]
+    for frame_idx in range(7):
+        assert store[frame_idx][1].nonzero()[0].tolist() == [frame_idx % 6] * 8
+
+@pytest.mark.parametrize("width, height", [(203, 157), (640, 40), (1000, 621)])
+def test_tiled_compositing_matches_pil_pixelation(tmp_path, width, height, monkeypatch):
+    """Tiled compositing writes exactly the files the whole-image PIL path does."""
+    import io
+    from PIL import Image
+    monkeypatch.setattr("segmenter.COMPOSITE_STRIP_ROWS", 32)
+    rng = np.random.default_rng(width)
+    image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    masks = {keyword: (rng.random((height, width)) > 0.5).astype(np.float32)
+             for keyword in ("cat", "hat", "mat")}
+    segmenter = Segmenter.from_masks(image, masks, tmp_path / "masks", tmp_path / "combinations")
+    segmenter.encoding_budget = EncodingBudget.fixed(90)
+
+    segmenter._generate_combinations()
+
+    written = [path for path in sorted((tmp_path / "combinations").glob("*.webp"))
+               if parse_rendition(path.name)[1] is None]
+    assert len(written) == 8
+    for path in written:
+        blurred = [j for j, part in enumerate(path.stem.split("_")) if part.endswith("blur")]
+        expected = io.BytesIO()
+        Image.fromarray(segmenter._composite_full(blurred)).save(expected, format="WEBP", quality=90)
+        assert path.read_bytes() == expected.getvalue()
+
+    output = np.empty((height, width, 4), dtype=np.uint8)
+    segmenter._composite_tiled([0, 2], pixelation_indices(height), pixelation_indices(width), output)
+    np.testing.assert_array_equal(output[..., :3], segmenter._composite_full([0, 2]))
+
+def test_upsample_mask_follows_image_edges():
+    """Guided upsampling recovers a curved edge better than a plain resize."""
+    import cv2
+    y, x = np.mgrid[0:600, 0:800]
+    truth = (x - 380) ** 2 / 250 ** 2 + (y - 290) ** 2 / 180 ** 2 < 1
+    rng = np.random.default_rng(0)
+    image = np.clip(np.where(truth, 170, 60) + rng.normal(0, 10, truth.shape), 0, 255).astype(np.uint8)
+    small = cv2.resize(truth.astype(np.float32), (100, 75), interpolation=cv2.INTER_AREA) >= 0.5
+
+    nearest = cv2.resize(small.astype(np.uint8), (800, 600), interpolation=cv2.INTER_NEAREST) > 0
+    guided = upsample_mask(small, np.dstack([image] * 3))
+    assert guided.shape == truth.shape and guided.dtype == bool
+    assert mask_iou(guided, truth) > 0.995
+    assert mask_iou(guided, truth) > mask_iou(nearest, truth)
+
+def test_reduced_inference_resolution(image_file, tmp_path):
+    """SAM2 sees a downscaled image and scaled clicks; the accepted mask is full size."""
+    predictor = Mock()
+    predictor.predict.return_value = (np.ones((1, 20, 30), dtype=np.float32), None, None)
+    with patch.object(Segmenter, "_load_predictor", lambda self: predictor):
+        segmenter = Segmenter(image_file, ["cat"], tmp_path / "masks", tmp_path / "combinations",
+                              inference_size=30)
+        segmenter._warmup.result(timeout=5)
+    assert segmenter.inference_image.shape == (20, 30, 3)
+
+    def interact(*args, **kwargs):
+        fig = plt.gcf()
+        main_ax = next(ax for ax in fig.axes if ax.get_label() == "main")
+        accept_ax = next(ax for ax in fig.axes if any(t.get_text() == "Accept" for t in ax.texts))
+        for ax, point in [(main_ax, (10.5, 20.5)), (accept_ax, (0.5, 0.5))]:
+            x, y = ax.transData.transform(point) if ax is main_ax else ax.transAxes.transform(point)
+            for name in ("button_press_event", "button_release_event"):
+                fig.canvas.callbacks.process(name, MouseEvent(name, fig.canvas, x, y, button=1))
+
+    with patch("matplotlib.pyplot.show", interact):
+        segmenter._process_keyword("cat")
+
+    assert predictor.predict.call_args.kwargs["point_coords"].tolist() == [[5.0, 10.0]]
+    assert segmenter.masks["cat"].shape == (40, 60)
+    assert segmenter.masks["cat"].all()
+    assert segmenter.prompts["cat"] == {"points": [[10, 20]]}
+
+def test_prompt_arrays_pad_and_scale():
+    """Prompts are stacked, scaled and padded with label -1; boxes are all or nothing."""
+    coords, labels, box = prompt_arrays([
+        {"points": [[10, 20], [30, 40]], "labels": [1, 0]},
+        {"points": [[50, 60]]},
+    ], scale=0.5)
+    assert coords.tolist() == [[[5, 10], [15, 20]], [[25, 30], [0, 0]]]
+    assert labels.tolist() == [[1, 0], [1, -1]]
+    assert box is None
+
+    coords, labels, box = prompt_arrays([{"box": [0, 0, 10, 10]}, {"box": [5, 5, 20, 20], "points": [[8, 8]]}])
+    assert box.tolist() == [[0, 0, 10, 10], [5, 5, 20, 20]]
+    assert labels.tolist() == [[-1], [1]]
+
+    with pytest.raises(ValueError, match="box"):
+        prompt_arrays([{"box": [0, 0, 10, 10]}, {"points": [[1, 1]]}])
+    with pytest.raises(ValueError, match="points or a box"):
+        prompt_arrays([{"points": []}])
+
+def test_recorded_prompts_are_batched(image_file, tmp_path):
+    """Keywords with recorded prompts share one predict call; the rest stay interactive."""
+    predictor = Mock()
+    predictor.predict.return_value = (np.stack([np.ones((1, 40, 60)), np.zeros((1, 40, 60))]), None, None)
+    with patch.object(Segmenter, "_load_predictor", lambda self: predictor):
+        segmenter = Segmenter(image_file, ["cat", "hat", "dog"], tmp_path / "masks", tmp_path / "combinations")
+    prompts = {"cat": {"points": [[10, 20]]}, "hat": {"points": [[30, 15], [31, 16]]}}
+
+    with patch.object(Segmenter, "_process_keyword") as process_keyword:
+        segmenter.segment_image(prompts)
+
+    predictor.predict.assert_called_once()
+    assert predictor.predict.call_args.kwargs["point_coords"].shape == (2, 2, 2)
+    process_keyword.assert_called_once_with("dog")
+    assert segmenter.masks["cat"].all() and not segmenter.masks["hat"].any()
+    saved = json.loads((tmp_path / "masks" / "prompts.json").read_text())
+    assert [(p["keyword"], p["points"]) for p in saved] == [("cat", [[10, 20]]), ("hat", [[30, 15], [31, 16]])]
+    assert len(list((tmp_path / "combinations").glob("*.webp"))) == 8
+
+def test_given_predictor_is_reused_and_combinations_come_later(image_file, tmp_path):
+    """A loaded predictor skips the model load; saved masks are pixelated in a separate step."""
+    predictor = Mock(device="cpu")
+    predictor.predict.return_value = (np.stack([np.ones((1, 40, 60)), np.zeros((1, 40, 60))]), None, None)
+    with patch("segmenter.load_image_predictor") as load:
+        segmenter = Segmenter(image_file, ["cat", "hat"], tmp_path / "masks", tmp_path / "combinations",
+                              predictor=predictor)
+        segmenter.segment_prompts({"cat": {"points": [[10, 20]]}, "hat": {"points": [[30, 15]]}})
+    load.assert_not_called()
+    predictor.set_image.assert_called_once()
+    assert not list((tmp_path / "combinations").iterdir())
+
+    outputs = []
+    combinations = generate_image_combinations(
+        str(image_file), ["cat", "hat"], tmp_path / "masks", tmp_path / "combinations",
+        on_output=lambda filename, path: outputs.append(filename)
+    )
+    assert sorted(combinations) == sorted(outputs) == [
+        "0_1.placeholder.webp", "0_1.webp", "0_1blur.placeholder.webp", "0_1blur.webp",
+        "0blur_1.placeholder.webp", "0blur_1.webp", "0blur_1blur.placeholder.webp", "0blur_1blur.webp",
+    ]
+    assert json.loads((tmp_path / "masks" / "metadata.json").read_text()) == {"0": "cat", "1": "hat"}
+
+def test_process_images_embeds_in_batches(tmp_path):
+    """Images are embedded batch_size at a time and each image's keywords decoded together."""
+    from PIL import Image
+    prompts = []
+    for i in range(3):
+        path = tmp_path / f"image{i}.png"
+        Image.fromarray(np.full((40, 60, 3), 40 * i, dtype=np.uint8)).save(path)
+        prompts += [
+            {"image": str(path), "keyword": "cat", "box": [0, 0, 30, 20]},
+            {"image": str(path), "keyword": "hat", "box": [30, 20, 60, 40]},
+        ]
+
+    predictor = Mock()
+    predictor.predict_batch.side_effect = lambda point_coords_batch, point_labels_batch, box_batch, **kwargs: (
+        [np.ones((len(box), 1, 20, 30), dtype=np.float32) for box in box_batch], None, None
+    )
+    with patch("segmenter.load_image_predictor", return_value=predictor):
+        results = process_images(prompts, tmp_path / "masks", tmp_path / "combinations",
+                                 batch_size=2, inference_size=30)
+
+    assert [len(call.args[0]) for call in predictor.set_image_batch.call_args_list] == [2, 1]
+    assert predictor.set_image_batch.call_args.args[0][0].shape == (20, 30, 3)
+    assert predictor.predict_batch.call_args_list[0].kwargs["box_batch"][0].tolist() == [[0, 0, 15, 10], [15, 10, 30, 20]]
+    assert sorted(Path(p).name for p in results) == ["image0.png", "image1.png", "image2.png"]
+    # Four combinations and their placeholders
+    assert all(len(pixelation_map) == 8 for pixelation_map in results.values())
+    assert np.load(tmp_path / "masks" / "image2" / "hat_mask.npy").shape == (40, 60)
+
+class FakeVideoWriter:
+    """Records the frames written to a video instead of encoding them."""
+    videos = {}
+
+    def __init__(self, path, fail=False):
+        self.frames = FakeVideoWriter.videos.setdefault(Path(path).stem, [])
+        self.fail = fail
+
+    def write(self, frame):
+        if self.fail:
+            raise OSError("disk full")
+        self.frames.append(frame.copy())
+
+    def release(self):
+        pass
+
+def combination_segmenter(tmp_path, num_frames):
+    """A VideoSegmenter with two keywords whose masks move across distinct frames."""
+    import cv2
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    video_segments = {"cat": {}, "hat": {}}
+    for i in range(num_frames):
+        cv2.imwrite(str(frames_dir / f"{i:05d}.jpg"), np.full((40, 60, 3), 8 * i, dtype=np.uint8))
+        for j, keyword in enumerate(video_segments):
+            mask = np.zeros((40, 60), dtype=bool)
+            mask[:, i + 20 * j:i + 20 * j + 10] = True
+            video_segments[keyword][i] = mask
+    return VideoSegmenter.from_masks(frames_dir, video_segments, 30.0, tmp_path / "masks", tmp_path / "combinations")
+
+def test_combination_pipeline_writes_frames_in_order(tmp_path):
+    """Every combination video gets every frame in order, whichever compositor built it."""
+    import cv2
+    segmenter = combination_segmenter(tmp_path, num_frames=12)
+    segmenter.workers = 3
+    outputs = []
+    segmenter.on_output = lambda filename, path: outputs.append(filename)
+    FakeVideoWriter.videos = {}
+
+    def open_writer(path, width, height, fps):
+        return FakeVideoWriter(path), str(path)
+
+    with patch("segmenter.open_video_writer", open_writer), patch("os.path.getsize", return_value=1):
+        segmenter._generate_combinations()
+
+    assert sorted(outputs) == ["0_1.mp4", "0_1blur.mp4", "0blur_1.mp4", "0blur_1blur.mp4"]
+    combinations = [("0_1", []), ("0_1blur", [1]), ("0blur_1", [0]), ("0blur_1blur", [0, 1])]
+    for i in range(12):
+        frame = cv2.cvtColor(cv2.imread(str(segmenter.frames_dir / f"{i:05d}.jpg")), cv2.COLOR_BGR2RGB)
+        masks = {j: segmenter.video_segments[k][i][j + 1] for j, k in enumerate(["cat", "hat"])}
+        expected = segmenter._composite_frame(frame, masks, combinations)
+        for (key, _), result in zip(combinations, expected):
+            np.testing.assert_array_equal(FakeVideoWriter.videos[key][i], cv2.cvtColor(result, cv2.COLOR_RGB2BGR))
+
+def test_combination_pipeline_failure_stops_every_stage(tmp_path):
+    """An encoder error is re-raised and the other stages stop instead of blocking on full queues."""
+    segmenter = combination_segmenter(tmp_path, num_frames=30)
+    segmenter.workers = 2
+
+    def open_writer(path, width, height, fps):
+        return FakeVideoWriter(path, fail=Path(path).stem == "0blur_1"), str(path)
+
+    errors = []
+
+    def generate():
+        try:
+            segmenter._generate_combinations()
+        except OSError as e:
+            errors.append(e)
+
+    with patch("segmenter.open_video_writer", open_writer):
+        worker = threading.Thread(target=generate)
+        worker.start()
+        worker.join(timeout=10)
+    assert not worker.is_alive()
+    assert [str(e) for e in errors] == ["disk full"]
+    assert not [t for t in threading.enumerate() if t.name.startswith("combinations-")]
@@ -0,0 +1,261 @@
+import json
+import socket
+import threading
+import time
+import pytest
+from pathlib import Path
+from unittest.mock import ANY, Mock, patch
+
+# Add parent directory to Python path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from schedule_game import ConnectionManager, content_blob_name
+from worker import (SELECT_SCHEDULED_GAME_SQL, STAGES, JobQueue, Worker, enqueue_games, parse_concurrency,
+                    retry_delay)
+
+@pytest.fixture
+def queue(tmp_path):
+    """Queue in a temporary SQLite file that retries immediately."""
+    queue = JobQueue(tmp_path / "queue.db", max_attempts=2, retry_backoff=0)
+    yield queue
+    queue.close()
+
+@pytest.fixture
+def game_dir(tmp_path):
+    """Base directory with an image game whose keywords all have prompts."""
+    base_dir = tmp_path / "games"
+    base_dir.mkdir()
+    (base_dir / "cat.png").write_bytes(b"png")
+    (base_dir / "game-a.json").write_text(json.dumps({
+        "image": "cat.png",
+        "prompt": "A [cat] in a [hat]",
+        "keywords": ["cat", "hat"],
+        "prompts": {"cat": {"box": [0, 0, 20, 20]}, "hat": {"points": [[2, 2]], "box": [0, 0, 5, 5]}},
+    }))
+    return base_dir
+
+def recording_worker(queue, **kwargs):
+    """Worker whose stages only record which jobs ran them."""
+    worker = Worker(queue, **kwargs)
+    calls = []
+    for name in STAGES:
+        worker.stages[name] = lambda job, name=name: calls.append((job.id, name))
+    return worker, calls
+
+def test_enqueue_validates_games(queue, game_dir):
+    """Configs are checked up front and every game gets its own start time."""
+    job_ids = enqueue_games(queue, ["game-a.json", "game-a.json"], "2024-01-01T00:00:00Z", str(game_dir))
+    jobs = queue.jobs()
+    assert [job.id for job in jobs] == job_ids
+    assert [job.start_time for job in jobs] == ["2024-01-01T00:00:00+00:00", "2024-01-02T00:00:00+00:00"]
+    assert jobs[0].stage == "segmentation" and jobs[0].status == "queued"
+    assert jobs[0].state["prompts"]["hat"] == {"points": [[2, 2]], "box": [0, 0, 5, 5]}
+
+    (game_dir / "game-b.json").write_text(json.dumps({"image": "cat.png", "keywords": ["cat"]}))
+    with pytest.raises(ValueError, match="no recorded prompts"):
+        enqueue_games(queue, ["game-a.json", "game-b.json"], base_dir=str(game_dir))
+    (game_dir / "game-b.json").write_text(json.dumps({
+        "image": "cat.png", "keywords": ["cat", "hat"], "prompts": {"cat": {"points": [[1, 1]]}, "hat": {"box": [0, 0, 5, 5]}}
+    }))
+    with pytest.raises(ValueError, match="box"):
+        enqueue_games(queue, ["game-b.json"], base_dir=str(game_dir))
+    (game_dir / "game-c.json").write_text(json.dumps({"image": "cat.mp4", "keywords": ["cat"]}))
+    with pytest.raises(ValueError, match="videos"):
+        enqueue_games(queue, ["game-c.json"], base_dir=str(game_dir))
+    # Nothing from the rejected batches was queued
+    assert len(queue.jobs()) == 2
+
+def test_jobs_run_every_stage_in_order(queue):
+    """Each job goes through every stage once and ends up done."""
+    job_ids = queue.enqueue([(f"game-{i}.json", "/games", None, {}) for i in range(3)])
+    worker, calls = recording_worker(queue)
+
+    worker.run(exit_when_empty=True)
+
+    for job_id in job_ids:
+        assert [name for i, name in calls if i == job_id] == list(STAGES)
+    assert {(job.stage, job.status) for job in queue.jobs()} == {("done", "done")}
+
+def test_concurrency_is_capped_per_stage(queue):
+    """No more jobs run a stage at once than its concurrency allows."""
+    queue.enqueue([(f"game-{i}.json", "/games", None, {}) for i in range(4)])
+    worker, _ = recording_worker(queue, concurrency={"segmentation": 1, "upload": 2})
+    active = {name: 0 for name in STAGES}
+    peak = dict(active)
+    lock = threading.Lock()
+
+    def slow(job, name):
+        with lock:
+            active[name] += 1
+            peak[name] = max(peak[name], active[name])
+        time.sleep(0.2 if name == "upload" else 0.02)
+        with lock:
+            active[name] -= 1
+
+    for name in ("segmentation", "upload"):
+        worker.stages[name] = lambda job, name=name: slow(job, name)
+    worker.run(exit_when_empty=True)
+
+    assert peak["segmentation"] == 1
+    assert peak["upload"] == 2
+
+def test_failed_stage_is_retried_then_failed(queue):
+    """A stage is retried up to max_attempts; retry() requeues it where it failed."""
+    job_id, = queue.enqueue([("game-a.json", "/games", None, {})])
+    worker, calls = recording_worker(queue)
+    worker.stages["upload"] = Mock(side_effect=RuntimeError("blob storage down"))
+
+    worker.run(exit_when_empty=True)
+    job, = queue.jobs()
+    assert worker.stages["upload"].call_count == 2
+    assert (job.stage, job.status, job.attempts) == ("upload", "failed", 2)
+    assert "blob storage down" in job.error
+
+    worker.stages["upload"] = lambda job: None
+    assert queue.retry([job_id]) == 1
+    worker.run(exit_when_empty=True)
+    job, = queue.jobs()
+    assert (job.stage, job.status, job.error) == ("done", "done", None)
+    # Earlier stages weren't run again
+    assert [name for _, name in calls] == ["segmentation", "encoding", "db"]
+
+def test_expired_lease_resumes_at_its_stage(queue):
+    """A job whose worker died is picked up again at the stage it was in."""
+    queue.enqueue([("game-a.json", "/games", None, {})])
+    job = queue.claim("segmentation", "dead-worker")
+    job.state["masks"] = True
+    queue.complete_stage(job, "dead-worker")
+    stale = queue.claim("encoding", "dead-worker", lease=0)
+
+    worker, calls = recording_worker(queue)
+    worker.run(exit_when_empty=True)
+
+    assert [name for _, name in calls] == ["encoding", "upload", "db"]
+    job, = queue.jobs()
+    assert job.status == "done"
+    assert job.state == {"masks": True}
+    # Another worker can't overwrite a job it lost
+    assert not queue.complete_stage(stale, "dead-worker")
+
+def test_dead_local_worker_is_taken_over_at_once(queue):
+    """Jobs of a worker process that has exited don't wait for their lease."""
+    queue.enqueue([("game-a.json", "/games", None, {})])
+    queue.claim("segmentation", f"{socket.gethostname()}:999999999")
+    job = queue.claim("segmentation", "live-worker")
+    assert (job.id, job.attempts) == (1, 1)
+
+def test_upload_resumes_with_missing_files(queue, game_dir, tmp_path):
+    """Uploads already saved aren't repeated when the stage is retried; identical files are uploaded once."""
+    combinations = {}
+    # The placeholder is inlined at commit, never uploaded
+    for filename, content in [("0_1.webp", b"a"), ("0blur_1.webp", b"b"), ("0blur_1blur.webp", b"b"),
+                              ("0_1.placeholder.webp", b"c")]:
+        (tmp_path / filename).write_bytes(content)
+        combinations[filename] = str(tmp_path / filename)
+    job_id, = enqueue_games(queue, ["game-a.json"], base_dir=str(game_dir))
+    job = queue.claim("segmentation", "w")
+    job.state["combinations"] = combinations
+    queue.complete_stage(job, "w")
+    job = queue.claim("encoding", "w")
+    queue.complete_stage(job, "w")
+
+    worker = Worker(queue)
+    flaky = content_blob_name(combinations["0blur_1.webp"])
+    uploaded = []
+    def flaky_upload(path, blob_name):
+        uploaded.append(blob_name)
+        return None if blob_name == flaky and len(uploaded) <= 3 else f"https://blob/{blob_name}"
+
+    with patch("worker.upload_content_blob", side_effect=flaky_upload):
+        worker.run_stage(queue.claim("upload", worker.worker_id))
+        job, = queue.jobs()
+        assert (job.stage, job.attempts) == ("upload", 1)
+        assert len(uploaded) == 3 and len(job.state["uploads"]) == 2
+
+        worker.run_stage(queue.claim("upload", worker.worker_id))
+    job, = queue.jobs()
+    assert job.stage == "db"
+    assert uploaded[3:] == [flaky]
+    assert job.state["blob_names"]["0blur_1.webp"] == job.state["blob_names"]["0blur_1blur.webp"] == flaky
+
+def test_commit_is_not_repeated(queue, game_dir):
+    """A game committed before the worker stopped isn't inserted again."""
+    enqueue_games(queue, ["game-a.json"], "2024-01-01T00:00:00Z", base_dir=str(game_dir))
+    for name in STAGES[:-1]:
+        job = queue.claim(name, "w")
+        job.state.update(
+            combinations={"0_1.webp": "/tmp/0_1.webp"},
+            blob_names={"media": "game-images/aa.png", "0_1.webp": "game-images/bb.webp"},
+            uploads={
+                "game-images/aa.png": "https://blob/aa.png",
+                "game-images/bb.webp": "https://blob/bb.webp",
+            },
+        )
+        queue.complete_stage(job, "w")
+
+    conn, cur = Mock(), Mock()
+    cur.fetchone.return_value = (42,)
+    conn.cursor.return_value.__enter__ = Mock(return_value=cur)
+    conn.cursor.return_value.__exit__ = Mock(return_value=None)
+    connections = Mock(spec=ConnectionManager)
+    connections.postgres.return_value.__enter__ = Mock(return_value=conn)
+    connections.postgres.return_value.__exit__ = Mock(return_value=None)
+
+    worker = Worker(queue, connections=connections)
+    with patch("worker.commit_games") as mock_commit:
+        worker.run_stage(queue.claim("db", worker.worker_id))
+    mock_commit.assert_not_called()
+    # The same media may back other games, so the start time is matched too
+    cur.execute.assert_called_once_with(
+        SELECT_SCHEDULED_GAME_SQL, ("game-a", "https://blob/aa.png", "2024-01-01T00:00:00+00:00")
+    )
+    job, = queue.jobs()
+    assert (job.status, job.state["game_id"]) == ("done", 42)
+
+def test_commit_uploads_collected_blobs_again(queue, game_dir):
+    """A reused blob that gc deleted after the upload stage is uploaded again before the commit."""
+    enqueue_games(queue, ["game-a.json"], "2024-01-01T00:00:00Z", base_dir=str(game_dir))
+    for name in STAGES[:-1]:
+        job = queue.claim(name, "w")
+        job.state.update(
+            combinations={"0_1.webp": "/tmp/0_1.webp"},
+            blob_names={"media": "game-images/aa.png", "0_1.webp": "game-images/bb.webp"},
+            uploads={
+                "game-images/aa.png": "https://blob/aa.png",
+                "game-images/bb.webp": "https://blob/bb.webp",
+            },
+        )
+        queue.complete_stage(job, "w")
+
+    conn, cur = Mock(), Mock()
+    cur.fetchone.return_value = None
+    conn.cursor.return_value.__enter__ = Mock(return_value=cur)
+    conn.cursor.return_value.__exit__ = Mock(return_value=None)
+    connections = Mock(spec=ConnectionManager)
+    connections.postgres.return_value.__enter__ = Mock(return_value=conn)
+    connections.postgres.return_value.__exit__ = Mock(return_value=None)
+
+    existing = {"game-images/aa.png": "https://blob/aa.png"}
+    worker = Worker(queue, connections=connections)
+    with patch("schedule_game.find_blob", side_effect=existing.get), \
+         patch("schedule_game.upload_to_blob", return_value="https://blob/bb.webp") as mock_upload, \
+         patch("worker.generate_similarity_data", return_value={}), \
+         patch("worker.commit_games", return_value=[7]) as mock_commit:
+        worker.run_stage(queue.claim("db", worker.worker_id))
+
+    mock_upload.assert_called_once_with("/tmp/0_1.webp", "game-images/bb.webp", cache_max_age=ANY)
+    (games, *_), _ = mock_commit.call_args
+    assert games[0][1:3] == ("https://blob/aa.png", {"0_1.webp": "https://blob/bb.webp"})
+    job, = queue.jobs()
+    assert (job.status, job.state["game_id"]) == ("done", 7)
+
+def test_parse_concurrency_and_backoff():
+    """STAGE=N arguments are validated; retry delays double up to a cap."""
+    assert parse_concurrency(["segmentation=2", "upload=8"]) == {"segmentation": 2, "upload": 8}
+    with pytest.raises(ValueError):
+        parse_concurrency(["render=2"])
+    with pytest.raises(ValueError):
+        parse_concurrency(["upload=0"])
+    assert [retry_delay(n, 30) for n in (1, 2, 3)] == [30, 60, 120]
+    assert retry_delay(20, 30) == 3600
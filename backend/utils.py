@@ -2,11 +2,16 @@
 """
 Common utilities for the Unprompted game backend.
 """
+from __future__ import annotations
+
 import os
 import json
-import spacy
 import numpy as np
-from typing import Dict, List, Tuple, Optional, Any, Union
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional, Any, Union
+
+if TYPE_CHECKING:
+    # spaCy takes seconds to import; load_spacy_model imports it on first use
+    import spacy
 
 def load_spacy_model(model_name: str = "en_core_web_md") -> Optional[spacy.language.Language]:
     """
@@ -19,6 +24,8 @@ def load_spacy_model(model_name: str = "en_core_web_md") -> Optional[spacy.langu
         The loaded spaCy model or None if loading fails.
     """
     try:
+        import spacy
+
         nlp = spacy.load(model_name)
         print(f"Loaded spaCy model: {model_name}")
         return nlp
@@ -0,0 +1,802 @@
+#!/usr/bin/env python3
+"""
+Worker
+
+A durable local queue of games to schedule, and a worker daemon that works
+through it. Each game is a job that moves through the same stages as
+schedule_game.py, one at a time:
+
+    segmentation -> encoding -> upload -> db
+
+Jobs, their current stage and everything earlier stages produced are kept
+in a SQLite database, so a worker that crashes or is stopped resumes each
+game from the stage it was in. Every stage type has its own concurrency
+limit, so e.g. one SAM2 segmentation runs at a time while uploads and
+commits of other games go on. A failing stage is retried with exponential
+backoff and the job is marked failed after too many attempts.
+
+The worker runs unattended, so games are segmented headless: their configs
+need recorded prompts (see segmenter.prompt_arrays) for every keyword.
+
+    {"image": "cat.jpg", "prompt": "...", "keywords": ["cat", "hat"],
+     "prompts": {"cat": {"points": [[120, 80]]}, "hat": {"box": [40, 0, 90, 40]}}}
+
+Usage:
+    python worker.py enqueue game-1.json game-2.json --start-time "2024-01-01T00:00:00Z"
+    python worker.py run --concurrency segmentation=1 upload=2
+    python worker.py status
+    python worker.py retry
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import dateutil.parser
+
+import instrumentation
+from instrumentation import stage
+from renditions import is_placeholder, pixelation_entries
+from schedule_game import (
+    UPLOAD_WORKERS,
+    ConnectionManager,
+    close_connections,
+    commit_games,
+    content_blob_name,
+    generate_similarity_data,
+    get_connections,
+    is_video_file,
+    load_game_config,
+    upload_content_blob,
+)
+from utils import load_json_data
+
+# Stages every job goes through, in order
+STAGES = ("segmentation", "encoding", "upload", "db")
+
+# Jobs run at the same time per stage type. SAM2 and the encoder are CPU
+# and memory heavy; uploads are network bound and also upload each game's
+# files UPLOAD_WORKERS at a time.
+DEFAULT_CONCURRENCY = {"segmentation": 1, "encoding": 1, "upload": 2, "db": 1}
+
+# Attempts per stage before a job is marked failed, and the delay before
+# the first retry, doubling with every further attempt up to the maximum
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_BACKOFF = 30.0
+MAX_RETRY_DELAY = 3600.0
+
+# A running job is leased to its worker, which renews the lease while the
+# stage runs. A job whose lease expires, or whose worker on this host has
+# exited, is picked up again right away, counting as a failed attempt.
+LEASE_SECONDS = 60.0
+POLL_SECONDS = 1.0
+
+DEFAULT_QUEUE_PATH = os.environ.get("SCHEDULE_QUEUE", "schedule_queue.db")
+DEFAULT_WORK_DIR = "worker_games"
+
+CREATE_JOBS_SQL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        game_file TEXT NOT NULL,
+        base_dir TEXT NOT NULL,
+        start_time TEXT,
+        stage TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        state TEXT NOT NULL DEFAULT '{}',
+        error TEXT,
+        worker TEXT,
+        lease_until REAL,
+        run_after REAL NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (stage, status, run_after);
+"""
+
+JOB_COLUMNS = "id, game_file, base_dir, start_time, stage, status, attempts, state, error, run_after, updated_at"
+
+# Finds a game a db stage already committed before its worker stopped. Media
+# URLs are shared by every game with the same media, so the start time the
+# job committed with is matched too.
+SELECT_SCHEDULED_GAME_SQL = """
+    SELECT id FROM games
+    WHERE prompt_id = %s AND image_url = %s AND date_active = %s::timestamptz
+"""
+
+@dataclass
+class Job:
+    """A game in the queue.
+
+    Attributes:
+        id: Job ID
+        game_file: Game config path, relative to base_dir
+        base_dir: Absolute base directory for game files
+        start_time: ISO 8601 activation time of the game
+        stage: Stage the job is in, or "done"
+        status: "queued", "running", "done" or "failed"
+        attempts: Failed attempts at the current stage
+        state: Outputs of the stages run so far, plus the recorded prompts
+        error: Last error, if any
+        run_after: Unix time before which the job isn't picked up
+        updated_at: Unix time of the last change
+    """
+    id: int
+    game_file: str
+    base_dir: str
+    start_time: Optional[str]
+    stage: str
+    status: str
+    attempts: int = 0
+    state: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    run_after: float = 0.0
+    updated_at: float = 0.0
+
+    @property
+    def prompt_id(self) -> str:
+        return Path(self.game_file).stem
+
+    @classmethod
+    def from_row(cls, row: tuple) -> Job:
+        values = dict(zip([c.strip() for c in JOB_COLUMNS.split(",")], row))
+        values["state"] = json.loads(values["state"])
+        return cls(**values)
+
+def worker_alive(worker: str) -> bool:
+    """Whether a worker ID (host:pid) may still be running; workers on other hosts are assumed to be."""
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+def retry_delay(attempts: int, backoff: float) -> float:
+    """Seconds to wait before retrying a stage that has failed attempts times."""
+    return min(backoff * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+class JobQueue:
+    """
+    SQLite-backed queue of jobs.
+
+    One connection is shared by the worker's threads behind a lock. Claims
+    run in IMMEDIATE transactions, so several workers can share a queue
+    file on one host.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_QUEUE_PATH,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF
+    ):
+        """
+        Args:
+            path: SQLite database file, created if missing
+            max_attempts: Attempts per stage before a job is marked failed
+            retry_backoff: Seconds before the first retry of a stage
+        """
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(CREATE_JOBS_SQL)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, statements: Callable[[sqlite3.Cursor], Any]) -> Any:
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cur)
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+            return result
+
+    def enqueue(self, games: List[tuple]) -> List[int]:
+        """
+        Add jobs, all in one transaction.
+
+        Args:
+            games: (game_file, base_dir, start_time, state) tuples
+
+        Returns:
+            The new job IDs in input order
+        """
+        now = time.time()
+
+        def insert(cur: sqlite3.Cursor) -> List[int]:
+            ids = []
+            for game_file, base_dir, start_time, state in games:
+                cur.execute(
+                    "INSERT INTO jobs (game_file, base_dir, start_time, stage, status, state, run_after, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                    (str(game_file), str(base_dir), start_time, STAGES[0], json.dumps(state), now, now, now)
+                )
+                ids.append(cur.lastrowid)
+            return ids
+        return self._transaction(insert)
+
+    def _expire_leases(self, cur: sqlite3.Cursor, now: float) -> None:
+        cur.execute("SELECT id, stage, attempts, worker, lease_until FROM jobs WHERE status = 'running'")
+        for job_id, job_stage, attempts, worker, lease_until in cur.fetchall():
+            if lease_until < now or not worker_alive(worker):
+                # Resumed at once: the stage didn't fail, its worker went away
+                print(f"Job {job_id}: worker {worker} stopped during {job_stage}")
+                self._record_failure(cur, job_id, attempts + 1, f"Worker stopped during {job_stage}", now, now)
+
+    def _record_failure(
+        self, cur: sqlite3.Cursor, job_id: int, attempts: int, error: str, now: float, run_after: float
+    ) -> str:
+        status = "failed" if attempts >= self.max_attempts else "queued"
+        cur.execute(
+            "UPDATE jobs SET status = ?, attempts = ?, error = ?, worker = NULL, lease_until = NULL, "
+            "run_after = ?, updated_at = ? WHERE id = ?",
+            (status, attempts, error, run_after, now, job_id)
+        )
+        return status
+
+    def claim(self, job_stage: str, worker: str, lease: float = LEASE_SECONDS) -> Optional[Job]:
+        """
+        Lease the oldest runnable job in a stage to a worker.
+
+        Jobs whose worker has gone are put back first (or failed, if that
+        was their last attempt).
+
+        Returns:
+            The job, or None if no job in that stage is runnable
+        """
+        now = time.time()
+
+        def claim_one(cur: sqlite3.Cursor) -> Optional[Job]:
+            self._expire_leases(cur, now)
+            cur.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE stage = ? AND status = 'queued' AND run_after <= ? "
+                "ORDER BY id LIMIT 1",
+                (job_stage, now)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                (worker, now + lease, now, row[0])
+            )
+            return Job.from_row(row)
+        return self._transaction(claim_one)
+
+    def renew(self, job_ids: List[int], worker: str, lease: float = LEASE_SECONDS) -> None:
+        """Extend the leases a worker holds on running jobs."""
+        if not job_ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                [(now + lease, job_id, worker) for job_id in job_ids]
+            )
+
+    def _update_leased(self, job: Job, worker: str, sql: str, params: tuple) -> bool:
+        with self._lock:
+            updated = self._conn.execute(
+                sql + " WHERE id = ? AND worker = ? AND status = 'running'", (*params, job.id, worker)
+            ).rowcount
+        if not updated:
+            print(f"Job {job.id}: lease lost, another worker has taken it over")
+        return bool(updated)
+
+    def save_state(self, job: Job, worker: str) -> bool:
+        """Persist a running job's state, e.g. progress within a stage."""
+        return self._update_leased(job, worker, "UPDATE jobs SET state = ?, updated_at = ?",
+                                   (json.dumps(job.state), time.time()))
+
+    def complete_stage(self, job: Job, worker: str) -> bool:
+        """Move a running job, with its updated state, on to its next stage."""
+        next_index = STAGES.index(job.stage) + 1
+        next_stage = STAGES[next_index] if next_index < len(STAGES) else "done"
+        status = "done" if next_stage == "done" else "queued"
+        return self._update_leased(
+            job, worker,
+            "UPDATE jobs SET stage = ?, status = ?, attempts = 0, state = ?, error = NULL, "
+            "worker = NULL, lease_until = NULL, run_after = ?, updated_at = ?",
+            (next_stage, status, json.dumps(job.state), time.time(), time.time())
+        )
+
+    def fail_stage(self, job: Job, worker: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt at a running job's stage.
+
+        Returns:
+            "queued" if the stage will be retried, "failed" if that was the
+            last attempt, or None if the worker had lost the lease
+        """
+        now = time.time()
+
+        def fail(cur: sqlite3.Cursor) -> Optional[str]:
+            cur.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND status = 'running'", (job.id, worker)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            attempts = row[0] + 1
+            return self._record_failure(cur, job.id, attempts, error, now,
+                                        now + retry_delay(attempts, self.retry_backoff))
+        return self._transaction(fail)
+
+    def jobs(self, status: Optional[str] = None) -> List[Job]:
+        """All jobs, or those with a status, oldest first."""
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY id").fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {JOB_COLUMNS} FROM jobs WHERE status = ? ORDER BY id", (status,)
+                ).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def unfinished(self) -> int:
+        """Number of jobs that are queued or running."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT count(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+
+    def retry(self, job_ids: Optional[List[int]] = None) -> int:
+        """
+        Requeue failed jobs at the stage they failed in.
+
+        Args:
+            job_ids: Jobs to requeue, or None for every failed job
+
+        Returns:
+            Number of jobs requeued
+        """
+        now = time.time()
+        sql = "UPDATE jobs SET status = 'queued', attempts = 0, run_after = ?, updated_at = ? WHERE status = 'failed'"
+        params: tuple = (now, now)
+        if job_ids is not None:
+            sql += f" AND id IN ({', '.join('?' * len(job_ids))})"
+            params += tuple(job_ids)
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+def enqueue_games(
+    queue: JobQueue,
+    game_files: List[str | Path],
+    start_time: Optional[str] = None,
+    base_dir: str = "game-configs",
+    interval: timedelta = timedelta(days=1)
+) -> List[int]:
+    """
+    Validate game configs and add them to the queue.
+
+    Nothing is queued unless every config is valid. Games activate interval
+    apart starting at start_time, as with schedule_game.schedule_games.
+
+    Returns:
+        The new job IDs in input order
+
+    Raises:
+        ValueError: If a config is missing or invalid, its media is a video,
+            or a keyword has no recorded prompt or an invalid one
+    """
+    from segmenter import prompt_arrays
+
+    if start_time:
+        first_start = dateutil.parser.parse(start_time)
+        if first_start.tzinfo is None:
+            raise ValueError(f"Start time '{start_time}' must include timezone information")
+    else:
+        first_start = datetime.now(timezone.utc)
+
+    base_dir = str(Path(base_dir).absolute())
+    games = []
+    for i, game_file in enumerate(game_files):
+        config = load_game_config(game_file, base_dir)
+        if config is None:
+            raise ValueError(f"Invalid game config {game_file}")
+        game_path, _, media_path, keywords = config
+        if is_video_file(media_path):
+            raise ValueError(f"{game_file}: videos are segmented interactively; schedule them with schedule_game.py")
+        prompts = load_json_data(str(game_path)).get("prompts") or {}
+        missing = [kw for kw in keywords if kw not in prompts]
+        if missing:
+            raise ValueError(f"{game_file}: no recorded prompts for keywords {missing}")
+        try:
+            prompt_arrays([prompts[kw] for kw in keywords])
+        except ValueError as e:
+            raise ValueError(f"{game_file}: {e}") from e
+        start = (first_start + i * interval).isoformat()
+        games.append((game_file, base_dir, start, {"prompts": {kw: prompts[kw] for kw in keywords}}))
+    return queue.enqueue(games)
+
+class Worker:
+    """
+    Runs queued jobs' stages on one thread pool per stage type.
+
+    Later stages are claimed first, so games already in progress finish
+    before new ones are started and the work directory stays small.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        concurrency: Optional[Dict[str, int]] = None,
+        work_dir: str | Path = DEFAULT_WORK_DIR,
+        connections: Optional[ConnectionManager] = None,
+        **segmenter_options: Any
+    ):
+        """
+        Args:
+            queue: Queue to work through
+            concurrency: Jobs run at the same time per stage type; missing
+                stage types use DEFAULT_CONCURRENCY
+            work_dir: Directory for each job's masks and combinations until
+                its game is committed
+            connections: Connection manager for the db stage (defaults to
+                the shared one)
+            **segmenter_options: model, quantize, threads and
+                inference_size, passed to the segmenter
+        """
+        self.queue = queue
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.work_dir = Path(work_dir).absolute()
+        self.connections = connections
+        self.segmenter_options = segmenter_options
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stages: Dict[str, Callable[[Job], None]] = {
+            "segmentation": self.segment,
+            "encoding": self.encode,
+            "upload": self.upload,
+            "db": self.commit,
+        }
+        # SAM2 is loaded once per segmentation thread and reused
+        self._local = threading.local()
+
+    def run(self, stop: Optional[threading.Event] = None, exit_when_empty: bool = False) -> None:
+        """
+        Work through the queue until stopped.
+
+        Stages already running when stop is set (or on Ctrl-C) are finished
+        first.
+
+        Args:
+            stop: Event that ends the loop
+            exit_when_empty: Return once no job is queued or running
+        """
+        stop = stop or threading.Event()
+        pools = {
+            name: ThreadPoolExecutor(max_workers=self.concurrency[name], thread_name_prefix=f"worker-{name}")
+            for name in STAGES
+        }
+        running: Dict[Future, Job] = {}
+        renewed = time.monotonic()
+        print(f"Worker {self.worker_id} started with concurrency {self.concurrency}")
+        try:
+            while not stop.is_set():
+                for name in reversed(STAGES):
+                    while sum(job.stage == name for job in running.values()) < self.concurrency[name]:
+                        job = self.queue.claim(name, self.worker_id)
+                        if job is None:
+                            break
+                        running[pools[name].submit(self.run_stage, job)] = job
+                if exit_when_empty and not running and not self.queue.unfinished():
+                    break
+                if running:
+                    done, _ = wait(list(running), timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        running.pop(future)
+                else:
+                    stop.wait(POLL_SECONDS)
+                if time.monotonic() - renewed > LEASE_SECONDS / 3:
+                    self.queue.renew([job.id for job in running.values()], self.worker_id)
+                    renewed = time.monotonic()
+        except KeyboardInterrupt:
+            print(f"Stopping once {len(running)} running stage(s) finish")
+        finally:
+            while running:
+                done, _ = wait(list(running), timeout=LEASE_SECONDS / 3)
+                for future in done:
+                    running.pop(future)
+                self.queue.renew([job.id for job in running.values()], self.worker_id)
+            for pool in pools.values():
+                pool.shutdown()
+
+    def run_stage(self, job: Job) -> None:
+        """Run a claimed job's current stage and record the outcome."""
+        print(f"Job {job.id} ({job.prompt_id}): {job.stage}, attempt {job.attempts + 1}")
+        try:
+            with stage(f"job_{job.stage}", job=job.id, prompt_id=job.prompt_id, attempt=job.attempts + 1):
+                self.stages[job.stage](job)
+        except (Exception, SystemExit) as e:  # some helpers call sys.exit() on failure
+            status = self.queue.fail_stage(job, self.worker_id, f"{type(e).__name__}: {e}")
+            if status == "failed":
+                print(f"Job {job.id} ({job.prompt_id}) failed at {job.stage}: {e}")
+            elif status:
+                print(f"Job {job.id} ({job.prompt_id}) will retry {job.stage}: {e}")
+            return
+        self.queue.complete_stage(job, self.worker_id)
+
+    def _config(self, job: Job) -> tuple:
+        config = load_game_config(job.game_file, job.base_dir)
+        if config is None:
+            raise ValueError(f"Invalid game config {job.game_file}")
+        return config
+
+    def _job_dir(self, job: Job) -> Path:
+        return self.work_dir / str(job.id)
+
+    def _media_path(self, job: Job, media_path: str) -> Path:
+        return Path(job.base_dir) / media_path.lstrip('/')
+
+    def segment(self, job: Job) -> None:
+        """Segment every keyword from its recorded prompt and save the masks."""
+        from segmenter import Segmenter
+
+        _, _, media_path, keywords = self._config(job)
+        job_dir = self._job_dir(job)
+        segmenter = Segmenter(
+            self._media_path(job, media_path), keywords, job_dir / "masks", job_dir / "combinations",
+            predictor=getattr(self._local, "predictor", None), **self.segmenter_options
+        )
+        segmenter.segment_prompts(job.state["prompts"])
+        self._local.predictor = segmenter.predictor
+        missing = [kw for kw in keywords if kw not in segmenter.masks]
+        if missing:
+            raise ValueError(f"No masks for keywords {missing}")
+
+    def encode(self, job: Job) -> None:
+        """Write the pixelated combinations of the saved masks."""
+        from segmenter import generate_image_combinations
+
+        _, _, media_path, keywords = self._config(job)
+        job_dir = self._job_dir(job)
+        combinations = generate_image_combinations(
+            str(self._media_path(job, media_path)), keywords, job_dir / "masks", job_dir / "combinations"
+        )
+        if not combinations:
+            raise RuntimeError("No combinations were generated")
+        job.state["combinations"] = combinations
+
+    def upload(self, job: Job) -> None:
+        """
+        Upload the original media, the combinations and their renditions.
+
+        Blobs are named after their content (see content_blob_name), so
+        identical combinations are uploaded once and blobs that already exist
+        aren't uploaded again. Each URL is saved as soon as its upload
+        finishes, so a retry only uploads what's missing. Placeholders are
+        inlined at commit instead.
+        """
+        files = self._blob_files(job)
+        uploaded = job.state.setdefault("uploads", {})
+        failed = self._upload_files(job, {
+            blob_name: path for blob_name, path in files.items() if blob_name not in uploaded
+        })
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(files)} uploads failed")
+
+    def _blob_files(self, job: Job) -> Dict[str, str]:
+        """Map the blob name of each file the job uploads to its path."""
+        _, _, media_path, _ = self._config(job)
+        paths = {
+            "media": str(self._media_path(job, media_path)),
+            **{name: path for name, path in job.state["combinations"].items() if not is_placeholder(name)},
+        }
+        blob_names = job.state.setdefault("blob_names", {})
+        for name, path in paths.items():
+            if name not in blob_names:
+                blob_names[name] = content_blob_name(path)
+        return {blob_names[name]: path for name, path in paths.items()}
+
+    def _upload_files(self, job: Job, files: Dict[str, str]) -> List[str]:
+        """
+        Upload files (see upload_content_blob), saving each URL in the job's uploads.
+
+        Returns:
+            Blob names whose upload failed
+        """
+        uploaded = job.state["uploads"]
+        failed = []
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix=f"upload-{job.id}") as pool:
+            futures = {
+                pool.submit(upload_content_blob, path, blob_name): blob_name
+                for blob_name, path in files.items()
+            }
+            for future in as_completed(futures):
+                if url := future.result():
+                    uploaded[futures[future]] = url
+                    self.queue.save_state(job, self.worker_id)
+                else:
+                    failed.append(futures[future])
+        return failed
+
+    def commit(self, job: Job) -> None:
+        """
+        Insert the game and its similarity data, then delete the job's files.
+
+        A game this stage already committed before its worker stopped is
+        found by its media URL and start time rather than inserted twice.
+
+        Otherwise every blob is looked up again first. A reused blob may
+        have belonged only to expired games, and collect_expired_games could
+        have deleted it since the upload stage; such blobs are uploaded again.
+        """
+        game_path, prompt_id, media_path, keywords = self._config(job)
+        uploaded, blob_names = job.state["uploads"], job.state["blob_names"]
+        media_url = uploaded[blob_names["media"]]
+
+        # Games without a start time go live when first committed; the time
+        # is saved first so a retry looks for the same one
+        if "start_time" not in job.state:
+            job.state["start_time"] = job.start_time or datetime.now(timezone.utc).isoformat()
+            self.queue.save_state(job, self.worker_id)
+        start_time = job.state["start_time"]
+
+        connections = self.connections or get_connections()
+        with connections.postgres() as conn:
+            with conn.cursor() as cur:
+                cur.execute(SELECT_SCHEDULED_GAME_SQL, (prompt_id, media_url, start_time))
+                row = cur.fetchone()
+            conn.rollback()
+
+        if row:
+            print(f"Game {prompt_id} was already committed (ID: {row[0]})")
+            job.state["game_id"] = row[0]
+        else:
+            similarity_games = {prompt_id: keywords}
+            similarity_data = generate_similarity_data(similarity_games, connections)
+
+            files = self._blob_files(job)
+            missing = self._upload_files(job, files)
+            if missing:
+                raise RuntimeError(f"{len(missing)} of {len(files)} blobs are missing and could not be uploaded")
+            media_url = uploaded[blob_names["media"]]
+            pixelation_map = pixelation_entries(job.state["combinations"], {
+                filename: uploaded[blob_names[filename]]
+                for filename in job.state["combinations"] if filename in blob_names
+            })
+            game_ids = commit_games(
+                [(game_path, media_url, pixelation_map, start_time)],
+                similarity_games, similarity_data, connections
+            )
+            job.state["game_id"] = game_ids[0]
+        shutil.rmtree(self._job_dir(job), ignore_errors=True)
+
+def format_jobs(jobs: List[Job]) -> str:
+    """Render jobs as a plain-text table followed by counts per status."""
+    now = time.time()
+    lines = [f"{'id':>5}  {'game':<24}{'stage':<14}{'status':<10}{'attempts':>8}  {'updated':<20}error"]
+    counts: Dict[str, int] = {}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+        status = job.status
+        if status == "queued" and job.run_after > now:
+            status = f"retry in {job.run_after - now:.0f}s"
+        updated = datetime.fromtimestamp(job.updated_at).strftime("%Y-%m-%d %H:%M:%S")
+        lines.append(
+            f"{job.id:>5}  {job.prompt_id:<24}{job.stage:<14}{status:<10}{job.attempts:>8}  {updated:<20}"
+            f"{(job.error or '')[:80]}"
+        )
+    lines.append(", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "No jobs")
+    return "\n".join(lines)
+
+def parse_concurrency(values: List[str]) -> Dict[str, int]:
+    """Parse STAGE=N arguments."""
+    concurrency = {}
+    for value in values:
+        name, _, count = value.partition("=")
+        if name not in STAGES or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid concurrency '{value}', expected STAGE=N with STAGE one of {list(STAGES)}")
+        concurrency[name] = int(count)
+    return concurrency
+
+def main():
+    """Entry point for command line usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Queue games and schedule them with a worker daemon")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH,
+                        help=f"SQLite queue file (default: $SCHEDULE_QUEUE or {DEFAULT_QUEUE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add games to the queue")
+    enqueue.add_argument("game_files", nargs="+", metavar="game_file", help="Path to a game JSON config file")
+    enqueue.add_argument("--start-time", help="ISO 8601 start time of the first game (default: now)")
+    enqueue.add_argument("--base-dir", default="game-configs", help="Base directory for game files")
+    enqueue.add_argument("--interval-hours", type=float, default=24,
+                         help="Hours between consecutive games (default: 24)")
+
+    run = commands.add_parser("run", help="Work through the queue")
+    run.add_argument("--concurrency", nargs="+", default=[], metavar="STAGE=N",
+                     help=f"Jobs run at the same time per stage (default: {DEFAULT_CONCURRENCY})")
+    run.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                     help=f"Attempts per stage before a job fails (default: {DEFAULT_MAX_ATTEMPTS})")
+    run.add_argument("--retry-backoff", type=float, default=DEFAULT_RETRY_BACKOFF,
+                     help=f"Seconds before the first retry, doubling each time (default: {DEFAULT_RETRY_BACKOFF:.0f})")
+    run.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help="Directory for masks and combinations in progress")
+    run.add_argument("--exit-when-empty", action="store_true", help="Exit once no job is queued or running")
+    run.add_argument("--model", help="SAM2 model tier")
+    run.add_argument("--quantize", action="store_true", help="Use dynamic int8 quantization on CPU")
+    run.add_argument("--threads", type=int, help="Number of torch CPU threads")
+    run.add_argument("--inference-size", type=int, help="Longest side SAM2 sees")
+    run.add_argument("--timings", metavar="FILE", help="Write per-stage timings as JSON lines to FILE")
+
+    status = commands.add_parser("status", help="Show every job's stage and status")
+    status.add_argument("--json", action="store_true", help="Print the jobs as JSON")
+
+    retry = commands.add_parser("retry", help="Requeue failed jobs")
+    retry.add_argument("job_ids", nargs="*", type=int, help="Jobs to requeue (default: all failed)")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "run":
+            queue = JobQueue(args.queue, args.max_attempts, args.retry_backoff)
+        else:
+            queue = JobQueue(args.queue)
+    except sqlite3.Error as e:
+        print(f"Error opening queue {args.queue}: {e}")
+        sys.exit(1)
+
+    try:
+        if args.command == "enqueue":
+            job_ids = enqueue_games(queue, args.game_files, args.start_time, args.base_dir,
+                                    timedelta(hours=args.interval_hours))
+            print(f"Queued {len(job_ids)} game(s) as jobs {job_ids}")
+        elif args.command == "run":
+            options = {"quantize": args.quantize, "threads": args.threads, "inference_size": args.inference_size}
+            if args.model:
+                options["model"] = args.model
+            instrumentation.configure(args.timings)
+            worker = Worker(queue, parse_concurrency(args.concurrency), args.work_dir, **options)
+            # Stop as on Ctrl-C, finishing the stages that are running
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+            try:
+                worker.run(stop, exit_when_empty=args.exit_when_empty)
+            finally:
+                close_connections()
+                instrumentation.shutdown()
+        elif args.command == "status":
+            jobs = queue.jobs()
+            if args.json:
+                print(json.dumps([{k: v for k, v in vars(job).items() if k != "state"} for job in jobs], indent=2))
+            else:
+                print(format_jobs(jobs))
+        elif args.command == "retry":
+            print(f"Requeued {queue.retry(args.job_ids or None)} job(s)")
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import { useState, useEffect, useCallback } from "react";
 import { MediaSection, PromptSection, GuessHistorySection, GameOverSection } from "./components";
 import { Button } from "@/components/ui/button";
 import { generateRecap, hasPlayedToday, markGameAsPlayed } from "./utils";
+import type { PixelationEntry, PixelationMap } from "./utils";
 
 interface GameLayoutProps {
   randomIndex: number;
@@ -11,7 +12,7 @@ interface GameLayoutProps {
   keywords: string[];
   similarityDict: Record<string, Record<string, number>>;
   speechTypes?: string[];
-  pixelationMap?: Record<string, string> | null;
+  pixelationMap?: PixelationMap | null;
   isLoading?: boolean;
   isVideo?: boolean;
 }
@@ -42,7 +43,7 @@ const GameLayout: React.FC<GameLayoutProps> = ({
   } | null>(null);
   
   // State for current displayed image
-  const [currentImage, setCurrentImage] = useState<string | null>(null);
+  const [currentImage, setCurrentImage] = useState<PixelationEntry | null>(null);
 
   // Check if the user has already played today's game
   useEffect(() => {
@@ -6,44 +6,94 @@ import { createClient as createRedisClient } from 'redis';
 const DATABASE_URL = process.env.DATABASE_URL;
 const REDIS_URL = process.env.REDIS_URL;
 
-export async function GET() {
-  // Connect to PostgreSQL
+// Sorted set of game IDs scored by date_active, written by the scheduler
+// (backend/active_games.py); each game's columns are in game_meta:{id}
+const ACTIVE_GAMES_KEY = 'games:active';
+const CURRENT_GAME_CANDIDATES = 10;
+
+type RedisClient = ReturnType<typeof createRedisClient>;
+type GameRow = Record<string, any>;
+
+// The games sharing the most recent date, in random order, so one is picked
+// at random if there are several
+function pickLatest<T>(candidates: T[], sameDate: (a: T, b: T) => boolean): T[] {
+  const latest = [candidates[0]];
+  for (let i = 1; i < candidates.length && sameDate(candidates[i], candidates[0]); i++) {
+    latest.push(candidates[i]);
+  }
+  for (let i = latest.length - 1; i > 0; i--) {
+    const j = Math.floor(Math.random() * (i + 1));
+    [latest[i], latest[j]] = [latest[j], latest[i]];
+  }
+  return latest;
+}
+
+// Read the current game from the Redis index; undefined if the index hasn't
+// been built, null if no game has started
+async function currentGameFromIndex(redisClient: RedisClient): Promise<GameRow | null | undefined> {
+  const candidates = await redisClient.zRangeWithScores(
+    ACTIVE_GAMES_KEY, Date.now() / 1000, '-inf',
+    { BY: 'SCORE', REV: true, LIMIT: { offset: 0, count: CURRENT_GAME_CANDIDATES } }
+  );
+  if (candidates.length === 0) {
+    return (await redisClient.zCard(ACTIVE_GAMES_KEY)) === 0 ? undefined : null;
+  }
+  for (const { value } of pickLatest(candidates, (a, b) => a.score === b.score)) {
+    const meta = await redisClient.hGetAll(`game_meta:${value}`);
+    if (Object.keys(meta).length > 0) {
+      return {
+        ...meta,
+        id: parseInt(meta.id, 10),
+        keywords: JSON.parse(meta.keywords),
+        speech_types: JSON.parse(meta.speech_types || 'null'),
+        pixelation_map: JSON.parse(meta.pixelation_map || 'null'),
+      };
+    }
+  }
+  return null;
+}
+
+// Query PostgreSQL for active games (games whose start time has passed)
+async function currentGameFromDatabase(): Promise<GameRow | null> {
   const pgClient = new PostgresClient({connectionString: DATABASE_URL});
   await pgClient.connect();
-  // Connect to Redis
-  const redisClient = createRedisClient({ url: REDIS_URL });
-  await redisClient.connect();
-
   try {
-    // Query for active games (games whose start time has passed)
     const { rows } = await pgClient.query(`
       SELECT id, prompt_id, prompt_text, keywords, speech_types, image_url, pixelation_map, media_type, date_active
       FROM games
       WHERE date_active <= NOW()
       ORDER BY date_active DESC
-      LIMIT 10
+      LIMIT ${CURRENT_GAME_CANDIDATES}
     `);
+    if (rows.length === 0) {
+      return null;
+    }
+    return pickLatest(rows, (a, b) => a.date_active.getTime() === b.date_active.getTime())[0];
+  } finally {
+    await pgClient.end();
+  }
+}
+
+export async function GET() {
+  // Connect to Redis
+  const redisClient = createRedisClient({ url: REDIS_URL });
+  await redisClient.connect();
+
+  try {
+    // PostgreSQL is only queried until the index has been built
+    let selectedGame = await currentGameFromIndex(redisClient);
+    if (selectedGame === undefined) {
+      selectedGame = await currentGameFromDatabase();
+    }
 
     // If no active games, return 404
-    if (rows.length === 0) {
+    if (!selectedGame) {
       return NextResponse.json(
         { error: 'No active games found' },
         { status: 404 }
       );
     }
 
-    // If there are multiple games with the same most recent date, randomly choose one
-    const latestGames = [rows[0]];
-    for (let i = 1; i < rows.length; i++) {
-      if (rows[i].date_active.getTime() === rows[0].date_active.getTime()) {
-        latestGames.push(rows[i]);
-      } else {
-        break;
-      }
-    }
-
-    // Randomly select one game if there are multiple games with the same date
-    const selectedGame = latestGames[Math.floor(Math.random() * latestGames.length)];
     const { id, prompt_id, prompt_text, keywords, image_url, pixelation_map } = selectedGame;
     
     // Parse keywords from JSON string if needed
@@ -54,11 +104,14 @@ export async function GET() {
       (typeof pixelation_map === 'string' ? JSON.parse(pixelation_map) : pixelation_map) : 
       null;
 
-    // Fetch similarity data for each keyword from Redis
+    // Fetch similarity data for each keyword from Redis. The game records
+    // which version of each keyword's hash it uses; games scheduled before
+    // versions existed use the legacy unversioned key.
+    const similarityVersions = await redisClient.hGetAll(`game:${prompt_id}:similarity`);
     const similarityData: Record<string, Record<string, number>> = {};
     for (const keyword of parsedKeywords) {
       const keywordLower = keyword.toLowerCase();
-      const similarityKey = `similarity:${keywordLower}`;
+      const similarityKey = similarityVersions[keywordLower] ?? `similarity:${keywordLower}`;
       const rawSimilarities = await redisClient.hGetAll(similarityKey);
 
       // Convert Redis string values to numbers
@@ -92,8 +145,7 @@ export async function GET() {
       { status: 500 }
     );
   } finally {
-    // Close database connections
-    if (pgClient) await pgClient.end();
+    // Close the Redis connection
     if (redisClient) await redisClient.quit();
   }
 }
\ No newline at end of file
@@ -1,37 +1,62 @@
 import { NextResponse } from 'next/server';
 import { Pool } from 'pg';
+import { createClient as createRedisClient } from 'redis';
+
+// Sorted set of game IDs scored by date_active, written by the scheduler
+// (backend/active_games.py)
+const ACTIVE_GAMES_KEY = 'games:active';
 
 export async function GET() {
-  // Get database connection string from environment variable
+  // Get database connection strings from environment variables
   const DATABASE_URL = process.env.DATABASE_URL;
+  const REDIS_URL = process.env.REDIS_URL;
   
-  if (!DATABASE_URL) {
+  if (!DATABASE_URL || !REDIS_URL) {
     return NextResponse.json(
       { error: 'Database configuration missing' },
       { status: 500 }
     );
   }
   
-  // Create a new PostgreSQL client
-  const pgPool = new Pool({ connectionString: DATABASE_URL });
+  const redisClient = createRedisClient({ url: REDIS_URL });
+  await redisClient.connect();
   
   try {
-    // Query for the next scheduled game (with date_active greater than current time)
-    const { rows } = await pgPool.query(`
-      SELECT date_active
-      FROM games
-      WHERE date_active > NOW()
-      ORDER BY date_active ASC
-      LIMIT 1
-    `);
-    
-    // If no future games are scheduled
-    if (rows.length === 0) {
+    // The next scheduled game is the first one in the index after now
+    const upcoming = await redisClient.zRangeWithScores(
+      ACTIVE_GAMES_KEY, `(${Date.now() / 1000}`, '+inf',
+      { BY: 'SCORE', LIMIT: { offset: 0, count: 1 } }
+    );
+    if (upcoming.length > 0) {
+      return NextResponse.json({ nextGameTime: new Date(upcoming[0].score * 1000).toISOString() });
+    }
+    if ((await redisClient.zCard(ACTIVE_GAMES_KEY)) > 0) {
       return NextResponse.json({ nextGameTime: null });
     }
-    
-    // Return the date of the next scheduled game
-    return NextResponse.json({ nextGameTime: rows[0].date_active });
+
+    // The index hasn't been built yet, so fall back to PostgreSQL
+    const pgPool = new Pool({ connectionString: DATABASE_URL });
+    try {
+      // Query for the next scheduled game (with date_active greater than current time)
+      const { rows } = await pgPool.query(`
+        SELECT date_active
+        FROM games
+        WHERE date_active > NOW()
+        ORDER BY date_active ASC
+        LIMIT 1
+      `);
+      
+      // If no future games are scheduled
+      if (rows.length === 0) {
+        return NextResponse.json({ nextGameTime: null });
+      }
+      
+      // Return the date of the next scheduled game
+      return NextResponse.json({ nextGameTime: rows[0].date_active });
+    } finally {
+      // Close database connection
+      await pgPool.end();
+    }
   } catch (error) {
     console.error('Error fetching next game time:', error);
     return NextResponse.json(
@@ -39,7 +64,6 @@ export async function GET() {
       { status: 500 }
     );
   } finally {
-    // Close database connection
-    await pgPool.end();
+    await redisClient.quit();
   }
-}
\ No newline at end of file
+}
@@ -7,6 +7,7 @@ import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { getNextGameTime, formatTimeRemaining } from './utils';
+import type { PixelationEntry } from './utils';
 
 interface PromptSectionProps {
   originalPrompt: string;
@@ -20,7 +21,7 @@ interface PromptSectionProps {
 }
 
 interface MediaSectionProps {
-  media: string | null;
+  media: PixelationEntry | null;
   isVideo?: boolean;
 }
 
@@ -42,7 +43,7 @@ export const MediaSection: React.FC<MediaSectionProps> = ({ media, isVideo = fal
         <div className="relative w-[500px] h-[500px] flex items-center justify-center bg-black/5">
           {isVideo ? (
             <video 
-              src={media}
+              src={typeof media === 'string' ? media : media.src}
               autoPlay
               loop
               muted
@@ -54,6 +55,24 @@ export const MediaSection: React.FC<MediaSectionProps> = ({ media, isVideo = fal
                 video.style.opacity = '1';
               }}
             />
+          ) : typeof media !== 'string' ? (
+            // Renditions are already sized, so the browser picks one from the
+            // srcset directly; the blurred placeholder shows until it loads
+            <div
+              className="absolute inset-0 w-full h-full bg-contain bg-center bg-no-repeat"
+              style={media.placeholder ? { backgroundImage: `url("${media.placeholder}")` } : undefined}
+            >
+              {/* eslint-disable-next-line @next/next/no-img-element */}
+              <img
+                src={media.src}
+                srcSet={media.srcset}
+                sizes="500px"
+                alt="Guess the Prompt!"
+                className="absolute inset-0 w-full h-full object-contain"
+                fetchPriority="high"
+                decoding="async"
+              />
+            </div>
           ) : (
             <div className="absolute inset-0 w-full h-full transition-opacity duration-300">
               <Image
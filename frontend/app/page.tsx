@@ -2,6 +2,7 @@
 import { useState, useEffect } from 'react';
 import GameLayout from './GameLayout';
 import { fetchLatestActiveGame } from './services/gameData';
+import type { PixelationMap } from './utils';
 
 export default function Home() {
   const [randomIndex, setRandomIndex] = useState<number>(0);
@@ -10,7 +11,7 @@ export default function Home() {
   const [keywords, setRandomKeywords] = useState<string[]>([]);
   const [similarityDict, setSimilarityDict] = useState<Record<string, Record<string, number>>>({});
   const [speechTypes, setSpeechTypes] = useState<string[]>([]);
-  const [pixelationMap, setPixelationMap] = useState<Record<string, string> | null>(null);
+  const [pixelationMap, setPixelationMap] = useState<PixelationMap | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const [isVideo, setIsVideo] = useState(false);
 
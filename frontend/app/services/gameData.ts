@@ -1,3 +1,5 @@
+import type { PixelationMap } from '../utils';
+
 interface GameResponse {
   id: number;
   prompt_id: string;
@@ -6,7 +8,7 @@ interface GameResponse {
   image_url: string;
   similarity_data: Record<string, Record<string, number>>;
   speech_types: string[];
-  pixelation_map: Record<string, string> | null;
+  pixelation_map: PixelationMap | null;
   media_type: 'video' | 'image';
 }
 
@@ -13,13 +13,25 @@ export const generateRecap = (randomIndex: number, guessHistory: { word: string;
   return recap;
 };
 
+// Sizes of a pixelated image combination to choose from, and a tiny blurred
+// placeholder (a data: URI) to show until the chosen one has loaded
+export interface MediaRenditions {
+  src: string;
+  srcset: string;
+  placeholder?: string;
+}
+
+// Videos, and games scheduled before renditions, map combinations to a URL
+export type PixelationEntry = string | MediaRenditions;
+export type PixelationMap = Record<string, PixelationEntry>;
+
 interface GameData {
   image: string;
   prompt: string;
   keywords: string[];
   similarity_files: string[];
   speech_type?: string[];
-  pixelation_map?: Record<string, string> | null;  // Add pixelation_map to the interface
+  pixelation_map?: PixelationMap | null;  // Add pixelation_map to the interface
 }
 
 // Game result interface for storing in cookies